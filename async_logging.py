@@ -0,0 +1,106 @@
+# async_logging.py
+
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Структурные поля, которые попадают в JSON, если переданы через extra
+STRUCTURED_FIELDS = ('strategy', 'symbol', 'stage', 'latency_ms', 'suppressed')
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись лога в одну строку JSON."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'msg': record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None and value != '':
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Пропускает одинаковые предупреждения и ошибки не чаще раза в window секунд.
+
+    Число подавленных повторов добавляется в поле suppressed следующей записи.
+    """
+
+    def __init__(self, window=60, level=logging.WARNING):
+        super().__init__()
+        self.window = window
+        self.level = level
+        self._seen = {}  # ключ -> [время последнего вывода, подавлено]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.level:
+            return True
+        key = (record.levelno, record.getMessage(), getattr(record, 'symbol', None))
+        now = record.created
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is not None and now - seen[0] < self.window:
+                seen[1] += 1
+                return False
+            if seen is not None and seen[1]:
+                record.suppressed = seen[1]
+            self._seen[key] = [now, 0]
+            if len(self._seen) > 10000:
+                # Не даем словарю расти бесконечно
+                cutoff = now - self.window
+                self._seen = {k: v for k, v in self._seen.items() if v[0] >= cutoff}
+        return True
+
+
+class StructuredQueueHandler(QueueHandler):
+    """Кладет запись в очередь без форматирования в вызывающем потоке."""
+
+    def prepare(self, record):
+        # Очередь внутри процесса, поэтому запись не нужно сериализовать:
+        # подстановку аргументов, JSON и запись на диск делает поток QueueListener
+        return record
+
+
+def setup_logging(filename, level=logging.INFO, max_bytes=5*1024*1024,
+                  backup_count=5, rate_limit_window=60):
+    """Настраивает асинхронное JSON-логирование корневого логгера в файл."""
+    log_queue = queue.SimpleQueue()
+    file_handler = RotatingFileHandler(filename, maxBytes=max_bytes,
+                                       backupCount=backup_count, encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate_limit_window))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+
+    listener.start()
+    # При выходе дописываем все, что осталось в очереди
+    atexit.register(stop_listener, listener)
+    return listener
+
+
+def stop_listener(listener):
+    """Останавливает поток записи логов, дописав очередь. Повторный вызов безопасен."""
+    try:
+        listener.stop()
+    except AttributeError:
+        pass  # Уже остановлен
@@ -2,81 +2,165 @@
 
 from binance.client import Client
 from binance.enums import ORDER_TYPE_MARKET
-import math
+import json
+import time
 import logging
+import threading
+from collections import Counter, deque
 import pandas as pd
 import talib
 import requests
 from config import load_config
+from quantizer import SymbolQuantizer
+from session_log import (
+    SessionRecorder, RecordingClient, RecordingWebsocketManager,
+    ReplayClient, ReplayWebsocketManager, account_tag
+)
 
 config = load_config()
 
 client = None  # Объявим клиент как глобальный объект, инициализируем его позже
-bridge = config['bridge']
+quantizers = {}  # symbol -> SymbolQuantizer
+quantizers_lock = threading.Lock()
+api_calls = Counter()  # Счетчик обращений к REST по эндпоинтам
+api_calls_lock = threading.Lock()
+# Вес запросов спотового REST API Binance по эндпоинтам (лимит считается по весу за минуту)
+REQUEST_WEIGHT = {'account': 20, 'myTrades': 20, 'exchangeInfo': 20, 'klines': 2, 'ticker': 2, 'order': 1}
+DEPTH_WEIGHT = ((100, 5), (500, 25), (1000, 50), (5000, 250))  # (верхняя граница limit, вес)
+WEIGHT_WINDOW = 60  # Окно учета веса, сек
+used_weights = deque()  # (время, вес) запросов процесса за последние WEIGHT_WINDOW сек
+used_weight_total = 0
+thread_weights = threading.local()  # Вес запросов, сделанных текущим потоком
+# Запись ответов биржи для воспроизведения (record_file в user.cfg)
+recorder = SessionRecorder(config['record_file']) if config['record_file'] else None
+replay = None  # (SessionLog, VirtualClock) в режиме воспроизведения
+replay_clients = {}  # метка аккаунта -> ReplayClient
 
 
-# Инициализация клиента Binance
-def initialize_client(api_key, api_secret):
+# Учет обращения к эндпоинту биржи и его веса
+def count_call(endpoint, count=1, weight=None):
+    global used_weight_total
+    weight = (REQUEST_WEIGHT.get(endpoint, 1) if weight is None else weight) * count
+    thread_weights.total = getattr(thread_weights, 'total', 0) + weight
+    with api_calls_lock:
+        api_calls[endpoint] += count
+        used_weights.append((time.monotonic(), weight))
+        used_weight_total += weight
+
+
+# Вес всех запросов процесса за последнюю минуту
+def used_weight():
+    global used_weight_total
+    with api_calls_lock:
+        now = time.monotonic()
+        while used_weights and now - used_weights[0][0] >= WEIGHT_WINDOW:
+            used_weight_total -= used_weights.popleft()[1]
+        return used_weight_total
+
+
+# Суммарный вес запросов текущего потока: разница до и после вызова - его фактическая цена
+def thread_weight():
+    return getattr(thread_weights, 'total', 0)
+
+
+# Вес снапшота стакана по limit
+def depth_weight(limit):
+    for bound, weight in DEPTH_WEIGHT:
+        if limit <= bound:
+            return weight
+    return DEPTH_WEIGHT[-1][1]
+
+
+# Копия счетчиков обращений для расчета разницы за тик
+def api_calls_snapshot():
+    with api_calls_lock:
+        return dict(api_calls)
+
+
+# Создание клиента Binance для отдельного аккаунта
+def create_client(api_key, api_secret):
     if not api_key or not api_secret:
         raise ValueError("API ключи не найдены. Проверьте конфигурацию.")
+    if replay is not None:
+        tag = account_tag(api_key)
+        if tag not in replay_clients:
+            replay_clients[tag] = ReplayClient(*replay, account=tag)
+        return replay_clients[tag]
+    new_client = Client(api_key, api_secret, {"timeout": 60})
+    if recorder is not None:
+        return RecordingClient(new_client, recorder, account_tag(api_key))
+    return new_client
+
+
+# Переключение клиентов и потоков на ответы из записанной сессии
+def start_replay(log, clock):
+    global replay, recorder
+    replay = (log, clock)
+    recorder = None  # Воспроизведение не дописывает в журнал
+    replay_clients.clear()
+
+
+# Менеджер вебсокетов: настоящий, с записью или из записанной сессии
+def create_websocket_manager():
+    if replay is not None:
+        return ReplayWebsocketManager(*replay)
+    from binance import ThreadedWebsocketManager
+    manager = ThreadedWebsocketManager()
+    if recorder is not None:
+        return RecordingWebsocketManager(manager, recorder)
+    return manager
+
+
+# Отметка в записи сессии (начало тика стратегии), по ней воспроизведение делит время
+def record_mark(kind, name, **details):
+    if recorder is not None:
+        recorder.record('mark', kind, (name,), details)
+
+
+# Инициализация клиента Binance
+def initialize_client(api_key, api_secret):
     global client
-    client = Client(api_key, api_secret, {"timeout": 60})
+    client = create_client(api_key, api_secret)
     client.futures_time()
 
 
-# Получаем информацию о позиции конкретного символа напрямую с Binance
-def get_symbol_info_from_binance(symbol):
-    try:
-        account_balances = client.get_account()['balances']
-        for asset in account_balances:
-            asset_symbol = asset['asset']
-            if asset_symbol == symbol.replace(bridge, ''):
-                free_to_sell = float(asset['free'])
-                trades = client.get_my_trades(symbol=symbol, limit=10)
-                last_buy_price = None
-                # Проверяем наличие сделок и ищем последнюю покупку
-                if trades:
-                    for trade in reversed(trades):
-                        if trade['isBuyer']:
-                            last_buy_price = float(trade['price'])
-                            break
-                return {
-                    'free': free_to_sell if free_to_sell else 0.0,
-                    'price': last_buy_price if last_buy_price else None
-                }
-        logging.warning(f"Символ {symbol} не найден в балансах.")
-        return {'free': 0.0, 'price': None}  # Возврат безопасных значений
-    except requests.exceptions.Timeout:
-        logging.error(f"Таймаут при получении информации о символе {symbol}.")
-        return {'free': 0.0, 'price': None}  # Возврат безопасных значений
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Ошибка сети при запросе информации о символе {symbol}: {e}")
-        return {'free': 0.0, 'price': None}  # Возврат безопасных значений
-    except Exception as e:
-        logging.error(f"Неизвестная ошибка при обработке {symbol}: {e}")
-        return {'free': 0.0, 'price': None}  # Возврат безопасных значений
+# Клиент аккаунта: переданный явно или общий клиент модуля
+def _account(account):
+    return account if account is not None else client
 
 
-# Функция получения актуальных балансов
-def get_account_balances():
-    account = client.get_account()
-    balances = {}
-    for balance in account['balances']:
-        asset = balance['asset']
+# Снимок ненулевых балансов аккаунта одним запросом: asset -> {'free', 'locked'}
+def get_account_snapshot(account=None):
+    count_call('account')
+    account_info = _account(account).get_account()
+    snapshot = {}
+    for balance in account_info['balances']:
         free = float(balance['free'])
         locked = float(balance['locked'])
-        total = free + locked
-        if total > 0:
-            balances[asset] = total
-    return balances
+        if free + locked > 0:
+            snapshot[balance['asset']] = {'free': free, 'locked': locked}
+    return snapshot
+
+
+# Цена последней покупки по паре
+def get_last_buy_price(symbol, account=None):
+    count_call('myTrades')
+    trades = _account(account).get_my_trades(symbol=symbol, limit=10)
+    for trade in reversed(trades or []):
+        if trade['isBuyer']:
+            return float(trade['price'])
+    return None
 
 
 # Получение исторических данных по свечам с обработкой ошибок
-def get_data(symbol, interval, limit):
+def get_data(symbol, interval, limit, start_time=None):
     try:
-        candles = client.get_klines(symbol=symbol, interval=interval, limit=limit)
+        count_call('klines')
+        # start_time (мс) - свечи с этого момента, для дозагрузки базовых свечей агрегатора
+        params = {'startTime': start_time} if start_time is not None else {}
+        candles = client.get_klines(symbol=symbol, interval=interval, limit=limit, **params)
         if not candles:
-            logging.warning(f"Нет данных по свечам для {symbol}")
+            logging.warning("Нет данных по свечам для %s", symbol, extra={'symbol': symbol, 'stage': 'klines'})
             return pd.DataFrame()  # Пустой DataFrame для обработки
         df = pd.DataFrame(candles, columns=[
             'timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time',
@@ -87,10 +171,10 @@ def get_data(symbol, interval, limit):
         df[['open', 'high', 'low', 'close', 'volume']] = df[['open', 'high', 'low', 'close', 'volume']].astype(float)
         return df
     except requests.exceptions.RequestException as e:
-        logging.error(f"Ошибка сети при запросе данных {symbol}: {e}")
+        logging.error("Ошибка сети при запросе данных %s: %s", symbol, e, extra={'symbol': symbol, 'stage': 'klines'})
         return pd.DataFrame()
     except Exception as e:
-        logging.error(f"Неизвестная ошибка при обработке данных {symbol}: {e}")
+        logging.error("Неизвестная ошибка при обработке данных %s: %s", symbol, e, extra={'symbol': symbol, 'stage': 'klines'})
         return pd.DataFrame()
 
 
@@ -118,56 +202,46 @@ def calculate_macd_histogram(df, fastperiod=12, slowperiod=26, signalperiod=9):
     return df
 
 
-# рассчет данных по конкретной торговой паре
-def process_trading_pair(symbol, interval, limit):
-    df = get_data(symbol, interval, limit)
-    df = calculate_rsi(df)
-    df = calculate_macd_histogram(df)
-    return df
-
-
 # Размещаем ордер
-def place_order(symbol, quantity, side):
+def place_order(symbol, quantity, side, account=None):
     try:
         if quantity <= 0:
             logging.error("Попытка разместить ордер с нулевым или отрицательным объемом.")
             return None
-        order = client.create_order(symbol=symbol, side=side, type=ORDER_TYPE_MARKET, quantity=quantity)
-        logging.info(f"Ордер размещен: {side} {quantity} {symbol}")
+        count_call('order')
+        order = _account(account).create_order(symbol=symbol, side=side, type=ORDER_TYPE_MARKET, quantity=quantity)
+        logging.info("Ордер размещен: %s %s %s", side, quantity, symbol, extra={'symbol': symbol, 'stage': 'order'})
         return order
     except requests.exceptions.RequestException as e:
-        logging.error(f"Ошибка сети при размещении ордера {symbol}: {e}")
+        logging.error("Ошибка сети при размещении ордера %s: %s", symbol, e, extra={'symbol': symbol, 'stage': 'order'})
     except Exception as e:
-        logging.error(f"Неизвестная ошибка при размещении ордера {symbol}: {e}")
+        logging.error("Неизвестная ошибка при размещении ордера %s: %s", symbol, e, extra={'symbol': symbol, 'stage': 'order'})
     return None
 
 
 # Получение текущего баланса конкретного актива
-def get_balance(asset):
-    balance = client.get_asset_balance(asset)
+def get_balance(asset, account=None):
+    count_call('account')
+    balance = _account(account).get_asset_balance(asset)
     if balance:
         return float(balance['free'])
     return 0.0
 
 
-# Корректировка объема (quantity) торгового ордера на бирже в соответствии с шагом лота (step size)
-def adjust_quantity(quantity, step_size):
-    precision = int(round(-math.log(step_size, 10), 0))  # Определяем количество знаков после запятой на основе step_size
-    factor = 10 ** precision  # Преобразуем для работы с целыми числами
-    quantity = math.floor(quantity * factor) / factor  # Округляем в меньшую сторону
-    quantity = max(quantity, step_size)  # Убеждаемся, что количество не меньше минимального лота
-    return quantity  # Возвращаем как float
-
-
-# Находим мимальный (lot size) и (step size)
-def get_min_lot_size(symbol):
+# Предвычисленный квантователь количества и цены по фильтрам пары (кэшируется)
+def get_quantizer(symbol):
+    with quantizers_lock:
+        quantizer = quantizers.get(symbol)
+    if quantizer is not None:
+        return quantizer
+    count_call('exchangeInfo')
     info = client.get_symbol_info(symbol)
-    for filter in info['filters']:
-        if filter['filterType'] == 'LOT_SIZE':
-            min_qty = float(filter['minQty'])
-            step_size = float(filter['stepSize'])
-            return min_qty, step_size
-    return None, None
+    if not info:
+        return None
+    quantizer = SymbolQuantizer(symbol, info['filters'])
+    with quantizers_lock:
+        quantizers[symbol] = quantizer
+    return quantizer
 
 
 # вычисляем тренд для каждой пары
@@ -188,11 +262,14 @@ def analyze_trends(trading_pairs, data):
     return trends
 
 
-# Функция для получения текущей цены символа
-def get_symbol_ticker(symbol):
-    return client.get_symbol_ticker(symbol=symbol)
+# Снапшот стакана для локального order book
+def get_order_book(symbol, limit=100):
+    count_call('depth', weight=depth_weight(limit))
+    return client.get_order_book(symbol=symbol, limit=limit)
 
 
-# Функция для получения текущей цены BTC
-def get_btc_ticker():
-    return client.get_symbol_ticker(symbol='BTCUSDT')
+# Цены нескольких пар одним запросом /ticker/price: symbol -> цена
+def get_ticker_prices(symbols):
+    count_call('ticker', weight=4)  # С параметром symbols вес 4 при любом числе пар
+    tickers = client.get_symbol_ticker(symbols=json.dumps(sorted(symbols), separators=(',', ':')))
+    return {ticker['symbol']: float(ticker['price']) for ticker in tickers}
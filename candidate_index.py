@@ -0,0 +1,96 @@
+# candidate_index.py
+
+import os
+import json
+import time
+import heapq
+import logging
+import threading
+
+RANKING_FILE = 'scan_ranking.json'  # Рейтинг кандидатов сканера для интерфейсов
+
+
+class CandidateIndex:
+    """Индекс кандидатов сканера: словарь symbol -> RSI плюс куча по RSI.
+
+    Обновление пары - O(log n): в кучу кладется новая запись с номером версии,
+    а старая считается устаревшей и выбрасывается при чтении. Запрос top-K
+    извлекает из кучи только K актуальных записей.
+    """
+
+    def __init__(self, path=RANKING_FILE, persist_limit=50):
+        self.path = path
+        self.persist_limit = persist_limit  # Сколько лучших пар сохранять на диск
+        self.scores = {}  # symbol -> RSI
+        self._versions = {}  # symbol -> номер актуальной записи в куче
+        self._heap = []  # (RSI, symbol, номер), часть записей устарела
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.scores)
+
+    def update(self, symbol, rsi):
+        with self._lock:
+            if self.scores.get(symbol) == rsi:
+                return
+            self.scores[symbol] = rsi
+            # Номер записи отличает ее от старой с тем же RSI (после remove или возврата значения)
+            self._counter += 1
+            self._versions[symbol] = self._counter
+            heapq.heappush(self._heap, (rsi, symbol, self._counter))
+            self._compact()
+
+    def remove(self, symbol):
+        with self._lock:
+            if self.scores.pop(symbol, None) is not None:
+                del self._versions[symbol]
+                self._compact()
+
+    def _compact(self):
+        # Пересобираем кучу, когда устаревших записей становится больше актуальных
+        if len(self._heap) > 2 * len(self.scores) + 16:
+            self._heap = [(rsi, symbol, self._versions[symbol]) for symbol, rsi in self.scores.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, k, exclude=()):
+        """До k пар с минимальным RSI (по возрастанию), кроме пар из exclude."""
+        result = []
+        taken = []
+        with self._lock:
+            while self._heap and len(result) < k:
+                item = heapq.heappop(self._heap)
+                rsi, symbol, version = item
+                if self._versions.get(symbol) != version:
+                    continue  # Устаревшая запись - выбрасываем насовсем
+                taken.append(item)
+                if symbol not in exclude:
+                    result.append((symbol, rsi))
+            # Актуальные записи возвращаем обратно в кучу
+            for item in taken:
+                heapq.heappush(self._heap, item)
+        return result
+
+    def save(self, exclude=()):
+        """Атомарно записывает рейтинг лучших пар в файл."""
+        ranking = {
+            'updated': time.time(),
+            'pairs': [[symbol, round(float(rsi), 2)] for symbol, rsi in self.top(self.persist_limit, exclude)],
+        }
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump(ranking, file)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logging.error("Ошибка записи рейтинга кандидатов в %s: %s", self.path, e, extra={'stage': 'scan'})
+
+
+def load_ranking(path=RANKING_FILE):
+    """Читает сохраненный рейтинг: (время обновления, [(symbol, rsi), ...])."""
+    try:
+        with open(path, 'r') as file:
+            ranking = json.load(file)
+    except (OSError, ValueError):
+        return None, []
+    return ranking.get('updated'), [(symbol, rsi) for symbol, rsi in ranking.get('pairs', [])]
@@ -0,0 +1,166 @@
+# candle_aggregator.py
+
+import time
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from binance_client import get_data
+from kline_cache import INTERVAL_SECONDS, WEEK_OFFSET
+from trade_executor import SymbolLocks
+
+FIELDS = ['open', 'high', 'low', 'close', 'volume']
+MAX_REQUEST = 1000  # Максимум свечей в одном запросе /klines
+
+
+def aggregation_ratio(base_interval, interval):
+    """Сколько базовых свечей в свече interval; None, если interval из базовых не собирается."""
+    if interval == '1M' or base_interval not in INTERVAL_SECONDS or interval not in INTERVAL_SECONDS:
+        return None  # Месяцы разной длины
+    base, target = INTERVAL_SECONDS[base_interval], INTERVAL_SECONDS[interval]
+    if target < base or target % base or (interval == '1w' and WEEK_OFFSET % base):
+        return None
+    return target // base
+
+
+def aggregate(open_time, values, interval):
+    """Свечи interval из базовых: open_time в мс по возрастанию, values - массив (n, 5) OHLCV.
+
+    Границы свечей - как у биржи (от эпохи, недели - с понедельника). Первая свеча
+    отбрасывается, если базовые свечи начинаются с ее середины; последняя - формирующаяся.
+    """
+    seconds = INTERVAL_SECONDS[interval] * 1000
+    offset = WEEK_OFFSET * 1000 if interval == '1w' else 0
+    bucket = (open_time - offset) // seconds
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(bucket)] - 1
+    candles = np.column_stack([
+        values[starts, 0],
+        np.maximum.reduceat(values[:, 1], starts),
+        np.minimum.reduceat(values[:, 2], starts),
+        values[ends, 3],
+        np.add.reduceat(values[:, 4], starts),
+    ])
+    candle_open = bucket[starts] * seconds + offset
+    if len(candle_open) and open_time[0] != candle_open[0]:
+        candle_open, candles = candle_open[1:], candles[1:]
+    return candle_open, candles
+
+
+class CandleAggregator:
+    """Одна серия базовых свечей на пару, все кратные интервалы собираются из нее.
+
+    Базовые свечи хранятся массивами numpy: первый раз загружается нужная глубина,
+    дальше догружаются только свечи с открытия последней (формирующейся).
+    Интервалы пары получаются из одних и тех же данных и не расходятся между собой.
+    """
+
+    def __init__(self, base_interval, max_candles=5000):
+        self.base_interval = base_interval
+        self.base_ms = INTERVAL_SECONDS[base_interval] * 1000
+        self.max_candles = max_candles  # Предел глубины серии; глубже - прямой запрос интервала
+        self._series = {}  # symbol -> {'open_time', 'values', 'depth', 'updated'}
+        self._locks = SymbolLocks()
+        self._lock = threading.Lock()  # Словарь серий меняют потоки разных пар
+        self.requests = 0
+
+    def supports(self, interval, limit):
+        ratio = aggregation_ratio(self.base_interval, interval)
+        return ratio is not None and (limit + 1) * ratio <= self.max_candles
+
+    def _fetch(self, symbol, limit, start_time):
+        self.requests += 1
+        df = get_data(symbol, self.base_interval, limit, start_time=start_time)
+        if df.empty:
+            return None, None
+        return df['timestamp'].values.astype('datetime64[ms]').astype(np.int64), df[FIELDS].to_numpy(float)
+
+    def _load(self, symbol, start, until=None):
+        """Базовые свечи страницами от start до until (не включая), без until - по текущую."""
+        if until is None:
+            until = (int(time.time() * 1000) // self.base_ms + 1) * self.base_ms
+        times, values = [], []
+        while start < until:
+            limit = min(MAX_REQUEST, (until - start) // self.base_ms)
+            open_time, chunk = self._fetch(symbol, limit, start)
+            if open_time is None:
+                break
+            times.append(open_time)
+            values.append(chunk)
+            if len(open_time) < limit:
+                break
+            start = int(open_time[-1]) + self.base_ms
+        if not times:
+            return None, None
+        open_time, values = np.concatenate(times), np.concatenate(values)
+        keep = open_time < until
+        return open_time[keep], values[keep]
+
+    def _backfill(self, symbol, depth, series=None):
+        start = (int(time.time() * 1000) // self.base_ms - depth + 1) * self.base_ms
+        if series is None:
+            open_time, values = self._load(symbol, start)
+            if open_time is None:
+                return None
+            updated = time.monotonic()
+        else:
+            # Серия углубляется: догружаем только недостающее начало
+            open_time, values = self._load(symbol, start, int(series['open_time'][0]))
+            if open_time is None:
+                return series
+            open_time = np.concatenate([open_time, series['open_time']])
+            values = np.concatenate([values, series['values']])
+            updated = series['updated']
+        series = {'open_time': open_time, 'values': values, 'depth': depth, 'updated': updated}
+        with self._lock:
+            self._series[symbol] = series
+        return series
+
+    def _extend(self, symbol, series):
+        last = int(series['open_time'][-1])
+        missing = (int(time.time() * 1000) - last) // self.base_ms + 1
+        if missing >= MAX_REQUEST:
+            return self._backfill(symbol, series['depth'])  # Долгий перерыв - загружаем заново
+        open_time, values = self._fetch(symbol, missing + 1, last)
+        if open_time is None:
+            return series  # Ошибка уже в логе, остаются прежние свечи
+        # Формирующаяся свеча заменяется новой версией, серия обрезается до глубины
+        keep = series['open_time'] < open_time[0]
+        series = {'open_time': np.concatenate([series['open_time'][keep], open_time])[-series['depth']:],
+                  'values': np.concatenate([series['values'][keep], values])[-series['depth']:],
+                  'depth': series['depth'], 'updated': time.monotonic()}
+        with self._lock:
+            self._series[symbol] = series
+        return series
+
+    def klines(self, symbol, interval, limit, max_age):
+        """DataFrame свечей interval в формате get_data, собранный из базовых свечей."""
+        ratio = aggregation_ratio(self.base_interval, interval)
+        depth = (limit + 1) * ratio  # Запас на неполную первую свечу окна
+        with self._locks.get(symbol):
+            with self._lock:
+                series = self._series.get(symbol)
+            if series is None or series['depth'] < depth:
+                series = self._backfill(symbol, depth, series)
+            if series is not None and time.monotonic() - series['updated'] > max_age:
+                series = self._extend(symbol, series)
+        if series is None:
+            logging.warning("Нет базовых свечей %s для %s", self.base_interval, symbol,
+                            extra={'symbol': symbol, 'stage': 'klines'})
+            return pd.DataFrame()
+        # Массивы серии не меняются на месте, а заменяются, поэтому агрегация идет без блокировки
+        if ratio == 1:
+            candle_open, candles = series['open_time'], series['values']
+        else:
+            candle_open, candles = aggregate(series['open_time'], series['values'], interval)
+        candle_open, candles = candle_open[-limit:], candles[-limit:]
+        df = pd.DataFrame(candles, columns=FIELDS)
+        df.insert(0, 'timestamp', pd.to_datetime(candle_open, unit='ms'))
+        df['close_time'] = candle_open + INTERVAL_SECONDS[interval] * 1000 - 1
+        return df
+
+    def stats(self):
+        with self._lock:
+            series = list(self._series.values())
+        return {'symbols': len(series), 'candles': sum(len(s['open_time']) for s in series),
+                'requests': self.requests}
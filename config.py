@@ -1,28 +1,72 @@
 import configparser
 
+BASE_SECTION = 'binance_user_config'
+STRATEGY_PREFIX = 'strategy:'
 
-def load_config():
+
+def load_config(section=BASE_SECTION):
     config = configparser.ConfigParser()
     config.read('user.cfg')
+    # Секции стратегий [strategy:имя] переопределяют только нужные ключи,
+    # остальное берется из основной секции
+    user_config = config[BASE_SECTION]
+    if section != BASE_SECTION:
+        user_config = dict(config[BASE_SECTION])
+        user_config.update(config[section])
+    name = section[len(STRATEGY_PREFIX):] if section.startswith(STRATEGY_PREFIX) else ''
+    suffix = f"_{name}" if name else ''
+    trading_pairs_file = user_config.get('trading_pairs_file', f"trading_pairs{suffix}.txt")
     return {
-        'api_key': config['binance_user_config']['api_key'],
-        'api_secret': config['binance_user_config']['api_secret_key'],
-        'telegram_token': config['binance_user_config']['telegram_token'],
-        'telegram_chat_id': config['binance_user_config']['telegram_chat_id'],
-        'rsi_oversold': config['binance_user_config']['rsi_oversold'],
-        'rsi_overbought': config['binance_user_config']['rsi_overbought'],
-        'interval': config['binance_user_config']['interval'],
-        'fine_interval': config['binance_user_config']['fine_interval'],
-        'limit': config['binance_user_config']['limit'],
-        'bridge': config['binance_user_config']['bridge'],
-        'qty_to_invest': config['binance_user_config']['qty_to_invest'],
-        'cfg_min_profit': config['binance_user_config']['cfg_min_profit'],
-        'trading_pairs': load_trading_pairs('trading_pairs.txt'),
+        'name': name,
+        'api_key': user_config['api_key'],
+        'api_secret': user_config['api_secret_key'],
+        'telegram_token': user_config['telegram_token'],
+        'telegram_chat_id': user_config['telegram_chat_id'],
+        'rsi_oversold': user_config['rsi_oversold'],
+        'rsi_overbought': user_config['rsi_overbought'],
+        'interval': user_config['interval'],
+        'fine_interval': user_config['fine_interval'],
+        'limit': user_config['limit'],
+        'bridge': user_config['bridge'],
+        'qty_to_invest': user_config['qty_to_invest'],
+        'cfg_min_profit': user_config['cfg_min_profit'],
+        'max_slippage': user_config.get('max_slippage', '0.005'),
+        'max_symbol_exposure': user_config.get('max_symbol_exposure', '0'),
+        'max_total_exposure': user_config.get('max_total_exposure', '0'),
+        'max_drawdown': user_config.get('max_drawdown', '0'),
+        'max_btc_correlation': user_config.get('max_btc_correlation', '0'),
+        'take_profit': user_config.get('take_profit', '0'),
+        'trailing_stop': user_config.get('trailing_stop', '0'),
+        'trading_pairs_file': trading_pairs_file,
+        'profit_file': user_config.get('profit_file', f"total_profit{suffix}"),
+        'history_file': user_config.get('history_file', f"indicator_history{suffix}.bin"),
+        'record_file': config[BASE_SECTION].get('record_file', ''),
+        'status_socket': config[BASE_SECTION].get('status_socket', 'bbot.sock'),
+        'poll_weight_budget': config[BASE_SECTION].get('poll_weight_budget', '0'),
+        'poll_min_period': config[BASE_SECTION].get('poll_min_period', '1'),
+        'base_interval': config[BASE_SECTION].get('base_interval', ''),
+        'trading_pairs': load_trading_pairs(trading_pairs_file),
         'existing_pairs_limit': config['scan_config']['existing_pairs_limit'],
         'rsi_to_add': config['scan_config']['rsi_to_add'],
     }
 
 
+def load_strategy_sections():
+    """Список секций стратегий из user.cfg: основная и все [strategy:имя].
+
+    Основная секция работает всегда, пока она не отключена явно (main_strategy=off)
+    и есть хотя бы одна дополнительная.
+    """
+    config = configparser.ConfigParser()
+    config.read('user.cfg')
+    sections = [section for section in config.sections() if section.startswith(STRATEGY_PREFIX)]
+    main = config[BASE_SECTION].get('main_strategy', 'on').strip().lower() != 'off'
+    return ([BASE_SECTION] if main or not sections else []) + sections
+
+
 def load_trading_pairs(filename):
-    with open(filename, 'r') as file:
-        return [line.strip() for line in file if line.strip()]
+    try:
+        with open(filename, 'r') as file:
+            return [line.strip() for line in file if line.strip()]
+    except FileNotFoundError:
+        return []
@@ -0,0 +1,80 @@
+# exit_engine.py
+
+import time
+import threading
+
+
+class ExitEngine:
+    """Трейлинг-стоп и тейк-профит по открытым позициям стратегии.
+
+    Состояние каждой позиции (объем, цена покупки, пик цены) хранится в словаре,
+    и каждое обновление цены проверяется за O(1). При срабатывании вызывается
+    on_exit(symbol, reason, price); минимальный профит проверяется до вызова.
+    Параметр 0 отключает соответствующее правило.
+    """
+
+    def __init__(self, on_exit, commission_rate, min_profit, take_profit=0.0, trailing_stop=0.0, retry_after=10):
+        self.on_exit = on_exit
+        self.commission_rate = commission_rate
+        self.min_profit = min_profit  # Нижняя граница профита сделки, в bridge
+        self.take_profit = take_profit  # Рост цены от покупки для фиксации профита, доля
+        self.trailing_stop = trailing_stop  # Откат от пика для выхода, доля
+        self.retry_after = retry_after  # Пауза перед повтором после неудачной продажи, сек
+        self.positions = {}  # symbol -> состояние позиции
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.take_profit > 0 or self.trailing_stop > 0
+
+    def set_positions(self, positions, min_qty):
+        """Синхронизирует позиции со снимком тика; пик цены сохраняется, пока не сменилась покупка."""
+        with self._lock:
+            current = {}
+            for symbol, position in positions.items():
+                quantity, buy_price = position['free'], position['price']
+                if buy_price is None or quantity < min_qty(symbol):
+                    continue
+                state = self.positions.get(symbol)
+                if state is None or state['buy_price'] != buy_price:
+                    state = {'buy_price': buy_price, 'peak': buy_price, 'pending': False, 'retry_at': 0.0}
+                state['quantity'] = quantity
+                current[symbol] = state
+            self.positions = current
+
+    def _profit(self, state, price):
+        quantity = state['quantity']
+        return (price - state['buy_price']) * quantity - price * quantity * self.commission_rate
+
+    def on_price(self, symbol, price):
+        """Проверка правил выхода по новой цене пары."""
+        state = self.positions.get(symbol)
+        if state is None or price is None:
+            return None
+        with self._lock:
+            if state['pending'] or time.monotonic() < state['retry_at']:
+                return None
+            if price > state['peak']:
+                state['peak'] = price
+            reason = None
+            if self.take_profit > 0 and price >= state['buy_price'] * (1 + self.take_profit):
+                reason = 'take_profit'
+            elif self.trailing_stop > 0 and state['peak'] > state['buy_price'] \
+                    and price <= state['peak'] * (1 - self.trailing_stop):
+                reason = 'trailing_stop'
+            if reason is None or self._profit(state, price) < self.min_profit:
+                return None
+            state['pending'] = True
+        self.on_exit(symbol, reason, price)
+        return reason
+
+    def finish(self, symbol, sold):
+        """Итог продажи: позиция закрыта или повтор после паузы."""
+        with self._lock:
+            if sold:
+                self.positions.pop(symbol, None)
+                return
+            state = self.positions.get(symbol)
+            if state is not None:
+                state['pending'] = False
+                state['retry_at'] = time.monotonic() + self.retry_after
@@ -1,7 +1,26 @@
 # indicator_display.py
 
 import urwid
-import pandas as pd
+from status_api import status_rows
+
+SPARK_CHARS = '▁▂▃▄▅▆▇█'
+SPARK_WIDTH = 24  # Сколько последних тиков показывать в истории RSI
+
+# Стили urwid
+PALETTE = [
+    ('low_rsi', 'dark red', 'default'),
+    ('medium_rsi', 'yellow', 'default'),
+    ('high_rsi', 'light green', 'default'),
+    ('growth', 'light green', 'default'),
+    ('fall', 'dark red', 'default'),
+    ('positive_profit', 'light green', 'default'),
+    ('neutral_profit', 'yellow', 'default'),
+    ('loss', 'dark red', 'default'),
+    ('blue_text', 'light blue', 'default'),
+    ('green_text', 'light green', 'default'),
+    ('symbol_text', 'light cyan', 'default'),
+    ('default', 'default', 'default'),
+]
 
 
 def format_rsi_display(last_rsi):
@@ -37,44 +56,62 @@ def format_profit_display(profit, min_profit):
         return ("positive_profit", str(profit))
 
 
-def calculate_profit(current_price, buy_price, balance, commission_rate):
-    if buy_price != 'N/A' and balance > 0:
-        return round((current_price - buy_price) * balance - (current_price * balance * commission_rate), 2)
-    return "N/A"
+def format_period(seconds):
+    """Период опроса пары коротко: 1s, 45s, 12m, 4h."""
+    if seconds == "N/A":
+        return "N/A"
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def sparkline(values, lo=None, hi=None):
+    """Строка-спарклайн из значений истории (NaN пропускаются)."""
+    values = [float(v) for v in values if v == v]
+    if not values:
+        return ""
+    lo = min(values) if lo is None else lo
+    hi = max(values) if hi is None else hi
+    span = (hi - lo) or 1.0
+    top = len(SPARK_CHARS) - 1
+    return ''.join(SPARK_CHARS[min(top, max(0, int((v - lo) / span * top + 0.5)))] for v in values)
 
 
 def display_indicators(trading_pairs, data, account_balances, bridge_balance,
                        btc_price, total_profit, trends, logger,
-                       get_symbol_info_from_binance, min_profit, bridge,
-                       commission_rate):
-    # Стили urwid
-    palette = [
-        ('low_rsi', 'dark red', 'default'),
-        ('medium_rsi', 'yellow', 'default'),
-        ('high_rsi', 'light green', 'default'),
-        ('growth', 'light green', 'default'),
-        ('fall', 'dark red', 'default'),
-        ('positive_profit', 'light green', 'default'),
-        ('neutral_profit', 'yellow', 'default'),
-        ('loss', 'dark red', 'default'),
-        ('blue_text', 'light blue', 'default'),
-        ('green_text', 'light green', 'default'),
-        ('symbol_text', 'light cyan', 'default'),
-        ('default', 'default', 'default'),
-    ]
+                       position_info, min_profit, bridge,
+                       commission_rate, history=None, prices=None, candidates=None, cadence=None, poll=None):
+    rows = status_rows(trading_pairs, data, account_balances, trends, position_info,
+                       bridge, commission_rate, history, prices, SPARK_WIDTH, cadence)
+    header = {'bridge': bridge, 'bridge_balance': bridge_balance, 'total_profit': total_profit,
+              'btc_price': btc_price, 'min_profit': min_profit, 'poll': poll}
+    return render_status(header, rows, candidates)
+
+
+def render_status(header, rows, candidates=None):
+    """Виджет интерфейса из статуса стратегии (заголовок, строки пар, кандидаты сканера)."""
+    bridge = header['bridge']
+    min_profit = header['min_profit']
 
     # Заголовок баланса и профита
     balance_text = urwid.Text([
         ('blue_text', f" Текущий баланс {bridge}:"),
-        ('green_text', f"{bridge_balance}"),
+        ('green_text', f"{header['bridge_balance']}"),
         ('default', " | "),
         ('blue_text', "Профит:"),
-        ('green_text', f"{total_profit}"),
+        ('green_text', f"{header['total_profit']}"),
         ('default', " | "),
-        ('blue_text', f"1 BTC"),
+        ('blue_text', "1 BTC"),
         ('default', " = "),
-        ('green_text', f"{btc_price} USDT")
-    ])
+        ('green_text', f"{header['btc_price']} USDT")
+    ] + ([
+        # Расход бюджета адаптивного опроса свечей за последнюю минуту
+        ('default', " | "),
+        ('blue_text', "Вес/мин:"),
+        ('green_text', f"{header['poll']['used']}/{header['poll']['budget']:g}"),
+    ] if header.get('poll') else []))
     balance_box = urwid.LineBox(balance_text, title="Информация о Балансе")
 
     # Заголовки таблицы
@@ -82,35 +119,25 @@ def display_indicators(trading_pairs, data, account_balances, bridge_balance,
         urwid.Columns([
             urwid.Text("Лот", align='left'),
             urwid.Text("RSI", align='left'),
+            urwid.Text("История RSI", align='left'),
             urwid.Text("Тренд", align='left'),
             urwid.Text("Цена", align='left'),
             urwid.Text("Цена покупки", align='left'),
             urwid.Text("Профит", align='left'),
             urwid.Text("Баланс", align='left'),
+            urwid.Text("Опрос", align='left'),
         ]), 'default'
     )
 
     table_rows = [table_header, urwid.Divider('-')]  # Добавим заголовок и горизонтальный разделитель
 
     # Заполнение строк данными
-    for symbol in trading_pairs:
-        if symbol not in data:
-            continue
-
-        df = data[symbol]
-        if df.empty:
-            continue
-
-        # Получаем данные для строки
-        last_rsi = round(float(df['rsi'].iloc[-1]), 1) if pd.notna(df['rsi'].iloc[-1]) else "N/A"
-        current_price = round(float(df['close'].iloc[-1]), 6) if pd.notna(df['close'].iloc[-1]) else "N/A"
-        balance = round(account_balances.get(symbol.replace(bridge, ''), 0), 6)
-        tb_balance = f"{balance:.8f}".rstrip('0').rstrip('.')
-        last_trend = trends.get(symbol, "N/A")
-
-        symbol_info = get_symbol_info_from_binance(symbol)
-        buy_price = round(float(symbol_info['price']), 6) if symbol_info and 'price' in symbol_info and symbol_info['price'] is not None else 'N/A'
-        profit = calculate_profit(current_price, buy_price, balance, commission_rate) if current_price != "N/A" and buy_price != "N/A" else "N/A"
+    for data in rows:
+        last_rsi = data['rsi']
+        last_trend = data['trend']
+        profit = data['profit']
+        tb_balance = f"{data['balance']:.8f}".rstrip('0').rstrip('.')
+        rsi_history = sparkline([value for value in data['rsi_history'] if value is not None], 0, 100)
 
         # Форматируем отображение с применением цветового стиля
         last_rsi_display = urwid.AttrMap(urwid.Text(format_rsi_display(last_rsi)), format_rsi_display(last_rsi)[0])
@@ -118,13 +145,15 @@ def display_indicators(trading_pairs, data, account_balances, bridge_balance,
         profit_display = urwid.AttrMap(urwid.Text(format_profit_display(profit, min_profit)), format_profit_display(profit, min_profit)[0])
 
         row = urwid.Columns([
-            urwid.Text([('symbol_text', f"{symbol.replace('USDT', '')}")]),
+            urwid.Text([('symbol_text', f"{data['symbol'].replace('USDT', '')}")]),
             last_rsi_display,
+            urwid.Text(rsi_history),
             last_trend_display,
-            urwid.Text(str(current_price)),
-            urwid.Text(str(buy_price)),
+            urwid.Text(str(data['price'])),
+            urwid.Text(str(data['buy_price'])),
             profit_display,
             urwid.Text(tb_balance),
+            urwid.Text(format_period(data.get('poll', "N/A"))),
         ], dividechars=2)
 
         # Обернем строку в `AttrMap` и добавим горизонтальный разделитель
@@ -135,7 +164,15 @@ def display_indicators(trading_pairs, data, account_balances, bridge_balance,
     table_box = urwid.LineBox(table_list, title="Торговые Пары")
 
     # Главный контейнер
-    main_view = urwid.Pile([balance_box, table_box])
+    widgets = [balance_box, table_box]
+    if candidates:
+        # Рейтинг кандидатов из файла сканера, без повторного сканирования
+        candidates_text = urwid.Text([
+            part for symbol, rsi in candidates
+            for part in (('symbol_text', f"{symbol.replace('USDT', '')}"), ('default', f" {rsi:.1f}  "))
+        ])
+        widgets.append(urwid.LineBox(candidates_text, title="Кандидаты сканера"))
+    main_view = urwid.Pile(widgets)
 
     # Возвращаем обернутый виджет для корректного отображения
     return urwid.Filler(main_view, valign='top')
@@ -0,0 +1,118 @@
+# indicator_history.py
+
+import time
+import logging
+import threading
+import numpy as np
+
+# Строка истории одной пары за тик
+HISTORY_DTYPE = np.dtype([
+    ('ts', 'f8'), ('rsi', 'f4'), ('histogram', 'f4'),
+    ('trend', 'i1'), ('price', 'f8'), ('decision', 'i1'),
+])
+# Запись в файле: та же строка плюс имя пары
+RECORD_DTYPE = np.dtype([('symbol', 'S20')] + HISTORY_DTYPE.descr)
+
+TRENDS = {'fall': -1, 'flat': 0, 'growth': 1}
+# Чем закончился тик для пары
+DECISIONS = {'none': 0, 'candidate': 1, 'skip': 2, 'buy': 3, 'sell': 4}
+
+
+class RingSeries:
+    """Кольцевой буфер фиксированного размера со строками HISTORY_DTYPE."""
+
+    def __init__(self, capacity):
+        self.data = np.zeros(capacity, dtype=HISTORY_DTYPE)
+        self.capacity = capacity
+        self.head = 0  # Куда писать следующую строку
+        self.count = 0
+
+    def append(self, row):
+        self.data[self.head] = row
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def ordered(self):
+        """Строки от старых к новым (копия)."""
+        if self.count < self.capacity:
+            return self.data[:self.count].copy()
+        return np.concatenate((self.data[self.head:], self.data[:self.head]))
+
+    def last(self, field, count):
+        """Последние count значений поля от старых к новым."""
+        count = min(count, self.count)
+        index = (np.arange(self.head - count, self.head)) % self.capacity
+        return self.data[field][index]
+
+
+class IndicatorHistory:
+    """История RSI, гистограммы, тренда, цены и решений по каждой паре.
+
+    В памяти хранится фиксированное число тиков на пару, новые строки
+    периодически дописываются в файл (только добавление).
+    """
+
+    def __init__(self, path, capacity=1440, flush_every=60):
+        self.path = path
+        self.capacity = capacity
+        self.flush_every = flush_every  # Период сброса на диск, сек
+        self.series = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, symbol, rsi, histogram, trend, price, decision, ts=None):
+        ts = time.time() if ts is None else ts
+        row = (ts, rsi, histogram, TRENDS.get(trend, 0), price, DECISIONS.get(decision, 0))
+        with self._lock:
+            series = self.series.get(symbol)
+            if series is None:
+                series = self.series[symbol] = RingSeries(self.capacity)
+            series.append(row)
+            self._pending.append((symbol.encode(),) + row)
+
+    def last(self, symbol, field, count):
+        """Последние значения поля пары для отрисовки без пересчета индикаторов."""
+        with self._lock:
+            series = self.series.get(symbol)
+            if series is None:
+                return np.empty(0, dtype=HISTORY_DTYPE[field])
+            return series.last(field, count)
+
+    def history(self, symbol):
+        with self._lock:
+            series = self.series.get(symbol)
+            return series.ordered() if series is not None else np.empty(0, dtype=HISTORY_DTYPE)
+
+    def drop(self, symbol):
+        """Удаляет буфер пары, которая больше не наблюдается; несброшенные строки остаются в очереди записи."""
+        with self._lock:
+            self.series.pop(symbol, None)
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Дописывает накопленные строки в файл истории."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            records = np.array(pending, dtype=RECORD_DTYPE)
+            with open(self.path, 'ab') as file:
+                records.tofile(file)
+        except OSError as e:
+            logging.error("Ошибка записи истории индикаторов в %s: %s", self.path, e, extra={'stage': 'history'})
+            return 0
+        return len(pending)
+
+
+def load_history(path, symbol=None):
+    """Читает файл истории для разбора после сделок."""
+    records = np.fromfile(path, dtype=RECORD_DTYPE)
+    if symbol is not None:
+        records = records[records['symbol'] == symbol.encode()]
+    return records
@@ -0,0 +1,171 @@
+# kline_cache.py
+
+import time
+import calendar
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Длительность интервалов свечей Binance в секундах
+INTERVAL_SECONDS = {
+    '1m': 60, '3m': 180, '5m': 300, '15m': 900, '30m': 1800,
+    '1h': 3600, '2h': 7200, '4h': 14400, '6h': 21600, '8h': 28800, '12h': 43200,
+    '1d': 86400, '3d': 259200, '1w': 604800, '1M': 2592000,
+}
+# Недельные свечи Binance начинаются в понедельник, а эпоха - в четверг
+WEEK_OFFSET = 4 * 86400
+
+
+def next_candle_close(interval, now=None):
+    """Время (unix, сек) закрытия текущей свечи интервала."""
+    now = time.time() if now is None else now
+    if interval == '1M':
+        tm = time.gmtime(now)
+        year, month = (tm.tm_year + 1, 1) if tm.tm_mon == 12 else (tm.tm_year, tm.tm_mon + 1)
+        return calendar.timegm((year, month, 1, 0, 0, 0))
+    seconds = INTERVAL_SECONDS[interval]
+    offset = WEEK_OFFSET if interval == '1w' else 0
+    return (int(now - offset) // seconds + 1) * seconds + offset
+
+
+class KlineCache:
+    """Ограниченный LRU-кэш цен закрытия с временем жизни до закрытия свечи.
+
+    Закрытые свечи живут до закрытия текущей, а цена формирующейся (последней)
+    свечи - только forming_ttl секунд: потом ее достаточно обновить одной свечой.
+    Цены хранятся компактными массивами float64, устаревшие записи
+    удаляются фоновым потоком, статистика доступна через stats().
+    """
+
+    def __init__(self, interval, max_entries=500, max_bytes=16 * 1024 * 1024,
+                 min_ttl=5, sweep_period=30, forming_ttl=60):
+        self.interval = interval
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.min_ttl = min_ttl  # Не даем записи умереть сразу после закрытия свечи
+        self.sweep_period = sweep_period
+        self.forming_ttl = forming_ttl  # Свежесть цены формирующейся свечи, сек
+        self._data = OrderedDict()  # symbol -> (closes, expires_at, candle_close, forming_until)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.refreshes = 0
+
+    def get(self, symbol, now=None):
+        """Возвращает массив цен закрытия или None, если записи нет или она устарела.
+
+        Если устарела только цена формирующейся свечи, запись остается, и ее
+        можно обновить через refresh() без загрузки всех свечей.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._data.get(symbol)
+            if entry is None:
+                self.misses += 1
+                return None
+            closes, expires_at, _, forming_until = entry
+            if now >= expires_at:
+                self._remove(symbol)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if now >= forming_until:
+                self.misses += 1
+                return None
+            self._data.move_to_end(symbol)
+            self.hits += 1
+            return closes
+
+    def candle_close(self, symbol, now=None):
+        """Время закрытия формирующейся свечи записи, если закрытые свечи в ней еще актуальны."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._data.get(symbol)
+            return entry[2] if entry is not None and now < entry[1] else None
+
+    def refresh(self, symbol, close, now=None):
+        """Обновляет цену формирующейся свечи; None, если записи уже нет."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._data.get(symbol)
+            if entry is None or now >= entry[1]:
+                return None
+            closes = entry[0].copy()
+            closes[-1] = close
+            closes.setflags(write=False)
+            self._data[symbol] = (closes, entry[1], entry[2], min(entry[1], now + self.forming_ttl))
+            self._data.move_to_end(symbol)
+            self.refreshes += 1
+            return closes
+
+    def put(self, symbol, closes, now=None):
+        """Кладет цены закрытия в кэш до закрытия текущей свечи интервала."""
+        now = time.time() if now is None else now
+        closes = np.ascontiguousarray(closes, dtype=np.float64)
+        closes.setflags(write=False)
+        candle_close = next_candle_close(self.interval, now)
+        expires_at = max(candle_close, now + self.min_ttl)
+        with self._lock:
+            if symbol in self._data:
+                self._remove(symbol)
+            self._data[symbol] = (closes, expires_at, candle_close, min(expires_at, now + self.forming_ttl))
+            self.bytes += closes.nbytes
+            # Вытесняем самые давно использованные записи сверх лимитов
+            while self._data and (len(self._data) > self.max_entries or self.bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+        return closes
+
+    def _remove(self, symbol):
+        closes = self._data.pop(symbol)[0]
+        self.bytes -= closes.nbytes
+
+    def sweep(self, now=None):
+        """Удаляет все устаревшие записи."""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [symbol for symbol, entry in self._data.items() if now >= entry[1]]
+            for symbol in expired:
+                self._remove(symbol)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_period):
+            try:
+                self.sweep()
+            except Exception as e:
+                logging.error("Ошибка очистки кэша свечей: %s", e, extra={'stage': 'klines'})
+
+    def start(self):
+        """Запускает фоновую очистку устаревших записей."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._sweep_loop, name='kline-cache-sweep', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'refreshes': self.refreshes,
+            }
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# logview.py
+
+import os
+import sys
+import json
+import time
+import argparse
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+COLORS = {'WARNING': '\033[33m', 'ERROR': '\033[31m', 'CRITICAL': '\033[1;31m'}
+RESET = '\033[0m'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Просмотр JSON-логов бота с фильтрами.")
+    parser.add_argument('file', nargs='?', default='trading_bot.log', help="файл лога")
+    parser.add_argument('-f', '--follow', action='store_true', help="следить за новыми записями")
+    parser.add_argument('-n', '--lines', type=int, default=50, help="сколько последних записей показать")
+    parser.add_argument('-l', '--level', default='INFO', choices=LEVELS, help="минимальный уровень")
+    parser.add_argument('-s', '--symbol', help="только указанная пара")
+    parser.add_argument('--stage', help="только указанный этап")
+    parser.add_argument('--strategy', help="только указанная стратегия")
+    parser.add_argument('-g', '--grep', help="подстрока в тексте сообщения")
+    parser.add_argument('--no-color', action='store_true', help="без цвета")
+    return parser.parse_args()
+
+
+def matches(entry, args):
+    if LEVELS.get(entry.get('level'), 0) < LEVELS[args.level]:
+        return False
+    if args.symbol and entry.get('symbol') != args.symbol:
+        return False
+    if args.stage and entry.get('stage') != args.stage:
+        return False
+    if args.strategy and entry.get('strategy') != args.strategy:
+        return False
+    if args.grep and args.grep not in entry.get('msg', ''):
+        return False
+    return True
+
+
+def render(entry, color=True):
+    """Строка лога в читаемом виде: время, уровень, поля и сообщение."""
+    ts = entry.get('ts', '')[11:19]
+    level = entry.get('level', '')
+    parts = [ts, f"{level:<7}"]
+    if entry.get('strategy'):
+        parts.append(f"[{entry['strategy']}]")
+    if entry.get('symbol'):
+        parts.append(entry['symbol'])
+    if entry.get('stage'):
+        parts.append(f"<{entry['stage']}>")
+    parts.append(entry.get('msg', ''))
+    if entry.get('latency_ms') is not None:
+        parts.append(f"({entry['latency_ms']:.1f} мс)")
+    if entry.get('suppressed'):
+        parts.append(f"(+{entry['suppressed']} повторов)")
+    line = ' '.join(parts)
+    if entry.get('exc'):
+        line += '\n' + entry['exc']
+    if color and level in COLORS:
+        line = COLORS[level] + line + RESET
+    return line
+
+
+def parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        # Старые текстовые строки показываем как есть
+        return {'level': 'INFO', 'msg': line.rstrip('\n')}
+
+
+def tail(path, count):
+    """Последние count строк файла без чтения всего файла в память."""
+    with open(path, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        block = 64 * 1024
+        data = b''
+        while size > 0 and data.count(b'\n') <= count:
+            step = min(block, size)
+            size -= step
+            file.seek(size)
+            data = file.read(step) + data
+    return data.decode('utf-8', errors='replace').splitlines()[-count:]
+
+
+def follow(path, args, color):
+    """Следит за файлом, в том числе после ротации."""
+    file = open(path, 'r', encoding='utf-8', errors='replace')
+    file.seek(0, os.SEEK_END)
+    inode = os.fstat(file.fileno()).st_ino
+    while True:
+        line = file.readline()
+        if line:
+            entry = parse_line(line)
+            if matches(entry, args):
+                print(render(entry, color), flush=True)
+            continue
+        time.sleep(0.5)
+        try:
+            if os.stat(path).st_ino != inode:
+                # Файл ротирован - переходим на новый
+                file.close()
+                file = open(path, 'r', encoding='utf-8', errors='replace')
+                inode = os.fstat(file.fileno()).st_ino
+        except FileNotFoundError:
+            pass
+
+
+def main():
+    args = parse_args()
+    color = not args.no_color and sys.stdout.isatty()
+    if not os.path.exists(args.file):
+        print(f"Файл {args.file} не найден.", file=sys.stderr)
+        return 1
+    # Берем с запасом, так как часть строк отсеют фильтры
+    shown = [entry for entry in map(parse_line, tail(args.file, args.lines * 20)) if matches(entry, args)]
+    for entry in shown[-args.lines:]:
+        print(render(entry, color))
+    if args.follow:
+        try:
+            follow(args.file, args, color)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
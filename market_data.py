@@ -0,0 +1,92 @@
+# market_data.py
+
+import time
+import threading
+from binance_client import get_data, calculate_rsi, calculate_macd_histogram
+from trade_executor import SymbolLocks
+from order_book import OrderBookManager
+from price_service import PriceService
+from poll_scheduler import PollScheduler
+from candle_aggregator import CandleAggregator
+
+# Индикаторы, которые слой данных умеет досчитывать к свечам
+INDICATORS = {
+    'rsi': calculate_rsi,
+    'macd': calculate_macd_histogram,
+}
+
+
+class MarketData:
+    """Общий слой рыночных данных и кэш индикаторов для всех стратегий процесса.
+
+    Одинаковые запросы свечей от разных стратегий в пределах ttl обслуживаются
+    одним обращением к бирже, а индикаторы считаются один раз на обновление.
+    """
+
+    def __init__(self, ttl=4, idle_ttl=600, poll_weight_budget=0, poll_min_period=1, base_interval=''):
+        self.ttl = ttl  # Сколько секунд свечи считаются свежими
+        self.idle_ttl = idle_ttl  # Через сколько секунд без обращений запись удаляется
+        self._entries = {}  # (symbol, interval, limit) -> запись кэша
+        self._locks = SymbolLocks()
+        self._stats_lock = threading.Lock()
+        self.books = OrderBookManager()  # Локальные стаканы наблюдаемых пар
+        self.prices = PriceService()  # Текущие цены пар одним пакетным запросом
+        # Фоновый опрос свечей с периодом по близости RSI к границам
+        self.poller = PollScheduler(self, poll_weight_budget, poll_min_period)
+        # Свечи всех интервалов из одной серии базовых свечей пары; '' - каждый интервал запрашивается отдельно
+        self.candles = CandleAggregator(base_interval) if base_interval else None
+        self.requests = 0
+        self.hits = 0
+
+    def klines(self, symbol, interval, limit, indicators=(), max_age=None):
+        """DataFrame свечей с запрошенными индикаторами. Результат нельзя изменять."""
+        key = (symbol, interval, limit)
+        max_age = self.ttl if max_age is None else max_age
+        # Блокировка по ключу: параллельные стратегии ждут один общий запрос
+        with self._locks.get(key):
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is None or now - entry['updated'] > max_age:
+                df = self._fetch(symbol, interval, limit, max_age)
+                entry = {'df': df, 'updated': now, 'indicators': set(), 'used': now}
+                self._entries[key] = entry
+                with self._stats_lock:
+                    self.requests += 1
+            else:
+                entry['used'] = now
+                with self._stats_lock:
+                    self.hits += 1
+
+            missing = [name for name in indicators if name not in entry['indicators']]
+            if missing and not entry['df'].empty:
+                # Считаем на копии, чтобы не менять DataFrame, который уже читают другие
+                df = entry['df'].copy()
+                for name in missing:
+                    df = INDICATORS[name](df)
+                entry['df'] = df
+                entry['indicators'].update(missing)
+            return entry['df']
+
+    def _fetch(self, symbol, interval, limit, max_age):
+        if self.candles is not None and self.candles.supports(interval, limit):
+            return self.candles.klines(symbol, interval, limit, max_age)
+        return get_data(symbol, interval, limit)
+
+    def prune(self):
+        """Удаляет записи, к которым давно не обращались."""
+        now = time.monotonic()
+        for key in [key for key, entry in list(self._entries.items()) if now - entry['used'] > self.idle_ttl]:
+            with self._locks.get(key):
+                entry = self._entries.get(key)
+                if entry and now - entry['used'] > self.idle_ttl:
+                    del self._entries[key]
+            # Блокировки ушедших из наблюдения пар тоже не должны накапливаться
+            if key not in self._entries:
+                self._locks.discard(key)
+
+    def stats(self):
+        with self._stats_lock:
+            stats = {'entries': len(self._entries), 'requests': self.requests, 'hits': self.hits}
+        if self.candles is not None:
+            stats['base'] = self.candles.stats()
+        return stats
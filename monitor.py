@@ -1,64 +1,287 @@
 #!/usr/bin/env python3
+# monitor.py
 
+import os
+import sys
 import time
+import signal
+import struct
+import ctypes
+import ctypes.util
+import logging
+import argparse
+import selectors
+import threading
 import subprocess
 from pathlib import Path
+from async_logging import setup_logging
+from config import load_config
+from status_api import StatusClient
 
-# Пути и настройки
-trading_pairs_path = Path("trading_pairs.txt")
-script_name = "bbot.py"
-tmux_window = "bbot"
-tmux_pane = "0.0"
+# Флаги inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+EVENT_HEADER = struct.Struct('iIII')
+POLL_PERIOD = 5  # Период опроса файлов, если inotify недоступен, сек
 
 
-def restart_bbot():
-    """Функция для перезапуска bbot.py в указанной tmux панели."""
-    # Отправляем Ctrl+C для завершения предыдущего процесса, если он есть
-    stop_cmd = subprocess.run(["tmux", "send-keys", "-t", f"{tmux_window}:{tmux_pane}", "C-c"], check=False)
-    if stop_cmd.returncode != 0:
-        print("Ошибка: не удалось отправить Ctrl+C. Проверьте, что сессия tmux существует.")
+class FileWatcher:
+    """Изменения файлов каталога через inotify; без inotify - опрос mtime."""
 
-    # Отправляем команду для запуска bbot.py
-    start_cmd = subprocess.run(["tmux", "send-keys", "-t", f"{tmux_window}:{tmux_pane}", f"python3 {script_name}", "Enter"], check=False)
-    if start_cmd.returncode != 0:
-        print("Ошибка: не удалось запустить bbot.py. Проверьте, что сессия tmux существует.")
+    def __init__(self, directory, names):
+        self.directory = str(directory)
+        self.names = set(names)
+        self.fd = None
+        self._mtimes = self._stat()
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            # Следим за каталогом: редакторы часто заменяют файл переименованием
+            if fd >= 0 and libc.inotify_add_watch(fd, self.directory.encode(),
+                                                  IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) >= 0:
+                self.fd = fd
+        except (OSError, AttributeError):
+            self.fd = None
+        if self.fd is None:
+            logging.warning("inotify недоступен, файлы проверяются раз в %s с", POLL_PERIOD, extra={'stage': 'supervisor'})
+
+    def _stat(self):
+        mtimes = {}
+        for name in self.names:
+            try:
+                mtimes[name] = os.stat(os.path.join(self.directory, name)).st_mtime
+            except FileNotFoundError:
+                mtimes[name] = None
+        return mtimes
+
+    def read(self):
+        """Имена изменившихся файлов из числа наблюдаемых."""
+        if self.fd is None:
+            mtimes = self._stat()
+            changed = {name for name in self.names if mtimes[name] != self._mtimes[name]}
+            self._mtimes = mtimes
+            return changed
+        changed = set()
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            if name in self.names:
+                changed.add(name)
+        return changed
+
+
+class Supervisor:
+    """Запускает бота дочерним процессом и перезапускает его по событиям, а не по опросу.
+
+    Завершение ребенка ловится через pidfd (или поток, ждущий wait), изменения
+    конфигурации - через inotify, зависание - по API статуса. Остановка мягкая:
+    SIGTERM, чтобы бот дождался сделок в работе, и SIGKILL только после grace секунд.
+    """
+
+    def __init__(self, script, watch_files, reload_files=(), status_socket=None, grace=30,
+                 health_timeout=60, min_backoff=1, max_backoff=60, stable_after=60):
+        self.script = script
+        self.watch_files = set(watch_files)  # Изменение - мягкий перезапуск
+        self.reload_files = set(reload_files)  # Изменение бот подхватывает сам
+        self.status_socket = status_socket
+        self.grace = grace
+        self.health_timeout = health_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after  # После стольких секунд работы счетчик сбоев сбрасывается
+        self.selector = selectors.DefaultSelector()
+        self.process = None
+        self.started_at = None
+        self.stopped_at = time.monotonic()
+        self.failures = 0
+        self.restarts = 0
+        self.downtime = 0.0
+        self.restart_at = 0.0
+        self.stopping = False
+        self._restart_reason = None
+        self._planned = False
+        self._exit_fd = None
+        self._status = None
+        self._status_version = None
+        self._status_changed = None
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_w, False)
+
+    # Запуск и ожидание дочернего процесса
+
+    def start_child(self):
+        self.process = subprocess.Popen([sys.executable, self.script])
+        self.started_at = time.monotonic()
+        down = self.started_at - self.stopped_at
+        self.downtime += down
+        logging.info("Запущен %s (pid %s), простой %.1f с, всего перезапусков %s, суммарный простой %.1f с",
+                     self.script, self.process.pid, down, self.restarts, self.downtime, extra={'stage': 'supervisor'})
+        try:
+            self._exit_fd = os.pidfd_open(self.process.pid)
+        except (AttributeError, OSError):
+            # Без pidfd ждем завершения в отдельном потоке и будим цикл через pipe
+            self._exit_fd = None
+            threading.Thread(target=self._wait_child, args=(self.process,), daemon=True).start()
+        else:
+            self.selector.register(self._exit_fd, selectors.EVENT_READ, 'exit')
+        self._status_changed = self.started_at
+
+    def _wait_child(self, process):
+        process.wait()
+        os.write(self._wake_w, b'x')
+
+    def on_child_exit(self):
+        code = self.process.wait()
+        if self._exit_fd is not None:
+            self.selector.unregister(self._exit_fd)
+            os.close(self._exit_fd)
+            self._exit_fd = None
+        self._disconnect_status()
+        now = time.monotonic()
+        uptime = now - self.started_at
+        self.stopped_at = now
+        self.process = None
+        if self.stopping:
+            return
+        reason, self._restart_reason = self._restart_reason or f"завершился с кодом {code}", None
+        if self._planned:
+            self.failures = 0  # Плановый перезапуск, не сбой
+        else:
+            self.failures = 0 if uptime >= self.stable_after else self.failures + 1
+        self._planned = False
+        delay = 0 if self.failures == 0 else min(self.max_backoff, self.min_backoff * 2 ** (self.failures - 1))
+        self.restarts += 1
+        self.restart_at = now + delay
+        logging.warning("%s %s после %.1f с работы; перезапуск #%s через %.1f с",
+                        self.script, reason, uptime, self.restarts, delay, extra={'stage': 'supervisor'})
 
+    def stop_child(self, reason=None, planned=True):
+        """Мягкая остановка: SIGTERM, а после grace секунд - SIGKILL."""
+        if self.process is None or self.process.poll() is not None:
+            return
+        self._restart_reason = reason
+        self._planned = planned
+        logging.info("Остановка %s: %s", self.script, reason or "завершение супервизора", extra={'stage': 'supervisor'})
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(timeout=self.grace)
+        except subprocess.TimeoutExpired:
+            logging.error("%s не завершился за %s с, SIGKILL", self.script, self.grace, extra={'stage': 'supervisor'})
+            self.process.kill()
+            self.process.wait()
+        if self._exit_fd is None:
+            return  # Поток ожидания сам разбудит цикл
+        self.on_child_exit()
+
+    # Проверка живости по API статуса
 
-def monitor_file_changes():
-    """Отслеживает изменения файла trading_pairs.txt и перезапускает bbot.py при изменении."""
-    last_modified = trading_pairs_path.stat().st_mtime
-    while True:
+    def _connect_status(self):
+        if not self.status_socket or self._status is not None:
+            return
+        client = StatusClient(self.status_socket)
         try:
-            current_modified = trading_pairs_path.stat().st_mtime
-            if current_modified != last_modified:
-                print(f"Изменения в {trading_pairs_path}. Перезапуск {script_name}...")
-                restart_bbot()
-                last_modified = current_modified
-            time.sleep(5)  # Проверка каждые 5 секунд
-        except FileNotFoundError:
-            print(f"Файл {trading_pairs_path} не найден.")
-            time.sleep(5)
-
-
-def monitor_bbot_process():
-    """Контролирует работу bbot.py и перезапускает его в случае остановки или ошибки."""
-    while True:
-        # Проверяем, запущен ли процесс bbot.py
-        result = subprocess.run(["pgrep", "-f", script_name], capture_output=True)
-        if result.returncode != 0:
-            print(f"{script_name} не запущен. Перезапуск...")
-            restart_bbot()
-        time.sleep(5)  # Проверка каждые 5 секунд
+            client.connect()
+        except OSError:
+            return  # Бот еще не открыл сокет
+        self._status = client
+        self.selector.register(client.sock, selectors.EVENT_READ, 'status')
+
+    def _disconnect_status(self):
+        if self._status is not None:
+            self.selector.unregister(self._status.sock)
+            self._status.close()
+            self._status = None
+
+    def on_status(self):
+        try:
+            self._status.read()
+        except (OSError, ValueError):
+            self._disconnect_status()
+            return
+        if self._status.version != self._status_version:
+            self._status_version = self._status.version
+            self._status_changed = time.monotonic()
+
+    def check_health(self, now):
+        if not self.status_socket or self.process is None:
+            return
+        self._connect_status()
+        if now - self._status_changed > self.health_timeout:
+            self.stop_child(f"нет новых тиков в API статуса {self.health_timeout} с", planned=False)
+
+    # Основной цикл
+
+    def run(self):
+        watcher = FileWatcher(Path(self.script).resolve().parent, self.watch_files | self.reload_files)
+        if watcher.fd is not None:
+            self.selector.register(watcher.fd, selectors.EVENT_READ, 'files')
+        self.selector.register(self._wake_r, selectors.EVENT_READ, 'wake')
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._on_signal)
+
+        self.start_child()
+        while not self.stopping:
+            now = time.monotonic()
+            timeout = POLL_PERIOD
+            if self.process is None:
+                timeout = max(0.0, self.restart_at - now)
+            for key, _ in self.selector.select(timeout):
+                if key.data == 'exit':
+                    self.on_child_exit()
+                elif key.data == 'wake':
+                    os.read(self._wake_r, 1024)
+                    if self.process is not None and self.process.poll() is not None:
+                        self.on_child_exit()
+                elif key.data == 'status':
+                    self.on_status()
+                elif key.data == 'files':
+                    self.on_files(watcher.read())
+            if watcher.fd is None:
+                self.on_files(watcher.read())
+            now = time.monotonic()
+            if self.stopping:
+                break
+            if self.process is None and now >= self.restart_at:
+                self.start_child()
+            else:
+                self.check_health(now)
+
+        self.stop_child()
+        logging.info("Супервизор остановлен: перезапусков %s, суммарный простой %.1f с",
+                     self.restarts, self.downtime, extra={'stage': 'supervisor'})
+
+    def on_files(self, changed):
+        if changed & self.watch_files:
+            self.stop_child(f"изменен {', '.join(sorted(changed & self.watch_files))}")
+        for name in sorted(changed & self.reload_files):
+            logging.info("Изменен %s, бот перечитает его на следующем тике", name, extra={'stage': 'supervisor'})
+
+    def _on_signal(self, signum, frame):
+        self.stopping = True
+        os.write(self._wake_w, b'x')
 
 
 if __name__ == "__main__":
-    from multiprocessing import Process
-    # Создаем два отдельных процесса для мониторинга файла и процесса
-    file_monitor = Process(target=monitor_file_changes)
-    process_monitor = Process(target=monitor_bbot_process)
-    # Запускаем процессы
-    file_monitor.start()
-    process_monitor.start()
-    # Ожидаем завершения
-    file_monitor.join()
-    process_monitor.join()
+    parser = argparse.ArgumentParser(description="Супервизор бота: перезапуск по событиям, мягкая остановка")
+    parser.add_argument('--script', default='orchestrator.py', help="запускаемый скрипт (orchestrator.py или bbot.py)")
+    parser.add_argument('--grace', type=float, default=30, help="сколько ждать завершения сделок при остановке, сек")
+    parser.add_argument('--health-timeout', type=float, default=60, help="перезапуск, если тиков нет дольше, сек")
+    parser.add_argument('--max-backoff', type=float, default=60, help="максимальная пауза между перезапусками, сек")
+    args = parser.parse_args()
+
+    setup_logging('monitor.log')
+    config = load_config()
+    # API статуса есть только у демона orchestrator.py
+    status_socket = config['status_socket'] if Path(args.script).name == 'orchestrator.py' else None
+    Supervisor(args.script, watch_files=['user.cfg'],
+               reload_files=[Path(config['trading_pairs_file']).name],
+               status_socket=status_socket, grace=args.grace, health_timeout=args.health_timeout,
+               max_backoff=args.max_backoff).run()
@@ -0,0 +1,119 @@
+# orchestrator.py
+
+import time
+import signal
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from config import load_config, load_strategy_sections
+from async_logging import setup_logging
+from market_data import MarketData
+from strategy import Strategy
+from binance_client import initialize_client, create_client
+from status_api import StatusServer, strategy_status
+from candidate_index import load_ranking
+
+TICK = 5  # Период мониторинга в секундах
+STATS_EVERY = 60  # Как часто писать статистику общего слоя данных, сек
+CANDIDATES_SHOWN = 5  # Сколько кандидатов сканера отдавать интерфейсам
+
+# Настройка логирования: JSON-записи пишутся в файл фоновым потоком
+setup_logging('trading_bot.log')
+
+
+def load_strategies(market):
+    """Создает стратегии из секций user.cfg, у каждой свой клиент аккаунта."""
+    strategies = []
+    accounts = {}  # Стратегии с одинаковыми ключами используют один клиент
+    for section in load_strategy_sections():
+        config = load_config(section)
+        key = (config['api_key'], config['api_secret'])
+        if key not in accounts:
+            accounts[key] = create_client(*key)
+        strategies.append(Strategy(config, market, account=accounts[key]))
+    return strategies
+
+
+def publish_status(status, strategies):
+    """Публикует снимки тика всех стратегий для подключенных интерфейсов."""
+    try:
+        candidates = load_ranking()[1][:CANDIDATES_SHOWN]
+        status.publish({strategy.name: strategy_status(strategy, candidates) for strategy in strategies})
+    except Exception as e:
+        logging.error("Ошибка публикации статуса: %s", e, extra={'stage': 'status'})
+
+
+def interrupt(signum, frame):
+    """SIGTERM от супервизора завершает работу так же, как Ctrl+C."""
+    raise KeyboardInterrupt
+
+
+def run():
+    """Запускает все стратегии в одном процессе с общим слоем рыночных данных."""
+    signal.signal(signal.SIGTERM, interrupt)
+    base_config = load_config()
+    # Общий клиент модуля обслуживает публичные запросы рыночных данных
+    initialize_client(base_config['api_key'], base_config['api_secret'])
+    market = MarketData(poll_weight_budget=float(base_config['poll_weight_budget']),
+                        poll_min_period=float(base_config['poll_min_period']),
+                        base_interval=base_config['base_interval'])
+    strategies = load_strategies(market)
+    names = ', '.join(strategy.name or 'main' for strategy in strategies)
+    logging.info("Оркестратор запущен, стратегий: %d (%s)", len(strategies), names, extra={'stage': 'start'})
+
+    # API статуса для интерфейсов tui.py; торговля от них не зависит
+    status = None
+    if base_config['status_socket']:
+        status = StatusServer(base_config['status_socket'])
+        status.start()
+    for strategy in strategies:
+        strategy.display = status is not None
+        strategy.start()
+
+    last_stats = time.monotonic()
+    with ThreadPoolExecutor(len(strategies), thread_name_prefix='strategy') as executor:
+        try:
+            while True:
+                started = time.monotonic()
+                market.poller.wake.clear()
+                for strategy in strategies:
+                    strategy.reload_pairs()
+                futures = {executor.submit(strategy.monitoring): strategy for strategy in strategies}
+                for future, strategy in futures.items():
+                    try:
+                        future.result()
+                    except Exception as e:
+                        strategy.logger.error("Ошибка мониторинга: %s", e, extra={'stage': 'monitoring'})
+                if status is not None:
+                    publish_status(status, strategies)
+
+                if started - last_stats >= STATS_EVERY:
+                    last_stats = started
+                    try:
+                        market.prune()
+                        for strategy in strategies:
+                            strategy.prune_history()
+                        stats = market.stats()
+                        base = stats.get('base')
+                        logging.info("Общие данные: %d записей, запросов %d, из кэша %d",
+                                     stats['entries'], stats['requests'], stats['hits'], extra={'stage': 'stats'})
+                        if base:
+                            logging.info("Базовые свечи: %d пар, %d свечей, запросов %d",
+                                         base['symbols'], base['candles'], base['requests'], extra={'stage': 'stats'})
+                    except Exception as e:
+                        # Статистика не должна останавливать торговый цикл
+                        logging.error("Ошибка статистики общих данных: %s", e, extra={'stage': 'stats'})
+                # Пара дошла до границы RSI - следующий тик раньше, но не чаще poll_min_period
+                if market.poller.wake.wait(max(0.0, TICK - (time.monotonic() - started))):
+                    time.sleep(max(0.0, market.poller.min_period - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            logging.info("Оркестратор остановлен")
+        finally:
+            if status is not None:
+                status.stop()
+            market.poller.stop()
+            for strategy in strategies:
+                strategy.stop()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,273 @@
+# order_book.py
+
+import time
+import logging
+import threading
+from bisect import bisect_left, insort
+from binance_client import get_order_book, create_websocket_manager
+
+
+class OrderBook:
+    """Локальный стакан пары: снапшот плюс дифф-обновления из потока depth.
+
+    Цены каждой стороны хранятся отсортированным списком, объемы - в словаре.
+    Лучшая цена покупки - последний элемент bid_prices, продажи - первый ask_prices.
+    """
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.bids = {}  # цена -> объем
+        self.asks = {}
+        self.bid_prices = []  # по возрастанию
+        self.ask_prices = []  # по возрастанию
+        self.last_update_id = None
+        self.synced = False
+        self.updated = None
+
+    def apply_snapshot(self, snapshot):
+        self.bids = {float(price): float(qty) for price, qty in snapshot['bids'] if float(qty) > 0}
+        self.asks = {float(price): float(qty) for price, qty in snapshot['asks'] if float(qty) > 0}
+        self.bid_prices = sorted(self.bids)
+        self.ask_prices = sorted(self.asks)
+        self.last_update_id = snapshot['lastUpdateId']
+        self.synced = False  # Ждем первое событие, покрывающее lastUpdateId
+        self.updated = time.monotonic()
+
+    @staticmethod
+    def _update_side(levels, prices, updates):
+        for price, qty in updates:
+            price = float(price)
+            qty = float(qty)
+            if qty == 0:
+                if levels.pop(price, None) is not None:
+                    del prices[bisect_left(prices, price)]
+            else:
+                if price not in levels:
+                    insort(prices, price)
+                levels[price] = qty
+
+    def apply_diff(self, event):
+        """Применяет событие depthUpdate. Возвращает False при разрыве последовательности."""
+        first_id, final_id = event['U'], event['u']
+        if self.last_update_id is None:
+            return False
+        if final_id <= self.last_update_id:
+            return True  # Событие уже учтено в снапшоте
+        if self.synced:
+            if first_id != self.last_update_id + 1:
+                return False
+        elif not first_id <= self.last_update_id + 1 <= final_id:
+            return False
+        self._update_side(self.bids, self.bid_prices, event['b'])
+        self._update_side(self.asks, self.ask_prices, event['a'])
+        self.last_update_id = final_id
+        self.synced = True
+        self.updated = time.monotonic()
+        return True
+
+    def best_bid(self):
+        return self.bid_prices[-1] if self.bid_prices else None
+
+    def best_ask(self):
+        return self.ask_prices[0] if self.ask_prices else None
+
+    def estimate_buy(self, quote_amount):
+        """Оценка рыночной покупки на сумму quote_amount по стакану."""
+        if not self.ask_prices:
+            return None
+        best = self.ask_prices[0]
+        spent = qty = 0.0
+        for price in self.ask_prices:
+            level_quote = price * self.asks[price]
+            if spent + level_quote >= quote_amount:
+                qty += (quote_amount - spent) / price
+                spent = quote_amount
+                break
+            spent += level_quote
+            qty += self.asks[price]
+        return self._estimate(qty, spent, best, spent >= quote_amount, buy=True)
+
+    def estimate_sell(self, quantity):
+        """Оценка рыночной продажи quantity по стакану."""
+        if not self.bid_prices:
+            return None
+        best = self.bid_prices[-1]
+        received = sold = 0.0
+        for price in reversed(self.bid_prices):
+            level_qty = self.bids[price]
+            if sold + level_qty >= quantity:
+                received += (quantity - sold) * price
+                sold = quantity
+                break
+            sold += level_qty
+            received += level_qty * price
+        return self._estimate(sold, received, best, sold >= quantity, buy=False)
+
+    @staticmethod
+    def _estimate(qty, quote, best, filled, buy):
+        if qty <= 0:
+            return None
+        avg_price = quote / qty
+        slippage = (avg_price - best) / best if buy else (best - avg_price) / best
+        return {'qty': qty, 'quote': quote, 'avg_price': avg_price,
+                'best_price': best, 'slippage': slippage, 'filled': filled}
+
+    def max_buy_quote(self, max_slippage):
+        """Максимальная сумма покупки, при которой средняя цена не хуже best * (1 + max_slippage)."""
+        if not self.ask_prices:
+            return 0.0
+        limit_price = self.ask_prices[0] * (1 + max_slippage)
+        spent = qty = 0.0
+        for price in self.ask_prices:
+            level_qty = self.asks[price]
+            # Сколько можно взять с уровня, чтобы средняя цена осталась в пределах limit_price
+            if price > limit_price:
+                take = min(level_qty, (limit_price * qty - spent) / (price - limit_price))
+                if take > 0:
+                    spent += take * price
+                break
+            spent += price * level_qty
+            qty += level_qty
+        return spent
+
+
+class OrderBookManager:
+    """Поддерживает локальные стаканы наблюдаемых пар по потоку diff-depth."""
+
+    def __init__(self, depth_limit=100, max_age=10):
+        self.depth_limit = depth_limit  # Глубина снапшота REST
+        self.max_age = max_age  # Стакан без обновлений дольше max_age секунд не используем
+        self.books = {}
+        self._owners = {}  # владелец (стратегия) -> набор пар
+        self._streams = {}  # symbol -> имя потока вебсокета
+        self._buffers = {}  # symbol -> события, пришедшие до снапшота
+        self._lock = threading.Lock()
+        self._watch_lock = threading.Lock()  # Подписки меняются из разных стратегий
+        self._twm = None
+        # Загрузка снапшота в отдельном потоке; при воспроизведении заменяется синхронным вызовом
+        self.spawn = lambda target, *args: threading.Thread(target=target, args=args, daemon=True).start()
+        self.listeners = []  # Вызываются с (symbol, лучшая цена покупки) после каждого обновления стакана
+
+    def _start(self):
+        if self._twm is None:
+            self._twm = create_websocket_manager()
+            self._twm.start()
+
+    def watch(self, owner, symbols):
+        """Задает набор пар владельца; подписки - объединение по всем владельцам."""
+        with self._watch_lock:
+            self._watch(owner, symbols)
+
+    def _watch(self, owner, symbols):
+        with self._lock:
+            self._owners[owner] = set(symbols)
+            wanted = set().union(*self._owners.values())
+            current = set(self._streams)
+        try:
+            self._start()
+        except Exception as e:
+            logging.error("Не удалось запустить поток стаканов: %s", e, extra={'stage': 'depth'})
+            return
+        for symbol in wanted - current:
+            with self._lock:
+                self.books[symbol] = OrderBook(symbol)
+                self._buffers[symbol] = []
+            self._streams[symbol] = self._twm.start_depth_socket(
+                callback=self._on_message, symbol=symbol, interval=100)
+        for symbol in current - wanted:
+            self._twm.stop_socket(self._streams.pop(symbol))
+            with self._lock:
+                self.books.pop(symbol, None)
+                self._buffers.pop(symbol, None)
+
+    def _on_message(self, message):
+        if message.get('e') != 'depthUpdate':
+            if message.get('e') == 'error':
+                logging.error("Ошибка потока стакана: %s", message.get('m'), extra={'stage': 'depth'})
+            return
+        symbol = message['s']
+        load = False
+        best_bid = None
+        with self._lock:
+            book = self.books.get(symbol)
+            if book is None:
+                return
+            buffer = self._buffers.get(symbol)
+            if buffer is not None:
+                # Снапшот еще не загружен - копим события
+                buffer.append(message)
+                load = len(buffer) == 1
+            elif not book.apply_diff(message):
+                logging.warning("Разрыв последовательности стакана %s, пересинхронизация", symbol,
+                                extra={'symbol': symbol, 'stage': 'depth'})
+                self.books[symbol] = OrderBook(symbol)
+                self._buffers[symbol] = [message]
+                load = True
+            else:
+                best_bid = book.best_bid()
+        if load:
+            self.spawn(self._load_snapshot, symbol)
+        elif best_bid is not None:
+            self._notify(symbol, best_bid)
+
+    def _notify(self, symbol, price):
+        for listener in self.listeners:
+            try:
+                listener(symbol, price)
+            except Exception as e:
+                logging.error("Ошибка обработчика цены %s: %s", symbol, e, extra={'symbol': symbol, 'stage': 'depth'})
+
+    def _load_snapshot(self, symbol):
+        try:
+            snapshot = get_order_book(symbol, self.depth_limit)
+        except Exception as e:
+            logging.error("Ошибка загрузки снапшота стакана %s: %s", symbol, e, extra={'symbol': symbol, 'stage': 'depth'})
+            with self._lock:
+                if symbol in self._buffers:
+                    self._buffers[symbol] = []  # Повторим со следующим событием
+            return
+        with self._lock:
+            book = self.books.get(symbol)
+            buffer = self._buffers.pop(symbol, None)
+            if book is None or buffer is None:
+                return
+            book.apply_snapshot(snapshot)
+            for event in buffer:
+                if not book.apply_diff(event):
+                    # Снапшот старше буфера - начинаем заново
+                    self.books[symbol] = OrderBook(symbol)
+                    self._buffers[symbol] = []
+                    return
+
+    def get(self, symbol):
+        """Синхронизированный и свежий стакан пары или None."""
+        book = self.books.get(symbol)
+        if book is None or not book.synced or time.monotonic() - book.updated > self.max_age:
+            return None
+        return book
+
+    def estimate_buy(self, symbol, quote_amount):
+        book = self.get(symbol)
+        if book is None:
+            return None
+        with self._lock:
+            return book.estimate_buy(quote_amount)
+
+    def estimate_sell(self, symbol, quantity):
+        book = self.get(symbol)
+        if book is None:
+            return None
+        with self._lock:
+            return book.estimate_sell(quantity)
+
+    def max_buy_quote(self, symbol, max_slippage):
+        book = self.get(symbol)
+        if book is None:
+            return None
+        with self._lock:
+            return book.max_buy_quote(max_slippage)
+
+    def stop(self):
+        if self._twm is not None:
+            self._twm.stop()
+            self._twm = None
@@ -0,0 +1,228 @@
+# poll_scheduler.py
+
+import math
+import time
+import heapq
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from binance_client import REQUEST_WEIGHT, WEIGHT_WINDOW, used_weight, thread_weight
+from kline_cache import INTERVAL_SECONDS, next_candle_close
+
+KLINES_WEIGHT = REQUEST_WEIGHT['klines']  # Вес /api/v3/klines на споте не зависит от limit
+CLOSE_DELAY = 2  # Пауза после закрытия свечи, чтобы биржа отдала закрытую свечу, сек
+
+
+class PollScheduler:
+    """Фоновый опрос свечей с периодом для каждой пары отдельно.
+
+    Период зависит от того, как далеко RSI от границ rsi_oversold/rsi_overbought
+    и как быстро он меняется: пара опрашивается через долю lead от прогнозного
+    времени до границы. Пары у границ обновляются раз в min_period, спокойные -
+    к закрытию свечи. weight_budget - вес всех запросов процесса в минуту: опросу
+    достается то, что осталось после остальных запросов (цены, балансы, стаканы,
+    свечи по требованию). Если его не хватает, периоды растягиваются, а сами
+    запросы не выходят за бюджет скользящего окна.
+    Очередь - куча по времени следующего опроса с ленивым удалением устаревших записей.
+    """
+
+    def __init__(self, market, weight_budget=0, min_period=1, lead=0.1, rsi_window=14):
+        self.market = market  # Общий слой рыночных данных (MarketData)
+        self.weight_budget = weight_budget  # Вес всех запросов процесса в минуту, 0 - опрос по тикам
+        self.min_period = min_period  # Период опроса пар у границ RSI, сек
+        self.lead = lead  # Доля прогнозного времени до границы RSI
+        self.rsi_window = rsi_window  # Сколько свечей учитывать в скорости RSI
+        self.wake = threading.Event()  # Пара дошла до границы RSI - тик нужен раньше
+        self._owners = {}  # owner -> (symbols, interval, limit, rsi_oversold, rsi_overbought)
+        self._state = {}  # (symbol, interval, limit) -> состояние опроса
+        self._heap = []  # (время опроса, поколение, ключ)
+        self._used = deque()  # (время, вес) запросов опроса за последние WEIGHT_WINDOW сек
+        self._used_weight = 0
+        self._other = 0  # Вес остальных запросов процесса за последнюю минуту
+        self._demand = 0.0  # Вес в минуту при текущих периодах без растяжения
+        self._full = False  # Последний отбор уперся в бюджет
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.throttled = 0  # Сколько раз опрос ждал освобождения бюджета
+
+    @property
+    def enabled(self):
+        return self.weight_budget > 0
+
+    @property
+    def max_age(self):
+        """Допустимый возраст свечей для тика: при фоновом опросе свежесть задает планировщик."""
+        return math.inf if self._thread is not None else None
+
+    @property
+    def stretch(self):
+        if not self.enabled:
+            return 1.0
+        return max(1.0, self._demand / max(self.weight_budget - self._other, KLINES_WEIGHT))
+
+    def watch(self, owner, symbols, interval, limit, rsi_oversold, rsi_overbought):
+        """Задает пары владельца (стратегии); новые пары опрашиваются сразу."""
+        with self._lock:
+            self._owners[owner] = (list(symbols), interval, limit, rsi_oversold, rsi_overbought)
+            bands = {}
+            for symbols, interval, limit, low, high in self._owners.values():
+                for symbol in symbols:
+                    bands.setdefault((symbol, interval, limit), []).append((low, high))
+            now = time.monotonic()
+            for key in list(self._state):
+                if key not in bands:
+                    self._set_period(key, None)
+                    del self._state[key]
+            for key, key_bands in bands.items():
+                state = self._state.get(key)
+                if state is None:
+                    state = {'period': None, 'due': now, 'generation': 0, 'rsi': None, 'hot': False,
+                             'weight': KLINES_WEIGHT}
+                    self._state[key] = state
+                    heapq.heappush(self._heap, (now, 0, key))
+                state['bands'] = key_bands
+
+    def start(self):
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='kline-poll', daemon=True)
+            self._thread.start()
+            logging.info("Адаптивный опрос свечей: бюджет %s веса/мин, минимальный период %s с",
+                         self.weight_budget, self.min_period, extra={'stage': 'poll'})
+
+    def stop(self):
+        self._stop.set()
+
+    def _set_period(self, key, period, weight=None):
+        # Спрос на вес обновляется за O(1) при каждой смене периода или цены опроса пары
+        state = self._state[key]
+        if state['period']:
+            self._demand -= state['weight'] * 60 / state['period']
+        state['period'] = period
+        if weight is not None:
+            state['weight'] = weight
+        if period:
+            self._demand += state['weight'] * 60 / period
+
+    def _spend(self, now):
+        """Вес всех запросов процесса за минуту; заодно обновляет долю остальных запросов."""
+        while self._used and now - self._used[0][0] >= WEIGHT_WINDOW:
+            self._used_weight -= self._used.popleft()[1]
+        used = used_weight()
+        self._other = max(0, used - self._used_weight)
+        return used
+
+    def _take_due(self):
+        """Пары, время опроса которых наступило и на которые хватает бюджета."""
+        batch = []
+        with self._lock:
+            now = time.monotonic()
+            used = self._spend(now)
+            self._full = False
+            while self._heap and self._heap[0][0] <= now:
+                due, generation, key = self._heap[0]
+                state = self._state.get(key)
+                if state is None or state['generation'] != generation:
+                    heapq.heappop(self._heap)  # Устаревшая запись
+                    continue
+                if used + KLINES_WEIGHT > self.weight_budget:
+                    self.throttled += 1
+                    self._full = True
+                    break
+                heapq.heappop(self._heap)
+                used += KLINES_WEIGHT  # Фактический вес опроса учитывается после запроса
+                batch.append(key)
+        return batch
+
+    def _next_wait(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self.min_period  # Не дольше min_period: могли добавиться новые пары
+            if self._heap:
+                wait = min(wait, self._heap[0][0] - now)
+            if self._full:
+                # Бюджет занят, в том числе другими запросами - ждем освобождения окна
+                wait = max(wait, self.min_period)
+        return max(0.05, wait)
+
+    def period(self, key, df):
+        """Период опроса пары по последним RSI свечей, сек."""
+        symbol, interval, limit = key
+        rsi = df['rsi'].values[-(self.rsi_window + 1):] if not df.empty else np.array([])
+        rsi = rsi[~np.isnan(rsi)]
+        until_close = next_candle_close(interval) - time.time() + CLOSE_DELAY
+        if not len(rsi):
+            return max(self.min_period, until_close), None, False
+        last = float(rsi[-1])
+        state = self._state.get(key)
+        bands = state['bands'] if state else []
+        distance = min((0.0 if last <= low or last >= high else min(last - low, high - last)
+                        for low, high in bands), default=math.inf)
+        if distance == 0:
+            return self.min_period, last, True
+        # Скорость RSI - разброс изменений за свечу; у неподвижных пар не меньше 0.1
+        speed = max(float(np.std(np.diff(rsi))) if len(rsi) > 1 else 0.0, 0.1)
+        period = self.lead * distance / speed * INTERVAL_SECONDS[interval]
+        return min(max(self.min_period, period), max(self.min_period, until_close)), last, False
+
+    def _poll(self, key):
+        """Опрос пары: период, RSI, признак границы и вес запросов, которые опрос сделал на деле.
+
+        При base_interval это дозагрузка или подгрузка страниц базовых свечей, а если ту же
+        пару в этот момент уже запрашивает другой поток - ноль.
+        """
+        symbol, interval, limit = key
+        before = thread_weight()
+        df = self.market.klines(symbol, interval, limit, ('rsi',), max_age=0)
+        return self.period(key, df) + (thread_weight() - before,)
+
+    def _reschedule(self, key, period, rsi, hot, weight=None):
+        with self._lock:
+            now = time.monotonic()
+            if weight is not None:
+                self._used.append((now, weight))
+                self._used_weight += weight
+                self._spend(now)
+            state = self._state.get(key)
+            if state is None:
+                return  # Пару убрали из наблюдения во время запроса
+            if hot and not state['hot']:
+                self.wake.set()
+            state['rsi'], state['hot'] = rsi, hot
+            # Цена опроса сглаживается: разовые подгрузки истории не раздувают спрос надолго
+            self._set_period(key, period, None if weight is None else (state['weight'] + weight) / 2)
+            state['generation'] += 1
+            state['due'] = now + period * self.stretch
+            heapq.heappush(self._heap, (state['due'], state['generation'], key))
+
+    def _loop(self):
+        with ThreadPoolExecutor(4, thread_name_prefix='kline-poll') as executor:
+            while not self._stop.is_set():
+                batch = self._take_due()
+                for key, future in [(key, executor.submit(self._poll, key)) for key in batch]:
+                    try:
+                        self._reschedule(key, *future.result())
+                    except Exception as e:
+                        logging.error("Ошибка опроса свечей %s: %s", key[0], e, extra={'symbol': key[0], 'stage': 'poll'})
+                        with self._lock:
+                            state = self._state.get(key)
+                            period = state['period'] if state and state['period'] else self.min_period
+                        self._reschedule(key, max(period, 5 * self.min_period), state and state['rsi'], False)
+                self._stop.wait(self._next_wait())
+
+    def cadence(self, symbols, interval, limit):
+        """Текущий период опроса пар с учетом растяжения под бюджет, сек."""
+        with self._lock:
+            stretch = self.stretch
+            return {symbol: self._state[(symbol, interval, limit)]['period'] * stretch for symbol in symbols
+                    if self._state.get((symbol, interval, limit), {}).get('period')}
+
+    def usage(self):
+        """Расход бюджета: вес всех запросов и опроса за минуту, ожидаемый вес опроса и растяжение."""
+        with self._lock:
+            used = self._spend(time.monotonic())
+            return {'used': used, 'polls': self._used_weight, 'budget': self.weight_budget,
+                    'demand': round(self._demand, 1), 'stretch': round(self.stretch, 2),
+                    'throttled': self.throttled}
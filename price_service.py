@@ -0,0 +1,108 @@
+# price_service.py
+
+import time
+import logging
+import threading
+from binance_client import get_ticker_prices
+
+BTC_SYMBOL = 'BTCUSDT'  # Курс BTC для заголовка интерфейса
+INVALID_SYMBOL = -1121  # Код ошибки Binance для неизвестной пары
+
+
+class PriceService:
+    """Текущие цены всех наблюдаемых пар из одного пакетного запроса /ticker/price.
+
+    Пары задаются владельцами (стратегиями), цены кэшируются на max_age секунд,
+    и продажа, заголовок баланса и колонка профита читают один и тот же источник.
+    Цена старше max_age не отдается: после ошибки запроса пара остается без цены.
+    """
+
+    def __init__(self, max_age=5, extra_ttl=60):
+        self.max_age = max_age  # Свежесть цен в пределах тика, сек
+        self.extra_ttl = extra_ttl  # Сколько секунд пара, запрошенная вне списков стратегий, остается в пакете
+        self.prices = {}
+        self.updated = None
+        self._updated = {}  # symbol -> время получения цены
+        self._owners = {}  # владелец (стратегия) -> набор пар
+        self._extra = {}  # symbol -> время последнего запроса пары вне списков стратегий
+        self._invalid = set()  # Пары, которых нет на бирже; в пакет не попадают
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()  # Один запрос на всех, остальные ждут его результат
+
+    def watch(self, owner, symbols):
+        """Задает набор пар владельца; запрашивается объединение по всем владельцам (и BTC)."""
+        with self._lock:
+            self._owners[owner] = set(symbols)
+
+    def symbols(self):
+        with self._lock:
+            return self._symbols()
+
+    def _symbols(self):
+        # Пары, которые давно не запрашивали вне списков стратегий, выходят из пакета
+        now = time.monotonic()
+        for symbol in [symbol for symbol, used in self._extra.items() if now - used > self.extra_ttl]:
+            del self._extra[symbol]
+        return {BTC_SYMBOL}.union(self._extra, *self._owners.values()) - self._invalid
+
+    def _fresh(self, max_age):
+        return self.updated is not None and time.monotonic() - self.updated <= max_age
+
+    def _valid(self, max_age):
+        now = time.monotonic()
+        return {symbol: price for symbol, price in self.prices.items() if now - self._updated[symbol] <= max_age}
+
+    def _fetch(self, symbols):
+        """Цены пакетом; пара, которой нет на бирже, отсеивается делением пакета пополам."""
+        try:
+            return get_ticker_prices(symbols)
+        except Exception as e:
+            if getattr(e, 'code', None) != INVALID_SYMBOL:
+                raise
+            if len(symbols) == 1:
+                with self._lock:
+                    self._invalid.update(symbols)
+                logging.error("Пара %s не найдена на бирже и исключена из запроса цен", ', '.join(symbols),
+                              extra={'symbol': next(iter(symbols)), 'stage': 'prices'})
+                return {}
+        symbols = sorted(symbols)
+        prices = self._fetch(set(symbols[:len(symbols) // 2]))
+        prices.update(self._fetch(set(symbols[len(symbols) // 2:])))
+        return prices
+
+    def refresh(self, max_age=None, extra=()):
+        """Обновляет цены одним запросом, если кэш устарел или в нем нет нужных пар.
+
+        Возвращает только цены не старше max_age.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        with self._fetch_lock:
+            with self._lock:
+                now = time.monotonic()
+                extra = set(extra) - self._invalid
+                # Пары, запрошенные вне списков стратегий, держим в пакете, пока их спрашивают
+                self._extra.update(dict.fromkeys(extra, now))
+                missing = {symbol for symbol in extra
+                           if symbol not in self._updated or now - self._updated[symbol] > max_age}
+                if not missing and self._fresh(max_age):
+                    return self._valid(max_age)
+                symbols = self._symbols()
+            try:
+                prices = self._fetch(symbols)
+            except Exception as e:
+                logging.error("Ошибка получения цен: %s", e, extra={'stage': 'prices'})
+                with self._lock:
+                    return self._valid(max_age)
+            with self._lock:
+                now = time.monotonic()
+                self.prices.update(prices)
+                self._updated.update(dict.fromkeys(prices, now))
+                # Цены пар, вышедших из пакета, больше не обновятся
+                for symbol in set(self.prices) - symbols:
+                    del self.prices[symbol], self._updated[symbol]
+                self.updated = now
+                return self._valid(max_age)
+
+    def price(self, symbol, max_age=None):
+        """Текущая цена пары или None, если биржа ее не вернула или цена устарела."""
+        return self.refresh(max_age, extra=(symbol,)).get(symbol)
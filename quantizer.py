@@ -0,0 +1,138 @@
+# quantizer.py
+
+import math
+from decimal import Decimal
+import numpy as np
+
+
+def _decimals(value):
+    """Количество знаков после запятой в строковом значении фильтра."""
+    exponent = Decimal(value).normalize().as_tuple().exponent
+    return max(0, -exponent)
+
+
+def _to_units(value, scale):
+    """Переводит число в целое количество единиц 10**-scale с округлением вниз."""
+    return int(Decimal(str(value)).scaleb(scale).to_integral_value(rounding='ROUND_FLOOR'))
+
+
+class SymbolQuantizer:
+    """Предвычисленные фильтры пары: шаги лота и цены в целых единицах.
+
+    Все округления делаются в целых числах, поэтому результат точный и
+    никогда не округляется вверх (в отличие от старого adjust_quantity).
+    """
+
+    def __init__(self, symbol, filters):
+        self.symbol = symbol
+        by_type = {f['filterType']: f for f in filters}
+
+        lot = by_type.get('LOT_SIZE', {'minQty': '0', 'maxQty': '0', 'stepSize': '0'})
+        market_lot = by_type.get('MARKET_LOT_SIZE', {})
+        price = by_type.get('PRICE_FILTER', {'minPrice': '0', 'maxPrice': '0', 'tickSize': '0'})
+
+        # Масштаб количества и цены - максимальное число знаков среди фильтров
+        self.qty_scale = max(_decimals(lot['stepSize']), _decimals(lot['minQty']))
+        self.price_scale = max(_decimals(price['tickSize']), _decimals(price['minPrice']))
+
+        self.min_qty_units = _to_units(lot['minQty'], self.qty_scale)
+        self.step_units = _to_units(lot['stepSize'], self.qty_scale) or 1
+        self.max_qty_units = _to_units(lot['maxQty'], self.qty_scale)
+        # Для рыночных ордеров действует еще и MARKET_LOT_SIZE, если он задан
+        market_max = market_lot.get('maxQty', '0')
+        if Decimal(market_max) > 0:
+            market_max_units = _to_units(market_max, self.qty_scale)
+            if not self.max_qty_units or market_max_units < self.max_qty_units:
+                self.max_qty_units = market_max_units
+
+        self.min_price_units = _to_units(price['minPrice'], self.price_scale)
+        self.tick_units = _to_units(price['tickSize'], self.price_scale) or 1
+        self.max_price_units = _to_units(price['maxPrice'], self.price_scale)
+
+        # NOTIONAL пришел на смену MIN_NOTIONAL, поддерживаем оба
+        self.min_notional = 0.0
+        self.max_notional = 0.0
+        notional = by_type.get('NOTIONAL')
+        if notional:
+            if notional.get('applyMinToMarket', True):
+                self.min_notional = float(notional.get('minNotional', 0))
+            if notional.get('applyMaxToMarket', False):
+                self.max_notional = float(notional.get('maxNotional', 0))
+        elif 'MIN_NOTIONAL' in by_type:
+            min_notional = by_type['MIN_NOTIONAL']
+            if min_notional.get('applyToMarket', True):
+                self.min_notional = float(min_notional.get('minNotional', 0))
+
+        self.min_qty = self.min_qty_units / 10 ** self.qty_scale
+        self.step_size = self.step_units / 10 ** self.qty_scale
+        self.tick_size = self.tick_units / 10 ** self.price_scale
+
+    def _qty(self, units):
+        return float(Decimal(units).scaleb(-self.qty_scale))
+
+    def _price(self, units):
+        return float(Decimal(units).scaleb(-self.price_scale))
+
+    def qty_units(self, quantity):
+        """Целое число единиц количества, округленное вниз по LOT_SIZE."""
+        if not math.isfinite(quantity):
+            raise ValueError(f"Количество {quantity} не является конечным числом")
+        units = _to_units(quantity, self.qty_scale)
+        if units < self.min_qty_units:
+            return 0
+        # По правилам Binance (quantity - minQty) должно быть кратно stepSize
+        units = self.min_qty_units + (units - self.min_qty_units) // self.step_units * self.step_units
+        if self.max_qty_units and units > self.max_qty_units:
+            units = self.min_qty_units + (self.max_qty_units - self.min_qty_units) // self.step_units * self.step_units
+        return units
+
+    def floor_qty(self, quantity):
+        """Округляет количество вниз до шага лота. Меньше minQty - возвращает 0."""
+        return self._qty(self.qty_units(quantity))
+
+    def check(self, quantity, price):
+        """Проверяет ордер по фильтрам. Возвращает (ok, причина)."""
+        if not math.isfinite(quantity):
+            return False, f"количество {quantity} не является конечным числом"
+        # Точное значение в единицах: дробный остаток - количество не кратно шагу
+        exact = Decimal(str(quantity)).scaleb(self.qty_scale)
+        units = int(exact.to_integral_value(rounding='ROUND_FLOOR'))
+        if exact != units and units >= self.min_qty_units:
+            return False, f"количество {quantity} не кратно stepSize {self.step_size}"
+        if units <= 0 or units < self.min_qty_units:
+            return False, f"количество {quantity} меньше minQty {self.min_qty}"
+        if (units - self.min_qty_units) % self.step_units:
+            return False, f"количество {quantity} не кратно stepSize {self.step_size}"
+        if self.max_qty_units and units > self.max_qty_units:
+            return False, f"количество {quantity} больше maxQty"
+        notional = quantity * price
+        if self.min_notional and notional < self.min_notional:
+            return False, f"объем {notional:.8f} меньше minNotional {self.min_notional}"
+        if self.max_notional and notional > self.max_notional:
+            return False, f"объем {notional:.8f} больше maxNotional {self.max_notional}"
+        return True, None
+
+    def floor_qty_array(self, quantities):
+        """Векторное округление массива количеств вниз до шага лота (меньше minQty - 0).
+
+        Результат совпадает с floor_qty поэлементно и никогда не превышает вход.
+        """
+        quantities = np.asarray(quantities, dtype=np.float64)
+        if not np.isfinite(quantities).all():
+            raise ValueError("Количества должны быть конечными числами")
+        flat = quantities.ravel()
+        scaled = flat * 10.0 ** self.qty_scale
+        units = np.floor(scaled)
+        # Ошибка float при умножении - пара ulp: значения рядом с целой границей
+        # (0.3 * 10 = 2.9999...) пересчитываются точно, как в floor_qty
+        margin = 4 * np.spacing(np.abs(scaled))
+        exact = (scaled - units < margin) | (units + 1 - scaled < margin)
+        units = units.astype(np.int64)
+        for index in np.flatnonzero(exact):
+            units[index] = _to_units(flat[index], self.qty_scale)
+        lot = self.min_qty_units + (units - self.min_qty_units) // self.step_units * self.step_units
+        if self.max_qty_units:
+            max_units = self.min_qty_units + (self.max_qty_units - self.min_qty_units) // self.step_units * self.step_units
+            lot = np.minimum(lot, max_units)
+        lot = np.where(units < self.min_qty_units, 0, lot)
+        return (lot / 10.0 ** self.qty_scale).reshape(quantities.shape)
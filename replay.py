@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# replay.py
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from collections import Counter
+from async_logging import setup_logging
+from config import load_config, load_strategy_sections
+from session_log import SessionLog, VirtualClock, ReplayError
+import binance_client
+
+
+# Процентиль по отсортированному списку
+def percentile(values, share):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+# Граница каждого тика: отметка начала и начало следующего тика
+def tick_windows(marks, end):
+    for index, mark in enumerate(marks):
+        horizon = marks[index + 1]['t'] if index + 1 < len(marks) else end + 1
+        yield mark, horizon
+
+
+def replay_config(section, out_dir):
+    """Конфигурация стратегии с файлами состояния в каталоге воспроизведения и без Telegram."""
+    config = load_config(section)
+    suffix = f"_{config['name']}" if config['name'] else ''
+    config['telegram_token'] = ''
+    config['trading_pairs_file'] = os.path.join(out_dir, f"trading_pairs{suffix}.txt")
+    config['profit_file'] = os.path.join(out_dir, f"total_profit{suffix}")
+    config['history_file'] = os.path.join(out_dir, f"indicator_history{suffix}.bin")
+    return config
+
+
+def replay_strategies(log, clock, out_dir):
+    """Прогоняет стратегии по записанным тикам; время виртуальное, задержки - настоящие."""
+    from market_data import MarketData
+    from strategy import Strategy
+
+    base = load_config()
+    # Общий клиент модуля для публичных данных, без проверки связи с биржей
+    binance_client.client = binance_client.create_client(base['api_key'], base['api_secret'])
+    market = MarketData(base_interval=base['base_interval'])
+    market.books.spawn = lambda target, *args: target(*args)  # Снапшоты стаканов без потоков
+    accounts = {}
+    strategies = {}
+    for section in load_strategy_sections():
+        config = replay_config(section, out_dir)
+        key = (config['api_key'], config['api_secret'])
+        if key not in accounts:
+            accounts[key] = binance_client.create_client(*key)
+        strategy = Strategy(config, market, account=accounts[key])
+        # Сделки и продажи по выходу - внутри шага виртуальных часов, а не в пуле потоков
+        strategy.trade_executor.inline = True
+        strategy.trading_pairs = []  # Список пар берется из отметок тиков записи
+        strategies[config['name']] = strategy
+
+    # Тики всех стратегий по порядку записи
+    ticks = sorted((mark for name in strategies for mark in log.marks.get(('tick', name), [])),
+                   key=lambda mark: mark['t'])
+    latencies = []
+    decisions = Counter()
+    for mark, horizon in tick_windows(ticks, log.end):
+        strategy = strategies[mark['args'][0]]
+        clock.advance(mark['t'] - clock.now)
+        clock.horizon = horizon
+        pairs = mark['kwargs'].get('pairs', strategy.trading_pairs)
+        if pairs != strategy.trading_pairs:
+            strategy.trading_pairs = pairs
+            strategy.pipeline.set_pairs(pairs)
+            market.prices.watch(strategy.name, pairs)
+            market.books.watch(strategy.name, pairs)
+        started = time.perf_counter()
+        try:
+            strategy.monitoring()
+        except Exception as e:
+            logging.error("Ошибка тика при воспроизведении: %s", e, extra={'stage': 'replay'})
+        latencies.append((time.perf_counter() - started) * 1000)
+        decisions.update(strategy.decisions.values())
+
+    for strategy in strategies.values():
+        strategy.history.flush()
+    clients = binance_client.replay_clients.values()
+    orders = [{'t': round(ts, 3), 'symbol': kwargs.get('symbol'), 'side': kwargs.get('side'),
+               'quantity': kwargs.get('quantity')} for client in clients for ts, kwargs, _ in client.orders]
+    return {
+        'ticks': len(latencies),
+        'decisions': dict(decisions),
+        'orders': sorted(orders, key=lambda order: order['t']),
+        'calls': sum(client.calls for client in clients),
+        'misses': sum(client.misses for client in clients),
+        'tick_ms': {'p50': round(percentile(latencies, 0.5), 2), 'p95': round(percentile(latencies, 0.95), 2),
+                    'max': round(max(latencies, default=0.0), 2)},
+    }
+
+
+def replay_scan(scan, log, clock, out_dir):
+    """Прогоняет проходы сканера по записанным свечам и пишет рейтинг в каталог воспроизведения."""
+    from candidate_index import CandidateIndex
+
+    scan.candidates = CandidateIndex(os.path.join(out_dir, 'scan_ranking.json'))
+    calls = Counter()
+
+    async def recorded_klines(symbol, count=scan.limit):
+        calls['klines'] += 1
+        try:
+            return log.lookup('klines', (symbol, scan.interval, count), {}, clock.horizon)
+        except ReplayError:
+            calls['misses'] += 1
+            return None
+
+    scan.klines_source = recorded_klines
+    scan.recorder = None
+
+    async def sweeps():
+        latencies = []
+        top = []
+        for mark, horizon in tick_windows(log.marks.get(('sweep', 'scan'), []), log.end):
+            clock.advance(mark['t'] - clock.now)
+            clock.horizon = horizon
+            started = time.perf_counter()
+            await asyncio.gather(*(scan.process_pair(pair, scan.candidates) for pair in mark['kwargs']['pairs']))
+            top = scan.candidates.top(scan.existing_pairs_limit)
+            scan.candidates.save()
+            latencies.append((time.perf_counter() - started) * 1000)
+        return latencies, top
+
+    latencies, top = asyncio.run(sweeps())
+    return {
+        'sweeps': len(latencies),
+        'top': [[symbol, round(rsi, 2)] for symbol, rsi in top],
+        'calls': calls['klines'],
+        'misses': calls['misses'],
+        'sweep_ms': {'p50': round(percentile(latencies, 0.5), 2), 'p95': round(percentile(latencies, 0.95), 2),
+                     'max': round(max(latencies, default=0.0), 2)},
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Сравнение с эталонным прогоном: те же решения и p95 задержки не хуже допуска."""
+    problems = []
+    for key in ('orders', 'decisions', 'top'):
+        if key in baseline and result.get(key) != baseline[key]:
+            problems.append(f"{key}: отличается от эталона")
+    for key in ('tick_ms', 'sweep_ms'):
+        if key in baseline and result[key]['p95'] > baseline[key]['p95'] * (1 + tolerance):
+            problems.append(f"{key}: p95 {result[key]['p95']} мс хуже эталона {baseline[key]['p95']} мс")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записанной сессии бота или сканера")
+    parser.add_argument('session', help="файл записи (record_file из user.cfg)")
+    parser.add_argument('--scan', action='store_true', help="воспроизвести сканер вместо стратегий")
+    parser.add_argument('--out', default='replay_out', help="каталог для файлов состояния и логов")
+    parser.add_argument('--baseline', help="JSON эталонного прогона для проверки регрессий")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="допуск по p95 задержки, доля")
+    parser.add_argument('--save', help="сохранить результат прогона в JSON (эталон)")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    scan = None
+    if args.scan:
+        # scan настраивает свой лог при импорте, поэтому импортируем его до логов воспроизведения
+        import scan
+    setup_logging(os.path.join(args.out, 'replay.log'))
+    log = SessionLog.load(args.session, kinds=('http', 'mark') if args.scan else ('rest', 'ws', 'mark'))
+    clock = VirtualClock(log.start)
+    binance_client.start_replay(log, clock)
+    clock.install()
+    wall_started = time.perf_counter()
+    try:
+        result = replay_scan(scan, log, clock, args.out) if args.scan else replay_strategies(log, clock, args.out)
+    finally:
+        clock.uninstall()
+    wall = time.perf_counter() - wall_started
+    result['virtual_s'] = round(log.end - log.start, 1)
+    result['wall_s'] = round(wall, 2)
+    result['speedup'] = round(result['virtual_s'] / wall, 1) if wall > 0 else 0.0
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            problems = compare(result, json.load(file), args.tolerance)
+        for problem in problems:
+            print(f"Регрессия: {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# risk_engine.py
+
+import math
+import threading
+import numpy as np
+
+CORRELATION_WINDOW = 100  # Сколько последних свечей берем для корреляции с BTC
+
+
+def unrealized_pnl(prices, buy_prices, quantities, commission_rate):
+    """Нереализованный профит позиций, как calculate_profit, но сразу по массивам."""
+    pnl = (prices - buy_prices) * quantities - prices * quantities * commission_rate
+    # Позиции без цены покупки или без объема в профит не входят
+    return np.where(np.isfinite(buy_prices) & (quantities > 0), pnl, 0.0)
+
+
+def btc_correlation(closes, btc_closes, window=CORRELATION_WINDOW):
+    """Корреляция доходностей пары и BTC по последним свечам или nan."""
+    count = min(len(closes), len(btc_closes), window + 1)
+    if count < 3:
+        return float('nan')
+    returns = np.diff(np.log(np.asarray(closes[-count:], dtype=float)))
+    btc_returns = np.diff(np.log(np.asarray(btc_closes[-count:], dtype=float)))
+    if returns.std() == 0 or btc_returns.std() == 0:
+        return float('nan')
+    return float(np.corrcoef(returns, btc_returns)[0, 1])
+
+
+class RiskEngine:
+    """Экспозиция, нереализованный профит, корреляция с BTC и просадка портфеля стратегии.
+
+    Показатели пересчитываются по массивам на каждом обновлении цен, а вердикт
+    по каждой паре готовится заранее: торговая логика проверяет его за O(1)
+    и не делает дополнительных запросов к бирже. Лимит 0 отключает проверку.
+    Пик капитала сдвигается на ввод и вывод средств, а пока у открытой позиции
+    нет цены, капитал и просадка не пересчитываются.
+    """
+
+    def __init__(self, commission_rate, max_symbol_exposure=0.0, max_total_exposure=0.0,
+                 max_drawdown=0.0, max_btc_correlation=0.0, flow_tolerance=0.01):
+        self.commission_rate = commission_rate
+        self.max_symbol_exposure = max_symbol_exposure  # Лимит вложений в одну пару, bridge
+        self.max_total_exposure = max_total_exposure  # Лимит вложений во все пары, bridge
+        self.max_drawdown = max_drawdown  # Допустимая просадка капитала от пика, доля
+        self.max_btc_correlation = max_btc_correlation  # Не покупаем пары, слишком похожие на BTC
+        self.flow_tolerance = flow_tolerance  # Изменение капитала без движения цен сверх этой доли - ввод/вывод
+        self.symbols = []
+        self._slots = {}  # symbol -> индекс в массивах
+        self.quantities = np.zeros(0)
+        self.buy_prices = np.zeros(0)
+        self.prices = np.zeros(0)
+        self.correlations = np.zeros(0)
+        self.exposure = np.zeros(0)
+        self.pnl = np.zeros(0)
+        self.total_exposure = 0.0
+        self.total_pnl = 0.0
+        self.cash = 0.0
+        self.equity = 0.0
+        self.peak_equity = 0.0
+        self.drawdown = 0.0
+        self.rebases = 0  # Сколько раз пик сдвигался на ввод или вывод средств
+        self._priced = False  # Капитал посчитан по ценам всех открытых позиций
+        self._equity_prices = {}  # Цены, по которым посчитан текущий капитал
+        self.verdicts = {}  # symbol -> (можно ли покупать, причина, свободный лимит пары)
+        self._claimed = 0.0  # Сумма покупок, разрешенных после последнего снимка позиций
+        self._lock = threading.Lock()
+
+    def set_positions(self, positions, balances, cash):
+        """Задает позиции по парам: объем (free + locked) и цену последней покупки."""
+        with self._lock:
+            self.symbols = list(positions)
+            self._slots = {symbol: index for index, symbol in enumerate(self.symbols)}
+            self.quantities = np.array([balances.get(symbol, 0.0) for symbol in self.symbols], dtype=float)
+            self._rebase(cash)
+            self.buy_prices = np.array([np.nan if positions[symbol]['price'] is None else positions[symbol]['price']
+                                        for symbol in self.symbols], dtype=float)
+            if len(self.correlations) != len(self.symbols):
+                self.correlations = np.full(len(self.symbols), np.nan)
+            self.prices = np.full(len(self.symbols), np.nan)
+            self.exposure = np.zeros(len(self.symbols))
+            self.pnl = np.zeros(len(self.symbols))
+            self.cash = cash
+            self._claimed = 0.0  # Исполненные покупки уже вошли в балансы
+
+    def _rebase(self, cash):
+        """Сдвигает пик на изменение капитала, которое не объясняется движением цен.
+
+        Новые позиции оцениваются по ценам, по которым посчитан текущий капитал:
+        сделки меняют деньги на монеты почти без изменения капитала, а ввод, вывод
+        или перевод монет - нет.
+        """
+        if self.peak_equity <= 0:
+            return
+        prices = np.array([self._equity_prices.get(symbol, np.nan) for symbol in self.symbols], dtype=float)
+        held = self.quantities > 0
+        if not np.all(np.isfinite(prices[held])):
+            return  # Новую позицию не с чем сравнить - оценим на следующем снимке
+        flow = cash + float((prices[held] * self.quantities[held]).sum()) - self.equity
+        if abs(flow) > self.flow_tolerance * self.equity:
+            self.peak_equity = max(0.0, self.peak_equity + flow)
+            self.rebases += 1
+
+    def update_correlations(self, closes, btc_closes):
+        """Корреляции пар с BTC по уже загруженным свечам."""
+        with self._lock:
+            self.correlations = np.array([
+                btc_correlation(closes[symbol], btc_closes) if symbol in closes and btc_closes is not None
+                else np.nan for symbol in self.symbols
+            ], dtype=float)
+
+    def update_prices(self, prices):
+        """Пересчитывает экспозицию, профит, просадку и вердикты по новым ценам."""
+        with self._lock:
+            self.prices = np.array([prices.get(symbol, np.nan) for symbol in self.symbols], dtype=float)
+            known = np.isfinite(self.prices)
+            self.exposure = np.where(known, self.prices * self.quantities, 0.0)
+            self.pnl = np.where(known, unrealized_pnl(self.prices, self.buy_prices, self.quantities,
+                                                      self.commission_rate), 0.0)
+            self.total_exposure = float(self.exposure.sum())
+            self.total_pnl = float(self.pnl.sum())
+            if self._update_equity():
+                self._equity_prices = dict(zip(self.symbols, self.prices))
+            self.verdicts = {symbol: self._verdict(index) for index, symbol in enumerate(self.symbols)}
+
+    def update_price(self, symbol, price):
+        """Инкрементальное обновление по цене одной пары (например, из потока), O(1)."""
+        with self._lock:
+            index = self._slots.get(symbol)
+            if index is None:
+                return
+            exposure = float(price * self.quantities[index])
+            pnl = float(unrealized_pnl(price, self.buy_prices[index], self.quantities[index], self.commission_rate))
+            self.total_exposure += exposure - float(self.exposure[index])
+            self.total_pnl += pnl - float(self.pnl[index])
+            self.prices[index], self.exposure[index], self.pnl[index] = price, exposure, pnl
+            priced = self._priced
+            if self._update_equity():
+                if priced:
+                    self._equity_prices[symbol] = price
+                else:
+                    self._equity_prices = dict(zip(self.symbols, self.prices))
+            self.verdicts[symbol] = self._verdict(index)
+
+    def _update_equity(self):
+        # Позиция без цены считалась бы нулем и дала бы ложную просадку
+        self._priced = not np.any((self.quantities > 0) & ~np.isfinite(self.prices))
+        if not self._priced:
+            return False
+        self.equity = self.cash + self.total_exposure
+        self.peak_equity = max(self.peak_equity, self.equity)
+        self.drawdown = (self.peak_equity - self.equity) / self.peak_equity if self.peak_equity > 0 else 0.0
+        return True
+
+    def _verdict(self, index):
+        """(можно ли покупать, причина, свободный лимит пары)."""
+        correlation = self.correlations[index]
+        room = self.max_symbol_exposure - self.exposure[index] if self.max_symbol_exposure > 0 else math.inf
+        if self.max_btc_correlation > 0 and correlation >= self.max_btc_correlation:
+            return False, f"корреляция с BTC {correlation:.2f} выше {self.max_btc_correlation}", 0.0
+        if room <= 0:
+            return False, "исчерпан лимит экспозиции пары", 0.0
+        return True, "", room
+
+    def check_buy(self, symbol, amount):
+        """Проверка покупки по готовому вердикту: (можно ли, причина).
+
+        Разрешенная сумма сразу вычитается из общего лимита, чтобы параллельные
+        покупки одного тика не превысили его вместе.
+        """
+        with self._lock:
+            if self.max_drawdown > 0 and self.drawdown >= self.max_drawdown:
+                return False, f"просадка {self.drawdown:.1%} достигла лимита {self.max_drawdown:.1%}"
+            allowed, reason, room = self.verdicts.get(symbol, (True, "", math.inf))
+            if not allowed:
+                return False, reason
+            if self.max_total_exposure > 0:
+                room = min(room, self.max_total_exposure - self.total_exposure - self._claimed)
+            if amount > room:
+                return False, f"покупка на {amount} превысит лимит экспозиции"
+            self._claimed += amount
+            return True, ""
+
+    def release(self, amount):
+        """Возвращает сумму в общий лимит, если покупка не состоялась."""
+        with self._lock:
+            self._claimed = max(0.0, self._claimed - amount)
+
+    def summary(self):
+        with self._lock:
+            return {'exposure': self.total_exposure, 'pnl': self.total_pnl, 'equity': self.equity,
+                    'drawdown': self.drawdown, 'rebases': self.rebases, 'blocked': sum(1 for verdict in self.verdicts.values() if not verdict[0])}
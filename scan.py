@@ -1,20 +1,20 @@
 import urwid
 import asyncio
 import os
+import time
 import numpy as np
 import talib
 import logging
-from binance.client import Client
 from config import load_config
+from async_logging import setup_logging
+from kline_cache import KlineCache
+from candidate_index import CandidateIndex, RANKING_FILE
+from session_log import SessionRecorder
 import aiohttp
 import nest_asyncio
 
-# Настройка логирования
-logging.basicConfig(
-    filename='scan.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Настройка логирования: JSON-записи пишутся в файл фоновым потоком
+setup_logging('scan.log')
 
 # Загрузка конфигурации
 config = load_config()
@@ -23,18 +23,25 @@ api_secret = config['api_secret']
 token = config['telegram_token']
 chat_id = config['telegram_chat_id']
 
-client = Client(api_key, api_secret)
-
 PAIRS_TO_SCAN = 'scan_list'
 TRADING_PAIRS_FILE = 'trading_pairs.txt'
 interval = config['interval']
 existing_pairs_limit = int(config['existing_pairs_limit'])
 rsi_to_add = int(config['rsi_to_add'])
 limit = 200
-CACHE_TTL = 60  # Время жизни кэша в секундах
+CACHE_MAX_ENTRIES = 1000  # Максимум пар в кэше
+CACHE_MAX_BYTES = 8 * 1024 * 1024  # Максимальный объем цен в кэше
+SCAN_PAUSE = 5  # Пауза между проходами сканера в секундах
+FORMING_TTL = 60  # Как часто обновлять цену формирующейся свечи для RSI, сек
 
-# Глобальный кэш для данных свечей
-data_cache = {}
+# Глобальный кэш цен закрытия: закрытые свечи живут до закрытия свечи interval,
+# формирующаяся обновляется раз в FORMING_TTL секунд
+data_cache = KlineCache(interval, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                        forming_ttl=FORMING_TTL)
+# Рейтинг кандидатов, обновляется по мере пересчета RSI каждой пары
+candidates = CandidateIndex(RANKING_FILE)
+# Запись ответов биржи для воспроизведения сканера
+recorder = SessionRecorder(config['record_file']) if config['record_file'] else None
 
 
 # Функция для отправки сообщения в Telegram
@@ -51,9 +58,10 @@ async def send_telegram_message(message):
                 if response.status == 200:
                     logging.info("Сообщение успешно отправлено в Telegram")
                 else:
-                    logging.error(f"Ошибка при отправке сообщения в Telegram: {response.status}")
+                    logging.error("Ошибка при отправке сообщения в Telegram: %s", response.status,
+                                  extra={'stage': 'telegram'})
         except Exception as e:
-            logging.error(f"Ошибка при отправке сообщения в Telegram: {e}")
+            logging.error("Ошибка при отправке сообщения в Telegram: %s", e, extra={'stage': 'telegram'})
 
 
 async def get_pairs_to_scan():
@@ -68,7 +76,7 @@ async def get_pairs_to_scan():
 
 def calculate_rsi(closes):
     """Рассчитывает RSI."""
-    return talib.RSI(np.array(closes, dtype=float), timeperiod=14)[-1]
+    return talib.RSI(np.asarray(closes, dtype=float), timeperiod=14)[-1]
 
 
 def calculate_sma(closes, period):
@@ -78,42 +86,60 @@ def calculate_sma(closes, period):
     return np.mean(closes[-period:])
 
 
+async def download_klines(symbol, count=limit):
+    """Загружает count последних свечей пары с биржи (ответ /klines как есть)."""
+    started = time.time()
+    async with aiohttp.ClientSession() as session:
+        url = f'https://api.binance.com/api/v3/klines?symbol={symbol}&interval={interval}&limit={count}'
+        async with session.get(url) as response:
+            if response.status != 200:
+                return None
+            data = await response.json()
+    if recorder is not None:
+        recorder.record('http', 'klines', (symbol, interval, count), result=data, started=started)
+    return data
+
+
+# Источник свечей; при воспроизведении заменяется чтением из записи сессии
+klines_source = download_klines
+
+
 async def fetch_klines(symbol):
-    """Получает данные свечей для указанной пары с кэшированием."""
-    current_time = asyncio.get_event_loop().time()
-    if symbol in data_cache and current_time - data_cache[symbol]['timestamp'] < CACHE_TTL:
-        return data_cache[symbol]['data']
+    """Получает цены закрытия для указанной пары с кэшированием."""
+    closes = data_cache.get(symbol)
+    if closes is not None:
+        return closes
 
     try:
-        async with aiohttp.ClientSession() as session:
-            url = f'https://api.binance.com/api/v3/klines?symbol={symbol}&interval={interval}&limit={limit}'
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    closes = [float(kline[4]) for kline in data]
-                    data_cache[symbol] = {'data': closes, 'timestamp': current_time}
+        candle_close = data_cache.candle_close(symbol)
+        if candle_close is not None:
+            # Закрытые свечи в кэше актуальны - обновляем только формирующуюся
+            data = await klines_source(symbol, 1)
+            if data and int(data[-1][6]) // 1000 + 1 == candle_close:
+                closes = data_cache.refresh(symbol, float(data[-1][4]))
+                if closes is not None:
                     return closes
+        data = await klines_source(symbol)
+        if data is not None:
+            closes = np.fromiter((float(kline[4]) for kline in data), dtype=np.float64, count=len(data))
+            return data_cache.put(symbol, closes)
     except Exception as e:
-        logging.error(f"Ошибка при получении данных для {symbol}: {e}")
-        return []
+        logging.error("Ошибка при получении данных для %s: %s", symbol, e, extra={'symbol': symbol, 'stage': 'klines'})
+    return None
 
 
-async def process_pair(pair, existing_pairs_in_file, top_pairs):
-    """Обрабатывает одну пару."""
+async def process_pair(pair, index):
+    """Обрабатывает одну пару и обновляет ее место в рейтинге."""
     closes = await fetch_klines(pair)
-    if closes:
+    if closes is not None and len(closes):
         rsi = calculate_rsi(closes)
         sma_200 = calculate_sma(closes, 200)
 
         # Проверяем, что SMA рассчитана (не None) и последняя цена ниже SMA
-        if sma_200 is not None and closes[-1] < sma_200:
-            # Обновление топа
-            existing_pair = next((p for p in top_pairs if p[0] == pair), None)
-            if existing_pair:
-                top_pairs.remove(existing_pair)
-            top_pairs.append((pair, rsi))
-
+        if sma_200 is not None and closes[-1] < sma_200 and not np.isnan(rsi):
+            index.update(pair, float(rsi))
             return pair, rsi
+    index.remove(pair)
     return None
 
 
@@ -121,10 +147,10 @@ async def scan_and_update(pairs, widget, loop):
     """Сканирует пары параллельно и обновляет UI."""
     while True:
         # Загружаем уже существующие пары из файла
-        existing_pairs_in_file = []
+        existing_pairs_in_file = set()
         if os.path.exists(TRADING_PAIRS_FILE):
             with open(TRADING_PAIRS_FILE, 'r') as f:
-                existing_pairs_in_file = f.read().splitlines()
+                existing_pairs_in_file = set(f.read().splitlines())
 
         # Проверяем лимит существующих пар
         while len(existing_pairs_in_file) >= existing_pairs_limit:
@@ -132,37 +158,21 @@ async def scan_and_update(pairs, widget, loop):
 
             # Обновляем список существующих пар
             with open(TRADING_PAIRS_FILE, 'r') as f:
-                existing_pairs_in_file = f.read().splitlines()
+                existing_pairs_in_file = set(f.read().splitlines())
 
-        top_pairs = []
+        if recorder is not None:
+            recorder.record('mark', 'sweep', ('scan',), {'pairs': pairs})
 
-        # Обработка всех пар
-        tasks = [
-            process_pair(pair, existing_pairs_in_file, top_pairs)
-            for pair in pairs
-        ]
+        # Обработка всех пар, рейтинг обновляется по мере готовности каждой
+        tasks = [process_pair(pair, candidates) for pair in pairs]
         await asyncio.gather(*tasks)
 
-        # Исключаем пары, которые уже добавлены в файл
-        filtered_top_pairs_for_display = [
-            (symbol, rsi) for symbol, rsi in top_pairs
-            if symbol not in existing_pairs_in_file
-        ]
-
-        # Сортируем пары по RSI
-        sorted_top_pairs = sorted(
-            filtered_top_pairs_for_display,
-            key=lambda x: x[1]
-        )
+        # Лучшие пары по RSI, кроме уже добавленных в файл
+        pairs_to_display = candidates.top(existing_pairs_limit - len(existing_pairs_in_file),
+                                          exclude=existing_pairs_in_file)
 
-        # Отбираем ограниченное количество пар для отображения
-        pairs_to_display = sorted_top_pairs[:(existing_pairs_limit - len(existing_pairs_in_file))]
-
-        # Фильтруем пары, которые соответствуют условиям для добавления в файл
-        filtered_top_pairs = [
-            (symbol, rsi) for symbol, rsi in sorted_top_pairs
-            if rsi <= rsi_to_add
-        ]
+        # Самая топовая пара (с минимальным RSI), если она проходит порог добавления
+        filtered_top_pairs = [(symbol, rsi) for symbol, rsi in pairs_to_display[:1] if rsi <= rsi_to_add]
 
         # Добавляем самую топовую пару в файл trading_pairs.txt
         if filtered_top_pairs:
@@ -171,15 +181,25 @@ async def scan_and_update(pairs, widget, loop):
 
             with open(TRADING_PAIRS_FILE, 'a') as f:
                 f.write(f"{symbol}\n")
-            logging.info(f"Добавлена новая пара: {symbol} с RSI {rsi:.2f}")
-            existing_pairs_in_file.append(symbol)
+            logging.info("Добавлена новая пара: %s с RSI %.2f", symbol, rsi, extra={'symbol': symbol, 'stage': 'scan'})
+            existing_pairs_in_file.add(symbol)
 
             # Отправка уведомления в Telegram
             await send_telegram_message(f"🆕 Добавлена новая пара: {symbol} с RSI {rsi:.2f}")
 
+        # Рейтинг на диске читают интерфейсы без повторного сканирования
+        candidates.save(exclude=existing_pairs_in_file)
+
+        stats = data_cache.stats()
+        logging.info(
+            "Кэш свечей: %d пар, %.1f КБ, попаданий %d, промахов %d, обновлений свечи %d, вытеснено %d",
+            stats['entries'], stats['bytes'] / 1024, stats['hits'], stats['misses'],
+            stats['refreshes'], stats['evictions'], extra={'stage': 'scan'})
+
         # Обновляем UI
         widget.body[:] = make_table(pairs_to_display).body
         loop.draw_screen()
+        await asyncio.sleep(SCAN_PAUSE)
 
 
 def make_table(top_pairs):
@@ -241,6 +261,7 @@ async def main(loop):
 
     main_loop = urwid.MainLoop(widget, event_loop=loop, unhandled_input=exit_on_q, palette=palette)
 
+    data_cache.start()
     asyncio.ensure_future(scan_and_update(pairs, widget, main_loop))
     main_loop.run()
 
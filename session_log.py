@@ -0,0 +1,284 @@
+# session_log.py
+
+import os
+import sys
+import json
+import gzip
+import time
+import atexit
+import heapq
+import hashlib
+import bisect
+import itertools
+import logging
+import threading
+
+
+class ReplayError(Exception):
+    """Ответ биржи, которого нет в записи сессии, или ошибка, записанная вживую."""
+
+
+def call_key(method, args, kwargs, account=None):
+    """Ключ вызова для поиска ответа при воспроизведении."""
+    return json.dumps([account, method, list(args), kwargs], sort_keys=True, default=str)
+
+
+def account_tag(api_key):
+    """Короткая метка аккаунта для журнала, без самого ключа."""
+    return hashlib.sha1((api_key or '').encode()).hexdigest()[:8]
+
+
+class SessionRecorder:
+    """Запись ответов биржи в сжатый журнал, открытый только на добавление.
+
+    Записи копятся в памяти и сбрасываются отдельным gzip-блоком одной
+    операцией записи, поэтому бот и сканер могут писать в один файл.
+    """
+
+    def __init__(self, path, flush_every=5, flush_size=256):
+        self.path = path
+        self.flush_every = flush_every  # Период сброса на диск, сек
+        self.flush_size = flush_size  # Сброс при накоплении стольких записей
+        self.process = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        atexit.register(self.flush)
+
+    def record(self, kind, method, args=(), kwargs=None, result=None, error=None, started=None, account=None):
+        # Время записи - начало вызова, чтобы ответы тика не попали в следующий
+        entry = {'t': time.time() if started is None else started, 'p': self.process, 'kind': kind,
+                 'method': method, 'args': list(args), 'kwargs': kwargs or {}}
+        if account is not None:
+            entry['account'] = account
+        if error is not None:
+            entry['error'] = str(error)
+        else:
+            entry['result'] = result
+        line = json.dumps(entry, separators=(',', ':'), default=str)
+        with self._lock:
+            self._buffer.append(line)
+            due = len(self._buffer) >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_every
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if not lines:
+            return
+        block = gzip.compress(('\n'.join(lines) + '\n').encode())
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, block)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            logging.error("Ошибка записи сессии в %s: %s", self.path, e, extra={'stage': 'record'})
+
+
+class RecordingClient:
+    """Обертка клиента Binance: каждый ответ REST попадает в журнал сессии."""
+
+    def __init__(self, client, recorder, account=None):
+        self._client = client
+        self._recorder = recorder
+        self._account = account  # Метка аккаунта, чтобы ответы разных ключей не смешивались
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            started = time.time()
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                self._recorder.record('rest', name, args, kwargs, error=e, started=started, account=self._account)
+                raise
+            self._recorder.record('rest', name, args, kwargs, result=result, started=started, account=self._account)
+            return result
+        return call
+
+
+class RecordingWebsocketManager:
+    """Обертка ThreadedWebsocketManager: сообщения потоков пишутся в журнал."""
+
+    def __init__(self, manager, recorder):
+        self._manager = manager
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._manager, name)
+
+    def start_depth_socket(self, callback, symbol, **kwargs):
+        def on_message(message):
+            self._recorder.record('ws', 'depth', (symbol,), result=message)
+            callback(message)
+        return self._manager.start_depth_socket(callback=on_message, symbol=symbol, **kwargs)
+
+
+class SessionLog:
+    """Загруженный журнал сессии с поиском ответа по ключу вызова и времени."""
+
+    def __init__(self, entries):
+        self.entries = sorted(entries, key=lambda entry: entry['t'])
+        self.start = self.entries[0]['t'] if self.entries else time.time()
+        self.end = self.entries[-1]['t'] if self.entries else self.start
+        self._calls = {}  # ключ -> ([время], [запись])
+        self.streams = {}  # (метод, аргумент) -> [запись] по времени
+        self.marks = {}  # (вид, имя) -> [запись] по времени: начала тиков и проходов
+        for entry in self.entries:
+            if entry['kind'] == 'ws':
+                self.streams.setdefault((entry['method'], entry['args'][0]), []).append(entry)
+                continue
+            if entry['kind'] == 'mark':
+                self.marks.setdefault((entry['method'], entry['args'][0]), []).append(entry)
+                continue
+            times, records = self._calls.setdefault(
+                call_key(entry['method'], entry['args'], entry['kwargs'], entry.get('account')), ([], []))
+            times.append(entry['t'])
+            records.append(entry)
+
+    @classmethod
+    def load(cls, path, kinds=None):
+        """Читает все gzip-блоки журнала; kinds ограничивает типы записей."""
+        entries = []
+        with gzip.open(path, 'rt') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Недописанная строка при аварийной остановке
+                if kinds is None or entry['kind'] in kinds:
+                    entries.append(entry)
+        return cls(entries)
+
+    def lookup(self, method, args, kwargs, now, account=None):
+        """Последний записанный до момента now ответ на такой же вызов."""
+        found = self._calls.get(call_key(method, args, kwargs, account))
+        if found is None:
+            raise ReplayError(f"В записи нет вызова {method} {args} {kwargs}")
+        times, records = found
+        index = bisect.bisect_right(times, now) - 1
+        if index < 0:
+            # Ответ из будущего не подставляем: живой бот в этот момент его еще не видел
+            raise ReplayError(f"В записи нет ответа на {method} {args} {kwargs} до {now}")
+        entry = records[index]
+        if 'error' in entry:
+            raise ReplayError(entry['error'])
+        return entry['result']
+
+
+class VirtualClock:
+    """Виртуальное время воспроизведения: sleep переводит часы, а не ждет.
+
+    На время воспроизведения подменяет time.time, time.monotonic и time.sleep;
+    time.perf_counter остается настоящим, чтобы замеры задержек были реальными.
+    """
+
+    def __init__(self, start):
+        self.now = start
+        self.horizon = start  # До какого момента ответы журнала видны текущему тику
+        self._start = start
+        self._streams = []  # Куча (время, номер, поток, поколение, callback, сообщение)
+        self._sequence = itertools.count()
+        self._generations = {}  # поток -> номер текущей подписки
+        self._saved = None
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now - self._start
+
+    def sleep(self, seconds):
+        self.advance(max(0.0, seconds))
+
+    def schedule(self, name, entries, callback):
+        """Ставит сообщения потока name на доставку по мере хода времени."""
+        generation = self._generations[name] = self._generations.get(name, 0) + 1
+        for entry in entries:
+            if entry['t'] >= self.now:
+                heapq.heappush(self._streams, (entry['t'], next(self._sequence), name, generation,
+                                               callback, entry['result']))
+
+    def cancel(self, name):
+        self._generations[name] = self._generations.get(name, 0) + 1
+
+    def advance(self, seconds):
+        target = self.now + seconds
+        # Сообщения потоков доставляются синхронно в порядке записи
+        while self._streams and self._streams[0][0] <= target:
+            ts, _, name, generation, callback, message = heapq.heappop(self._streams)
+            if generation != self._generations.get(name):
+                continue  # Поток уже остановлен
+            self.now = max(self.now, ts)
+            callback(message)
+        self.now = target
+
+    def install(self):
+        self._saved = (time.time, time.monotonic, time.sleep)
+        time.time, time.monotonic, time.sleep = self.time, self.monotonic, self.sleep
+
+    def uninstall(self):
+        if self._saved is not None:
+            time.time, time.monotonic, time.sleep = self._saved
+            self._saved = None
+
+
+class ReplayClient:
+    """Клиент Binance, отвечающий из журнала сессии по виртуальному времени."""
+
+    def __init__(self, log, clock, account=None):
+        self._log = log
+        self._clock = clock
+        self._account = account
+        self.calls = 0
+        self.misses = 0
+        self.orders = []
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            self.calls += 1
+            try:
+                result = self._log.lookup(name, args, kwargs, self._clock.horizon, self._account)
+            except ReplayError:
+                self.misses += 1
+                raise
+            if name == 'create_order':
+                self.orders.append((self._clock.now, kwargs, result))
+            return result
+        return call
+
+
+class ReplayWebsocketManager:
+    """Потоки вебсокета из журнала: сообщения приходят при переводе виртуальных часов."""
+
+    def __init__(self, log, clock):
+        self._log = log
+        self._clock = clock
+        self._sockets = {}
+
+    def start(self):
+        pass
+
+    def start_depth_socket(self, callback, symbol, **kwargs):
+        name = f"{symbol.lower()}@depth"
+        self._clock.schedule(name, self._log.streams.get(('depth', symbol), []), callback)
+        self._sockets[name] = callback
+        return name
+
+    def stop_socket(self, name):
+        if self._sockets.pop(name, None) is not None:
+            self._clock.cancel(name)
+
+    def stop(self):
+        for name in list(self._sockets):
+            self.stop_socket(name)
@@ -0,0 +1,185 @@
+# signal_pipeline.py
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from binance_client import analyze_trends
+
+
+class SignalPipeline:
+    """Двухступенчатый конвейер сигналов.
+
+    Этап 1 - дешевый отбор по RSI на рабочем интервале.
+    Этап 2 - подтверждение кандидатов гистограммой MACD на fine_interval,
+    которая заранее поддерживается в фоне для пар рядом с границами RSI.
+    """
+
+    def __init__(self, market, trading_pairs, interval, fine_interval, limit,
+                 rsi_oversold, rsi_overbought, fine_refresh=15,
+                 fine_max_age=30, prefetch_margin=5, logger=None):
+        self.market = market  # Общий слой рыночных данных (MarketData)
+        self.logger = logger or logging.getLogger()
+        self.interval = interval
+        self.fine_interval = fine_interval
+        self.limit = limit
+        self.rsi_oversold = rsi_oversold
+        self.rsi_overbought = rsi_overbought
+        self.fine_refresh = fine_refresh  # Период фонового обновления fine_interval, сек
+        self.fine_max_age = fine_max_age  # Максимальный возраст данных fine_interval, сек
+        self.prefetch_margin = prefetch_margin  # Запас RSI для предзагрузки
+        self.set_pairs(trading_pairs)
+
+        self.coarse = {}  # symbol -> DataFrame интервала с RSI
+        self.candidates = []  # Кандидаты последнего прохода этапа 1
+        self._fine = {}  # symbol -> (DataFrame fine_interval с MACD, время обновления)
+        self._watch = set()  # Пары, для которых поддерживается fine_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.stats = {
+            'ticks': 0,
+            'stage1_in': 0, 'stage1_out': 0, 'stage1_ms': 0.0,
+            'stage2_in': 0, 'stage2_out': 0, 'stage2_ms': 0.0,
+            'fine_hits': 0, 'fine_misses': 0,
+        }
+        self.last = {}
+
+    def set_pairs(self, trading_pairs):
+        """Меняет список отслеживаемых пар без перезапуска."""
+        self.trading_pairs = list(trading_pairs)
+        cpu_count = os.cpu_count() or 4
+        self.max_threads = max(1, min(len(self.trading_pairs), cpu_count))
+
+    def start(self):
+        """Запускает фоновое обновление гистограмм fine_interval."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._fine_loop, name='fine-feed', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _near_band(self, rsi):
+        return (rsi < self.rsi_oversold + self.prefetch_margin
+                or rsi > self.rsi_overbought - self.prefetch_margin)
+
+    def _refresh_fine(self, symbol):
+        fine_df = self.market.klines(symbol, self.fine_interval, self.limit, ('macd',))
+        if fine_df.empty:
+            return None
+        with self._lock:
+            self._fine[symbol] = (fine_df, time.monotonic())
+        return fine_df
+
+    def _fine_loop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                watch = list(self._watch)
+                # Забываем данные пар, которые ушли от границ RSI
+                for symbol in list(self._fine):
+                    if symbol not in self._watch:
+                        del self._fine[symbol]
+            if watch:
+                with ThreadPoolExecutor(min(len(watch), self.max_threads)) as executor:
+                    futures = {executor.submit(self._refresh_fine, symbol): symbol for symbol in watch}
+                    for future in as_completed(futures):
+                        try:
+                            future.result()
+                        except Exception as e:
+                            self.logger.error("Ошибка обновления %s для %s: %s", self.fine_interval, futures[future], e,
+                                              extra={'symbol': futures[future], 'stage': 'fine_feed'})
+            self._stop.wait(self.fine_refresh)
+
+    def screen(self):
+        """Этап 1: получает свечи интервала и считает только RSI."""
+        started = time.perf_counter()
+        data = {}
+        if not self.trading_pairs:
+            return data, []
+        with ThreadPoolExecutor(self.max_threads) as executor:
+            # При фоновом опросе свечи берутся из кэша, свежесть поддерживает планировщик
+            futures = {executor.submit(self.market.klines, symbol, self.interval, self.limit, ('rsi',),
+                                       self.market.poller.max_age): symbol for symbol in self.trading_pairs}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    df = future.result()
+                    if df.empty:
+                        self.logger.warning("Пустой DataFrame для %s. Пропускаем.", symbol, extra={'symbol': symbol, 'stage': 'stage1'})
+                        continue
+                    data[symbol] = df
+                except Exception as e:
+                    self.logger.error("Ошибка получения данных для %s: %s", symbol, e, extra={'symbol': symbol, 'stage': 'stage1'})
+
+        candidates = []
+        watch = set()
+        for symbol, df in data.items():
+            last_rsi = df['rsi'].iloc[-1]
+            if last_rsi < self.rsi_oversold or last_rsi > self.rsi_overbought:
+                candidates.append(symbol)
+            if self._near_band(last_rsi):
+                watch.add(symbol)
+        with self._lock:
+            self._watch = watch
+        self.coarse = data
+        self.candidates = candidates
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self.last['stage1'] = (len(self.trading_pairs), len(candidates), elapsed)
+        self.stats['stage1_in'] += len(self.trading_pairs)
+        self.stats['stage1_out'] += len(candidates)
+        self.stats['stage1_ms'] += elapsed
+        return data, candidates
+
+    def fine_cached(self, symbol):
+        """Предзагруженный DataFrame fine_interval без запроса к бирже."""
+        with self._lock:
+            cached = self._fine.get(symbol)
+        return cached[0] if cached else None
+
+    def _fine_for(self, symbol):
+        with self._lock:
+            cached = self._fine.get(symbol)
+        if cached and time.monotonic() - cached[1] <= self.fine_max_age:
+            self.stats['fine_hits'] += 1
+            return cached[0]
+        # Данных нет или они устарели - подтягиваем по требованию
+        self.stats['fine_misses'] += 1
+        return self._refresh_fine(symbol)
+
+    def confirm(self, data, candidates):
+        """Этап 2: подтверждает кандидатов гистограммой MACD на fine_interval."""
+        started = time.perf_counter()
+        signals = []
+        for symbol in candidates:
+            try:
+                fine_df = self._fine_for(symbol)
+                if fine_df is None:
+                    continue
+                trends = analyze_trends([symbol], {symbol: fine_df})
+                last_rsi = data[symbol]['rsi'].iloc[-1]
+                if (last_rsi < self.rsi_oversold and trends[symbol] == 'growth') or \
+                        (last_rsi > self.rsi_overbought and trends[symbol] == 'fall'):
+                    signals.append((symbol, data[symbol], fine_df, trends))
+            except Exception as e:
+                self.logger.error("Ошибка подтверждения сигнала %s: %s", symbol, e, extra={'symbol': symbol, 'stage': 'stage2'})
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self.last['stage2'] = (len(candidates), len(signals), elapsed)
+        self.stats['stage2_in'] += len(candidates)
+        self.stats['stage2_out'] += len(signals)
+        self.stats['stage2_ms'] += elapsed
+        return signals
+
+    def report(self):
+        """Закрывает тик конвейера и пишет статистику этапов в лог."""
+        self.stats['ticks'] += 1
+        s1_in, s1_out, s1_ms = self.last.get('stage1', (0, 0, 0.0))
+        s2_in, s2_out, s2_ms = self.last.get('stage2', (0, 0, 0.0))
+        self.logger.info(
+            "Конвейер: этап 1 %d->%d за %.1f мс, этап 2 %d->%d за %.1f мс (fine из кэша %d, по запросу %d)",
+            s1_in, s1_out, s1_ms, s2_in, s2_out, s2_ms, self.stats['fine_hits'], self.stats['fine_misses'],
+            extra={'stage': 'pipeline', 'latency_ms': round(s1_ms + s2_ms, 1)})
@@ -0,0 +1,220 @@
+# status_api.py
+
+import os
+import json
+import math
+import socket
+import logging
+import threading
+import socketserver
+import pandas as pd
+
+STATUS_SOCKET = 'bbot.sock'  # Unix-сокет статуса демона по умолчанию
+HEARTBEAT = 30  # Как часто напоминать клиенту о себе без изменений, сек
+
+
+def calculate_profit(current_price, buy_price, balance, commission_rate):
+    if buy_price != 'N/A' and balance > 0:
+        return round((current_price - buy_price) * balance - (current_price * balance * commission_rate), 2)
+    return "N/A"
+
+
+def status_rows(trading_pairs, data, account_balances, trends, get_symbol_info, bridge,
+                commission_rate, history=None, prices=None, history_width=24, cadence=None):
+    """Строки таблицы пар простыми значениями (без urwid), общие для интерфейса и API статуса."""
+    rows = []
+    for symbol in trading_pairs:
+        df = data.get(symbol)
+        if df is None or df.empty:
+            continue
+
+        last_rsi = round(float(df['rsi'].iloc[-1]), 1) if pd.notna(df['rsi'].iloc[-1]) else "N/A"
+        # Текущая цена из сервиса цен, без него - закрытие последней свечи
+        price = prices.get(symbol) if prices else None
+        if price is None and pd.notna(df['close'].iloc[-1]):
+            price = float(df['close'].iloc[-1])
+        current_price = round(price, 6) if price is not None else "N/A"
+        balance = round(account_balances.get(symbol.replace(bridge, ''), 0), 6)
+        # История RSI берется из кольцевого буфера без пересчета индикаторов
+        rsi_history = [None if math.isnan(value) else round(float(value), 1)
+                       for value in history.last(symbol, 'rsi', history_width)] if history is not None else []
+
+        symbol_info = get_symbol_info(symbol)
+        buy_price = round(float(symbol_info['price']), 6) if symbol_info and symbol_info.get('price') is not None else 'N/A'
+        profit = calculate_profit(current_price, buy_price, balance, commission_rate) \
+            if current_price != "N/A" and buy_price != "N/A" else "N/A"
+        rows.append({'symbol': symbol, 'rsi': last_rsi, 'rsi_history': rsi_history,
+                     'trend': trends.get(symbol, "N/A"), 'price': current_price,
+                     'buy_price': buy_price, 'profit': profit, 'balance': balance,
+                     'poll': round(cadence[symbol], 1) if cadence and symbol in cadence else "N/A"})
+    return rows
+
+
+def strategy_status(strategy, candidates=(), history_width=24):
+    """Статус стратегии из снимка ее последнего тика."""
+    snapshot = strategy.snapshot
+    if not snapshot:
+        return None
+    return {
+        'header': {
+            'bridge': strategy.bridge,
+            'bridge_balance': snapshot['bridge_balance'],
+            'total_profit': snapshot['total_profit'],
+            'btc_price': snapshot['btc_price'],
+            'min_profit': strategy.min_profit,
+            'risk': snapshot.get('risk'),
+            'poll': strategy.market.poller.usage() if strategy.market.poller.enabled else None,
+        },
+        'rows': status_rows(strategy.trading_pairs, snapshot['display_data'], snapshot['balances'],
+                            snapshot['trends'], strategy.position_info, strategy.bridge,
+                            strategy.commission_rate, strategy.history, snapshot['prices'], history_width,
+                            strategy.poll_cadence()),
+        'candidates': [list(candidate) for candidate in candidates],
+    }
+
+
+def flatten(status):
+    """Плоский словарь ключ -> значение: дельты считаются по строкам, а не по всему статусу."""
+    flat = {}
+    for name, strategy in status.items():
+        if strategy is None:
+            continue
+        flat[f"{name}/header"] = strategy['header']
+        flat[f"{name}/order"] = [row['symbol'] for row in strategy['rows']]
+        flat[f"{name}/candidates"] = strategy['candidates']
+        for row in strategy['rows']:
+            flat[f"{name}/rows/{row['symbol']}"] = row
+    return flat
+
+
+def unflatten(flat):
+    """Обратное преобразование на стороне клиента."""
+    status = {}
+    for key, value in flat.items():
+        name, kind = key.split('/', 2)[:2]
+        strategy = status.setdefault(name, {'header': {}, 'order': [], 'candidates': [], 'rows': {}})
+        if kind == 'rows':
+            strategy['rows'][value['symbol']] = value
+        else:
+            strategy[kind] = value
+    for strategy in status.values():
+        strategy['rows'] = [strategy['rows'][symbol] for symbol in strategy['order'] if symbol in strategy['rows']]
+    return status
+
+
+class _StatusHandler(socketserver.StreamRequestHandler):
+    """Поток одного клиента: первый ответ - полный снимок, дальше только изменения."""
+
+    def handle(self):
+        status = self.server.status
+        sent = {}
+        version = None
+        while not status.closed:
+            with status.changed:
+                status.changed.wait_for(lambda: status.version != version or status.closed, timeout=HEARTBEAT)
+                version, state = status.version, status.state
+            # Медленный клиент получает только последнее состояние, публикация его не ждет
+            message = {
+                'version': version,
+                'full': not sent,
+                'set': {key: value for key, value in state.items() if sent.get(key) != value},
+                'del': [key for key in sent if key not in state],
+            }
+            try:
+                self.wfile.write((json.dumps(message, ensure_ascii=False) + '\n').encode())
+                self.wfile.flush()
+            except OSError:
+                return  # Клиент отключился
+            sent = dict(state)
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class StatusServer:
+    """Локальный API статуса на Unix-сокете: к демону может подключиться несколько интерфейсов."""
+
+    def __init__(self, path=STATUS_SOCKET):
+        self.path = path
+        self.state = {}
+        self.version = 0
+        self.closed = False
+        self.changed = threading.Condition()
+        self._server = None
+
+    def publish(self, status):
+        """Публикует статус стратегий: {имя: strategy_status(...)}."""
+        state = flatten(status)
+        with self.changed:
+            self.state = state
+            self.version += 1
+            self.changed.notify_all()
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Сокет остался от прошлого запуска
+        self._server = _UnixServer(self.path, _StatusHandler)
+        self._server.status = self
+        threading.Thread(target=self._server.serve_forever, name='status-api', daemon=True).start()
+        logging.info("API статуса слушает %s", self.path, extra={'stage': 'status'})
+
+    def stop(self):
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class StatusClient:
+    """Клиент API статуса: применяет снимки и дельты к локальной копии."""
+
+    def __init__(self, path=STATUS_SOCKET):
+        self.path = path
+        self.state = {}
+        self.version = None
+        self.sock = None
+        self._buffer = b''
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+        self.sock.setblocking(False)
+        self.state = {}
+        self._buffer = b''
+        return self.sock
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def read(self):
+        """Читает доступные сообщения. Возвращает True, если статус изменился; ConnectionError при обрыве."""
+        try:
+            chunk = self.sock.recv(1 << 16)
+        except BlockingIOError:
+            return False
+        if not chunk:
+            raise ConnectionError("Демон закрыл соединение")
+        self._buffer += chunk
+        changed = False
+        while b'\n' in self._buffer:
+            line, self._buffer = self._buffer.split(b'\n', 1)
+            message = json.loads(line)
+            if message['full']:
+                self.state = {}
+            for key in message['del']:
+                self.state.pop(key, None)
+            self.state.update(message['set'])
+            changed = changed or bool(message['set'] or message['del'] or message['full'])
+            self.version = message['version']
+        return changed
+
+    def status(self):
+        return unflatten(self.state)
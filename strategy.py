@@ -0,0 +1,542 @@
+# strategy.py
+
+import os
+import time
+import logging
+import threading
+import requests
+from binance.enums import SIDE_BUY, SIDE_SELL
+from config import load_trading_pairs
+from signal_pipeline import SignalPipeline
+from indicator_history import IndicatorHistory
+from price_service import BTC_SYMBOL
+from trade_executor import BridgeBudget, TradeExecutor
+from risk_engine import RiskEngine
+from exit_engine import ExitEngine
+from binance_client import (
+    place_order, get_balance, get_quantizer,
+    analyze_trends, get_account_snapshot, get_last_buy_price, api_calls_snapshot, record_mark
+)
+
+commission_rate = 0.001
+DRAIN_TIMEOUT = 25  # Сколько ждать ордера в работе при остановке, сек (меньше grace супервизора)
+
+
+class StrategyLogger(logging.LoggerAdapter):
+    """Добавляет имя стратегии в структурные поля записи лога."""
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = {**self.extra, **kwargs.get('extra', {})}
+        return msg, kwargs
+
+
+class Strategy:
+    """Экземпляр торговой стратегии со своим аккаунтом, настройками и списком пар.
+
+    Рыночные данные берутся из общего слоя MarketData, поэтому несколько
+    стратегий в одном процессе делают один набор запросов к бирже.
+    """
+
+    def __init__(self, config, market, account=None):
+        self.config = config
+        self.name = config['name']
+        self.market = market
+        self.account = account  # Клиент Binance аккаунта стратегии (None - общий клиент)
+        self.logger = StrategyLogger(logging.getLogger(), {'strategy': self.name})
+
+        self.trading_pairs = config['trading_pairs']
+        self.trading_pairs_file = config['trading_pairs_file']
+        self.profit_file = config['profit_file']
+        self.bridge = config['bridge']
+        self.rsi_oversold = int(config['rsi_oversold'])
+        self.rsi_overbought = int(config['rsi_overbought'])
+        self.interval = config['interval']
+        self.fine_interval = config['fine_interval']
+        self.limit = int(config['limit'])
+        self.qty_to_invest = float(config['qty_to_invest'])
+        self.cfg_min_profit = float(config['cfg_min_profit'])
+        self.min_profit = self.qty_to_invest * self.cfg_min_profit
+        self.max_slippage = float(config['max_slippage'])
+        self.commission_rate = commission_rate
+
+        # Конвейер сигналов: RSI на interval, подтверждение MACD на fine_interval
+        self.pipeline = SignalPipeline(market, self.trading_pairs, self.interval,
+                                       self.fine_interval, self.limit,
+                                       self.rsi_oversold, self.rsi_overbought,
+                                       logger=self.logger)
+        # Параллельная оценка сделок и общий бюджет bridge-монеты
+        self.trade_executor = TradeExecutor()
+        self.budget = BridgeBudget(self.bridge, lambda asset: get_balance(asset, account=self.account))
+        self.state_lock = threading.Lock()
+        self._pairs_mtime = None
+        # Лимиты риска: вердикты готовятся на каждом тике, сделка проверяет их без запросов
+        self.risk = RiskEngine(self.commission_rate,
+                               max_symbol_exposure=float(config['max_symbol_exposure']),
+                               max_total_exposure=float(config['max_total_exposure']),
+                               max_drawdown=float(config['max_drawdown']),
+                               max_btc_correlation=float(config['max_btc_correlation']))
+        # Тейк-профит и трейлинг-стоп по ценам из потока стаканов, между тиками
+        self.exits = ExitEngine(self.on_exit_signal, self.commission_rate, self.min_profit,
+                                take_profit=float(config['take_profit']),
+                                trailing_stop=float(config['trailing_stop']))
+        self.market.books.listeners.append(self.on_stream_price)
+        # История индикаторов и решений по тикам для интерфейса и разбора сделок
+        self.history = IndicatorHistory(config['history_file'])
+        self.decisions = {}
+        # Снимок данных последнего тика, общий для торговли и интерфейса
+        self.snapshot = {}
+        self.display = False  # Нужны ли данные для интерфейса (MACD интервала)
+        self._buy_prices = {}  # symbol -> (баланс, цена последней покупки)
+
+    def start(self):
+        candles = self.market.candles
+        for interval in (self.interval, self.fine_interval):
+            if candles is not None and not candles.supports(interval, self.limit):
+                self.logger.warning("Свечи %s (limit %s) не собираются из base_interval %s и запрашиваются напрямую",
+                                    interval, self.limit, candles.base_interval, extra={'stage': 'klines'})
+        self.pipeline.start()
+        self.watch_polling()
+        self.market.poller.start()
+        # Локальные стаканы для оценки проскальзывания перед сделкой
+        self.market.books.watch(self.name, self.trading_pairs)
+        self.market.prices.watch(self.name, self.trading_pairs)
+
+    def reload_pairs(self):
+        """Перечитывает список пар стратегии, если файл изменился."""
+        try:
+            mtime = os.stat(self.trading_pairs_file).st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._pairs_mtime:
+            return False
+        self._pairs_mtime = mtime
+        pairs = load_trading_pairs(self.trading_pairs_file)
+        if pairs != self.trading_pairs:
+            self.trading_pairs = pairs
+            self.pipeline.set_pairs(pairs)
+            self.watch_polling()
+            self.market.books.watch(self.name, pairs)
+            self.market.prices.watch(self.name, pairs)
+            self.logger.info("Список пар обновлен из %s: %d пар", self.trading_pairs_file, len(pairs),
+                             extra={'stage': 'pairs'})
+            return True
+        return False
+
+    # Пары стратегии в адаптивном опросе свечей со своими границами RSI
+    def watch_polling(self):
+        self.market.poller.watch(self.name, self.trading_pairs, self.interval, self.limit,
+                                 self.rsi_oversold, self.rsi_overbought)
+
+    # История пар, ушедших из списка стратегии, больше не нужна в памяти
+    def prune_history(self):
+        for symbol in set(self.history.series) - set(self.trading_pairs):
+            self.history.drop(symbol)
+
+    # Текущий период опроса пар стратегии, сек
+    def poll_cadence(self):
+        return self.market.poller.cadence(self.trading_pairs, self.interval, self.limit)
+
+    def stop(self, timeout=DRAIN_TIMEOUT):
+        # Ордера в работе доводятся до конца, новые тики уже не запускаются
+        self.trade_executor.drain(timeout)
+        self.pipeline.stop()
+        self.history.flush()
+
+    # Функция информирования в Telegram
+    def send_telegram_message(self, message, retries=3):
+        token = self.config.get('telegram_token')
+        chat_id = self.config.get('telegram_chat_id')
+        if not token or not chat_id:
+            self.logger.error("Отсутствует токен или chat_id для Telegram.")
+            return None
+        url = f"https://api.telegram.org/bot{token}/sendMessage"
+        if self.name:
+            message = f"[{self.name}] {message}"
+        payload = {'chat_id': chat_id, 'text': message, 'parse_mode': 'HTML'}
+
+        for attempt in range(retries):
+            try:
+                response = requests.post(url, data=payload, timeout=10)
+                if response.status_code == 429:  # Лимит запросов Telegram
+                    retry_after = int(response.headers.get("Retry-After", 1))
+                    self.logger.warning("Превышен лимит Telegram. Повтор через %d секунд.", retry_after,
+                                        extra={'stage': 'telegram'})
+                    time.sleep(retry_after)
+                    continue
+                response.raise_for_status()
+                response_json = response.json()
+                if response_json.get('ok'):
+                    return response_json
+                self.logger.error("Ошибка Telegram API: %s", response_json.get('description'),
+                                  extra={'stage': 'telegram'})
+            except requests.exceptions.RequestException as e:
+                self.logger.error("Попытка %d: Ошибка сети Telegram: %s", attempt + 1, e, extra={'stage': 'telegram'})
+            except Exception as e:
+                self.logger.error("Непредвиденная ошибка в send_telegram_message: %s", e, extra={'stage': 'telegram'})
+        return None
+
+    # Функция для сохранения общего профита в файл
+    def save_total_profit(self, total_profit):
+        with open(self.profit_file, 'w') as file:
+            file.write(str(total_profit))
+
+    # Функция для загрузки общего профита из файла
+    def load_total_profit(self):
+        if not os.path.isfile(self.profit_file):
+            return 0.0  # Если файл не найден, возвращаем 0
+        with open(self.profit_file, 'r') as file:
+            return float(file.read().strip())
+
+    # Функция для удаления торговой пары из файла
+    def remove_symbol_from_file(self, symbol):
+        filename = self.trading_pairs_file
+        # Считываем все пары из файла
+        with open(filename, 'r') as file:
+            pairs = [line.strip() for line in file if line.strip()]
+
+        # Удаляем символ, если он есть в списке
+        if symbol in pairs:
+            pairs.remove(symbol)
+            # Записываем оставшиеся пары обратно в файл
+            with open(filename, 'w') as file:
+                for pair in pairs:
+                    file.write(pair + '\n')
+            self.logger.info("Торговая пара %s удалена из файла %s.", symbol, filename,
+                             extra={'symbol': symbol, 'stage': 'pairs'})
+        else:
+            self.logger.error("Торговая пара %s не найдена в файле %s.", symbol, filename,
+                              extra={'symbol': symbol, 'stage': 'pairs'})
+
+    # Единый сбор данных тика: свечи, балансы, позиции и цена BTC для торговли и интерфейса
+    def acquire_tick(self):
+        started = time.perf_counter()
+        calls_before = api_calls_snapshot()
+        # Граница тика в записи сессии, со списком пар на этот момент
+        record_mark('tick', self.name, pairs=self.trading_pairs)
+        # Этап 1 конвейера: свечи interval и RSI
+        data, candidates = self.pipeline.screen()
+
+        account = None
+        try:
+            account = get_account_snapshot(self.account)
+        except Exception as e:
+            self.logger.error("Ошибка получения балансов аккаунта: %s", e, extra={'stage': 'acquire'})
+
+        # Цены всех пар стратегии и BTC одним пакетным запросом
+        prices = self.market.prices.refresh()
+        btc_price = prices.get(BTC_SYMBOL, self.snapshot.get('btc_price', 0.0))
+
+        display_data, trends = data, {}
+        if self.display:
+            # MACD интервала нужен только интерфейсу; свечи берутся из кэша этого же тика
+            display_data = {symbol: self.market.klines(symbol, self.interval, self.limit, ('rsi', 'macd'),
+                                                       self.market.poller.max_age)
+                            for symbol in data}
+            trends = analyze_trends(list(display_data), display_data)
+
+        balances = {asset: value['free'] + value['locked'] for asset, value in (account or {}).items()}
+        calls_after = api_calls_snapshot()
+        self.snapshot = {
+            'data': data,
+            'candidates': candidates,
+            'display_data': display_data,
+            'trends': trends,
+            'account': account,
+            'balances': balances,
+            'bridge_balance': balances.get(self.bridge, 0),
+            'positions': self._positions(account) if account is not None else None,
+            'prices': prices,
+            'btc_price': btc_price,
+            'total_profit': self.load_total_profit(),
+            'api_calls': {endpoint: count - calls_before.get(endpoint, 0)
+                          for endpoint, count in calls_after.items() if count != calls_before.get(endpoint, 0)},
+        }
+        self.logger.info("Данные тика: %s", ', '.join(f"{endpoint}={count}" for endpoint, count in
+                                                     sorted(self.snapshot['api_calls'].items())),
+                         extra={'stage': 'acquire', 'latency_ms': round((time.perf_counter() - started) * 1000, 1)})
+        return self.snapshot
+
+    # Позиции по парам из снимка балансов; цена покупки запрашивается только при изменении баланса
+    def _positions(self, account):
+        positions = {}
+        for symbol in self.trading_pairs:
+            balance = account.get(symbol.replace(self.bridge, ''), {'free': 0.0, 'locked': 0.0})
+            total = balance['free'] + balance['locked']
+            price = None
+            if total > 0:
+                cached = self._buy_prices.get(symbol)
+                if cached is not None and cached[0] == total:
+                    price = cached[1]
+                else:
+                    try:
+                        price = get_last_buy_price(symbol, self.account)
+                        self._buy_prices[symbol] = (total, price)
+                    except Exception as e:
+                        self.logger.error("Ошибка получения сделок %s: %s", symbol, e,
+                                          extra={'symbol': symbol, 'stage': 'acquire'})
+            positions[symbol] = {'free': balance['free'], 'price': price}
+        return positions
+
+    # Позиция пары из снимка тика: {'free', 'price'}
+    def position_info(self, symbol):
+        positions = self.snapshot.get('positions') or {}
+        return positions.get(symbol, {'free': 0.0, 'price': None})
+
+    # monitoring 30>пара>70 RSI
+    def monitoring(self):
+        snapshot = self.acquire_tick()
+        # Этап 2 конвейера - подтверждение по MACD на fine_interval
+        signals = self.pipeline.confirm(snapshot['data'], snapshot['candidates'])
+        self.pipeline.report()
+        self.decisions = {symbol: 'candidate' for symbol in snapshot['candidates']}
+        if snapshot['positions'] is not None:
+            self.update_risk(snapshot)
+            self.update_exits(snapshot)
+        if signals and snapshot['positions'] is not None:
+            # Баланс bridge из снимка тика, покупки резервируют его локально
+            bridge_free = snapshot['account'].get(self.bridge, {}).get('free', 0.0)
+            self.budget.refresh(balance=bridge_free)
+            self.trade_executor.run_all([
+                (symbol, self.execute_trade_logic, (df, fine_df, trends, snapshot['total_profit']))
+                for symbol, df, fine_df, trends in signals
+            ])
+        elif signals:
+            self.logger.error("Нет данных аккаунта, сделки в этом тике пропущены", extra={'stage': 'trade'})
+        self.record_history()
+
+    # Пересчет экспозиции, профита, корреляций и просадки по данным тика
+    def update_risk(self, snapshot):
+        balances = {symbol: snapshot['balances'].get(symbol.replace(self.bridge, ''), 0.0)
+                    for symbol in snapshot['positions']}
+        peak, rebases = self.risk.peak_equity, self.risk.rebases
+        self.risk.set_positions(snapshot['positions'], balances, snapshot['balances'].get(self.bridge, 0.0))
+        if self.risk.rebases != rebases:
+            self.logger.warning("Капитал изменился не из-за сделок (ввод или вывод средств): пик %.2f -> %.2f %s",
+                                peak, self.risk.peak_equity, self.bridge, extra={'stage': 'risk'})
+        if self.risk.max_btc_correlation > 0:
+            # Свечи BTC берутся из общего кэша, пары - из свечей этого тика
+            btc_closes = None
+            try:
+                btc_closes = self.market.klines(BTC_SYMBOL, self.interval, self.limit)['close'].values
+            except Exception as e:
+                self.logger.error("Ошибка получения свечей BTC: %s", e, extra={'stage': 'risk'})
+            self.risk.update_correlations({symbol: df['close'].values for symbol, df in snapshot['data'].items()},
+                                          btc_closes)
+        self.risk.update_prices(snapshot['prices'])
+        summary = self.risk.summary()
+        snapshot['risk'] = summary
+        self.logger.info("Риск: экспозиция %.2f %s, нереализованный профит %.2f, просадка %.1f%%, запретов %d",
+                         summary['exposure'], self.bridge, summary['pnl'], summary['drawdown'] * 100,
+                         summary['blocked'], extra={'stage': 'risk'})
+
+    # Цена из потока стакана: O(1) обновление риска и проверка правил выхода
+    def on_stream_price(self, symbol, price):
+        self.risk.update_price(symbol, price)
+        if self.exits.enabled:
+            self.exits.on_price(symbol, price)
+
+    # Позиции для правил выхода из снимка тика; цены REST проверяются, если потока нет
+    def update_exits(self, snapshot):
+        if not self.exits.enabled:
+            return
+        self.exits.set_positions(snapshot['positions'], self._min_qty)
+        for symbol in list(self.exits.positions):
+            self.exits.on_price(symbol, snapshot['prices'].get(symbol))
+
+    def _min_qty(self, symbol):
+        quantizer = get_quantizer(symbol)
+        return quantizer.min_qty if quantizer is not None else 0.0
+
+    # Сработало правило выхода: продажа в пуле сделок под блокировкой пары
+    def on_exit_signal(self, symbol, reason, price):
+        future = self.trade_executor.submit(symbol, self.exit_position, reason, price)
+        future.add_done_callback(lambda done: self.exits.finish(symbol, done.result() is True))
+
+    # Продажа по трейлинг-стопу или тейк-профиту
+    def exit_position(self, symbol, reason, price):
+        state = self.exits.positions.get(symbol)
+        if state is None:
+            return False
+        reasons = {'take_profit': "тейк-профиту", 'trailing_stop': "трейлинг-стопу"}
+        self.logger.warning("Выход из %s по %s: цена %s, пик %s, покупка %s", symbol, reasons[reason], price,
+                            state['peak'], state['buy_price'], extra={'symbol': symbol, 'stage': 'exit'})
+        if not self.sell(symbol, state['quantity'], state['buy_price']):
+            return False
+        self.decisions[symbol] = 'sell'
+        self.realize_profit(symbol, state['quantity'], state['buy_price'], price)
+        return True
+
+    # Учет профита проданной позиции и удаление пары из списка
+    def realize_profit(self, symbol, quantity, last_buy_price, current_price):
+        profit = (current_price - last_buy_price) * quantity - (current_price * quantity * self.commission_rate)
+        # Продажи идут параллельно, поэтому файлы состояния меняем под блокировкой
+        with self.state_lock:
+            total_profit = self.load_total_profit() + profit
+            self.save_total_profit(total_profit)
+            self.remove_symbol_from_file(symbol)
+        return total_profit
+
+    # Запись значений индикаторов и итогов тика в историю
+    def record_history(self):
+        ts = time.time()
+        for symbol, df in self.pipeline.coarse.items():
+            fine_df = self.pipeline.fine_cached(symbol)
+            histogram, trend = float('nan'), None
+            if fine_df is not None:
+                histogram = float(fine_df['histogram'].iloc[-1])
+                trend = analyze_trends([symbol], {symbol: fine_df})[symbol]
+            self.history.record(symbol, float(df['rsi'].iloc[-1]), histogram, trend,
+                                float(df['close'].iloc[-1]), self.decisions.get(symbol, 'none'), ts)
+        self.history.maybe_flush()
+
+    # Функция для выполнения торговой логики
+    def execute_trade_logic(self, symbol, df, fine_df, trends, total_profit):
+        self.decisions[symbol] = 'skip'
+        try:
+            next_move = trends.get(symbol)
+            last_rsi = round(df['rsi'].iloc[-1])
+
+            quantizer = get_quantizer(symbol)
+            if quantizer is None:
+                self.logger.error("Не удалось получить минимальный лот для %s", symbol, extra={'symbol': symbol, 'stage': 'trade'})
+                return total_profit
+            min_qty = quantizer.min_qty
+
+            # Позиция из снимка тика
+            symbol_info = self.position_info(symbol)
+
+            # Проверка условий для покупки
+            if last_rsi <= self.rsi_oversold and next_move == 'growth' and symbol_info['free'] < min_qty:
+                # Готовый вердикт риск-модуля, без запросов к бирже
+                allowed, reason = self.risk.check_buy(symbol, self.qty_to_invest)
+                if not allowed:
+                    self.logger.warning("Покупка %s запрещена лимитом риска: %s", symbol, reason,
+                                        extra={'symbol': symbol, 'stage': 'risk'})
+                    return total_profit
+                # Резервируем сумму покупки в локальном бюджете bridge
+                if not self.budget.reserve(self.qty_to_invest):
+                    self.risk.release(self.qty_to_invest)
+                    self.logger.error("Недостаточно средств для покупки %s на %s %s", symbol, self.qty_to_invest, self.bridge,
+                                      extra={'symbol': symbol, 'stage': 'buy'})
+                    return total_profit
+
+                # Все, что после резерва, может упасть (стакан, цена, фильтры), поэтому
+                # резерв бюджета и риска снимается в finally при любом исходе
+                bought = False
+                invest = self.qty_to_invest
+                try:
+                    current_price = fine_df['close'].iloc[-1]
+                    # Оценка исполнения по локальному стакану: при большом проскальзывании уменьшаем объем
+                    estimate = self.market.books.estimate_buy(symbol, invest)
+                    if estimate is not None and (not estimate['filled'] or estimate['slippage'] > self.max_slippage):
+                        invest = min(invest, self.market.books.max_buy_quote(symbol, self.max_slippage) or 0.0)
+                        self.logger.warning("Проскальзывание %s на %s %s: %.2f%%, объем уменьшен до %.2f %s",
+                                            symbol, self.qty_to_invest, self.bridge, estimate['slippage'] * 100,
+                                            invest, self.bridge, extra={'symbol': symbol, 'stage': 'buy'})
+                        estimate = self.market.books.estimate_buy(symbol, invest) if invest > 0 else None
+                        if estimate is None:
+                            return total_profit
+                    if estimate is not None:
+                        current_price = estimate['avg_price']
+                    quantity = quantizer.floor_qty(invest / current_price)
+
+                    ok, reason = quantizer.check(quantity, current_price)
+                    if not ok:
+                        self.logger.error("Ордер на покупку %s не проходит фильтры биржи: %s.", symbol, reason,
+                                          extra={'symbol': symbol, 'stage': 'buy'})
+                        return total_profit
+
+                    bought = self.buy(symbol, quantity, current_price)
+                finally:
+                    if bought:
+                        self.decisions[symbol] = 'buy'
+                        self.budget.commit(self.qty_to_invest, spent=invest)
+                        self.risk.release(self.qty_to_invest - invest)
+                    else:
+                        self.budget.release(self.qty_to_invest)
+                        self.risk.release(self.qty_to_invest)
+
+            # Проверка условий для продажи
+            elif last_rsi >= self.rsi_overbought and next_move == 'fall' and symbol_info['free'] >= min_qty:
+                quantity = symbol_info['free']
+                last_buy_price = symbol_info['price']
+
+                if last_buy_price is None:
+                    self.logger.error("Нет данных о покупке для %s", symbol, extra={'symbol': symbol, 'stage': 'sell'})
+                    return total_profit
+
+                successful_sale = self.sell(symbol, quantity, last_buy_price)
+
+                if successful_sale:
+                    self.decisions[symbol] = 'sell'
+                    self.exits.finish(symbol, True)
+                    total_profit = self.realize_profit(symbol, quantity, last_buy_price, fine_df['close'].iloc[-1])
+                else:
+                    self.logger.error("Продажа %s не удалась или была пропущена.", symbol, extra={'symbol': symbol, 'stage': 'sell'})
+
+        except Exception as e:
+            self.logger.error("Ошибка выполнения торговой логики для %s: %s", symbol, e, extra={'symbol': symbol, 'stage': 'trade'})
+        return total_profit
+
+    # Функция покупки
+    def buy(self, symbol, quantity, current_price):
+
+        # Корректируем количество с учетом шага лота
+        quantity = get_quantizer(symbol).floor_qty(quantity)
+
+        order = place_order(symbol, quantity, SIDE_BUY, account=self.account)
+        if order:
+            price = float(order['fills'][0]['price'])
+            self.send_telegram_message(f"📈 Покупка {quantity} {symbol.replace('USDT', '')} по цене {price}")
+            self.logger.warning("Покупка %s %s по цене %s", quantity, symbol.replace('USDT', ''), price,
+                                extra={'symbol': symbol, 'stage': 'buy'})
+            return True
+        else:
+            return False
+
+    # Функция продажи с проверкой профита
+    def sell(self, symbol, quantity, last_buy_price):
+        # Текущая цена актива из общего сервиса цен
+        current_price = self.market.prices.price(symbol)
+        if current_price is None:
+            self.logger.error("Нет текущей цены для %s", symbol, extra={'symbol': symbol, 'stage': 'sell'})
+            return False
+        # Если есть локальный стакан, профит считаем по оценке средней цены исполнения
+        estimate = self.market.books.estimate_sell(symbol, quantity)
+        if estimate is not None and estimate['filled']:
+            current_price = min(current_price, estimate['avg_price'])
+
+        if last_buy_price is None:
+            self.logger.error("Нет данных о покупке для %s", symbol, extra={'symbol': symbol, 'stage': 'sell'})
+            return False  # Возвращаем False, если не было данных о покупке
+
+        # Рассчитываем профит
+        profit = (current_price - last_buy_price) * quantity - (current_price * quantity * self.commission_rate)
+
+        # Проверяем, что профит больше минимального
+        if profit < self.min_profit:
+            self.logger.error("Профит для продажи %s составляет %.2f %s, что меньше минимального профита %s %s.",
+                              symbol.replace('USDT', ''), profit, self.bridge, self.min_profit, self.bridge,
+                              extra={'symbol': symbol, 'stage': 'sell'})
+            return False  # Возвращаем False, если профит меньше минимального
+
+        # Корректируем количество с учетом шага лота и проверяем фильтры биржи
+        quantizer = get_quantizer(symbol)
+        quantity = quantizer.floor_qty(quantity)
+        ok, reason = quantizer.check(quantity, current_price)
+        if not ok:
+            self.logger.error("Ордер на продажу %s не проходит фильтры биржи: %s.", symbol, reason,
+                              extra={'symbol': symbol, 'stage': 'sell'})
+            return False
+
+        # Продажа
+        order = place_order(symbol, quantity, SIDE_SELL, account=self.account)
+        if order:
+            price = float(order['fills'][0]['price'])
+            self.send_telegram_message(f"📉 Продано {quantity} {symbol.replace('USDT', '')} по {price} с профитом {profit:.2f} {self.bridge}")
+            self.logger.warning("Продано %s %s по %s с профитом %.2f %s", quantity, symbol.replace('USDT', ''), price,
+                                profit, self.bridge, extra={'symbol': symbol, 'stage': 'sell'})
+
+            return True  # Возвращаем True при успешной продаже
+        else:
+            return False  # Если не удалось продать, возвращаем False
@@ -0,0 +1,92 @@
+# tests/test_candidate_index.py
+
+import json
+import random
+from candidate_index import CandidateIndex, load_ranking
+
+
+def _index(tmp_path, **kwargs):
+    return CandidateIndex(str(tmp_path / 'scan_ranking.json'), **kwargs)
+
+
+def test_top_orders_by_rsi_and_symbol(tmp_path):
+    index = _index(tmp_path)
+    for symbol, rsi in [('CUSDT', 40), ('AUSDT', 25), ('BUSDT', 25), ('DUSDT', 70)]:
+        index.update(symbol, rsi)
+    assert index.top(3) == [('AUSDT', 25), ('BUSDT', 25), ('CUSDT', 40)]
+    assert index.top(2, exclude={'AUSDT'}) == [('BUSDT', 25), ('CUSDT', 40)]
+    assert index.top(10) == index.top(10)  # Чтение не меняет индекс
+    assert len(index) == 4
+
+
+def test_update_existing_symbol_replaces_old_entry(tmp_path):
+    index = _index(tmp_path)
+    index.update('AUSDT', 20)
+    index.update('BUSDT', 30)
+    index.update('AUSDT', 50)
+    assert index.top(5) == [('BUSDT', 30), ('AUSDT', 50)]
+    # Возврат к прежнему RSI: старая запись с тем же значением не дублирует пару
+    index.update('AUSDT', 20)
+    assert index.top(5) == [('AUSDT', 20), ('BUSDT', 30)]
+
+
+def test_removed_and_readded_symbol_appears_once(tmp_path):
+    index = _index(tmp_path)
+    index.update('AUSDT', 20)
+    index.remove('AUSDT')
+    assert index.top(5) == []
+    index.update('AUSDT', 20)
+    assert index.top(5) == [('AUSDT', 20)]
+    index.remove('MISSING')  # Неизвестная пара - без ошибки
+
+
+def test_stale_entries_are_skipped_and_compacted(tmp_path):
+    index = _index(tmp_path)
+    for step in range(1000):
+        index.update('AUSDT', step % 7)
+        index.update('BUSDT', 3.5)
+    assert index.top(5) == [('BUSDT', 3.5), ('AUSDT', 999 % 7)]
+    assert len(index._heap) <= 2 * len(index) + 16
+
+
+def test_matches_brute_force(tmp_path):
+    rng = random.Random(0)
+    index = _index(tmp_path)
+    expected = {}
+    symbols = [f'S{number}USDT' for number in range(30)]
+    for _ in range(5000):
+        symbol = rng.choice(symbols)
+        if rng.random() < 0.2:
+            index.remove(symbol)
+            expected.pop(symbol, None)
+        else:
+            rsi = rng.randint(0, 20)  # Много одинаковых RSI
+            index.update(symbol, rsi)
+            expected[symbol] = rsi
+        if rng.random() < 0.1:
+            k = rng.randint(0, 10)
+            exclude = set(rng.sample(symbols, 3))
+            ranked = sorted((rsi, symbol) for symbol, rsi in expected.items() if symbol not in exclude)
+            assert index.top(k, exclude) == [(symbol, rsi) for rsi, symbol in ranked[:k]]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = _index(tmp_path, persist_limit=2)
+    index.update('AUSDT', 21.456)
+    index.update('BUSDT', 35.0)
+    index.update('CUSDT', 10.0)
+    index.save(exclude={'CUSDT'})
+    updated, pairs = load_ranking(index.path)
+    assert updated is not None
+    assert pairs == [('AUSDT', 21.46), ('BUSDT', 35.0)]
+    assert not (tmp_path / 'scan_ranking.json.tmp').exists()
+
+
+def test_load_missing_or_broken_file(tmp_path):
+    assert load_ranking(str(tmp_path / 'missing.json')) == (None, [])
+    broken = tmp_path / 'broken.json'
+    broken.write_text('{"pairs": [')
+    assert load_ranking(str(broken)) == (None, [])
+    partial = tmp_path / 'partial.json'
+    partial.write_text(json.dumps({'pairs': [['AUSDT', 20]]}))
+    assert load_ranking(str(partial)) == (None, [('AUSDT', 20)])
@@ -0,0 +1,82 @@
+# tests/test_candle_aggregator.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from candle_aggregator import FIELDS, aggregate, aggregation_ratio
+from kline_cache import INTERVAL_SECONDS
+
+RESAMPLE_RULES = {'1h': '1h', '4h': '4h', '1d': '1D', '1w': 'W-MON'}
+
+
+def _base(base_interval, start, count, seed=0, drop=()):
+    """Случайные базовые свечи от start (строка даты UTC); drop - номера пропущенных свечей."""
+    rng = np.random.default_rng(seed)
+    step = INTERVAL_SECONDS[base_interval] * 1000
+    open_time = pd.Timestamp(start).value // 10 ** 6 + np.arange(count, dtype=np.int64) * step
+    close = 100 + np.cumsum(rng.normal(0, 1, count))
+    open_ = close + rng.normal(0, 0.5, count)
+    high = np.maximum(open_, close) + rng.random(count)
+    low = np.minimum(open_, close) - rng.random(count)
+    values = np.column_stack([open_, high, low, close, rng.random(count) * 1000])
+    keep = np.setdiff1d(np.arange(count), drop)
+    return open_time[keep], values[keep]
+
+
+def _resample(open_time, values, interval):
+    """Те же свечи через pandas: границы слева, пустые интервалы (пропуски) отбрасываются."""
+    df = pd.DataFrame(values, columns=FIELDS, index=pd.to_datetime(open_time, unit='ms'))
+    rule = RESAMPLE_RULES[interval]
+    kwargs = {'label': 'left', 'closed': 'left'}
+    result = df.resample(rule, **kwargs).agg({'open': 'first', 'high': 'max', 'low': 'min',
+                                              'close': 'last', 'volume': 'sum'})
+    result = result[df['open'].resample(rule, **kwargs).count() > 0]
+    return result.index.values.astype('datetime64[ms]').astype(np.int64), result[FIELDS].to_numpy()
+
+
+def _check(base_interval, interval, open_time, values):
+    candle_open, candles = aggregate(open_time, values, interval)
+    expected_open, expected = _resample(open_time, values, interval)
+    if expected_open[0] != open_time[0]:
+        # Серия начинается с середины первой свечи - aggregate ее отбрасывает
+        expected_open, expected = expected_open[1:], expected[1:]
+    np.testing.assert_array_equal(candle_open, expected_open)
+    np.testing.assert_allclose(candles, expected)
+
+
+@pytest.mark.parametrize('base_interval, interval, start, count', [
+    ('5m', '1h', '2024-03-01 00:00', 500),  # Последняя свеча формируется (500 не кратно 12)
+    ('5m', '1h', '2024-03-01 00:35', 500),  # Начало с середины часа
+    ('15m', '4h', '2024-03-01 02:00', 300),
+    ('1h', '1d', '2024-03-01 00:00', 200),
+    ('1d', '1w', '2024-03-06 00:00', 60),  # Недели с понедельника, серия со среды
+])
+def test_aggregate_matches_resample(base_interval, interval, start, count):
+    open_time, values = _base(base_interval, start, count)
+    _check(base_interval, interval, open_time, values)
+
+
+def test_aggregate_with_gap_in_base_series():
+    # Пропуск внутри часа и целый пропущенный час: свечи собираются из того, что есть
+    open_time, values = _base('5m', '2024-03-01 00:00', 200, seed=1, drop=[15, 16, 40] + list(range(60, 72)))
+    _check('5m', '1h', open_time, values)
+    candle_open, _ = aggregate(open_time, values, '1h')
+    hours = (candle_open - candle_open[0]) // 3_600_000
+    assert 5 not in hours  # Час без базовых свечей не появляется
+
+
+def test_partial_forming_bucket():
+    open_time, values = _base('5m', '2024-03-01 00:00', 27)
+    candle_open, candles = aggregate(open_time, values, '1h')
+    assert len(candle_open) == 3
+    forming = values[24:]
+    assert candles[-1].tolist() == [forming[0, 0], forming[:, 1].max(), forming[:, 2].min(),
+                                    forming[-1, 3], pytest.approx(forming[:, 4].sum())]
+
+
+def test_aggregation_ratio():
+    assert aggregation_ratio('15m', '4h') == 16
+    assert aggregation_ratio('1m', '1m') == 1
+    assert aggregation_ratio('1h', '15m') is None
+    assert aggregation_ratio('1d', '1M') is None
+    assert aggregation_ratio('3d', '1w') is None  # Неделя не делится на трехдневки
@@ -0,0 +1,107 @@
+# tests/test_exit_engine.py
+
+import threading
+import pytest
+from exit_engine import ExitEngine
+from trade_executor import TradeExecutor
+
+
+class Seller:
+    """Связка правил выхода с исполнителем сделок, как Strategy.on_exit_signal."""
+
+    def __init__(self, inline=True, succeed=True, **rules):
+        self.executor = TradeExecutor(max_workers=2, inline=inline)
+        self.exits = ExitEngine(self.on_exit, 0.0, 0.0, **rules)
+        self.exits.set_positions({'AUSDT': {'free': 1.0, 'price': 100.0}}, lambda symbol: 0.001)
+        self.succeed = succeed
+        self.sells = []
+        self.threads = []
+
+    def on_exit(self, symbol, reason, price):
+        future = self.executor.submit(symbol, self.sell, reason, price)
+        future.add_done_callback(lambda done: self.exits.finish(symbol, done.result() is True))
+
+    def sell(self, symbol, reason, price):
+        self.sells.append((symbol, reason, price))
+        self.threads.append(threading.current_thread())
+        return self.succeed
+
+    def feed(self, prices):
+        return [self.exits.on_price('AUSDT', price) for price in prices]
+
+
+def test_take_profit_sells_once_at_threshold():
+    seller = Seller(take_profit=0.05)
+    reasons = seller.feed([101, 104.9, 105, 106, 110])
+    assert seller.sells == [('AUSDT', 'take_profit', 105)]
+    assert reasons == [None, None, 'take_profit', None, None]
+    assert 'AUSDT' not in seller.exits.positions
+
+
+def test_trailing_stop_follows_high_water_mark():
+    seller = Seller(trailing_stop=0.1)
+    seller.feed([110, 120, 115])
+    assert seller.exits.positions['AUSDT']['peak'] == 120
+    seller.feed([130, 118, 117.1])  # Новый пик 130, порог 117
+    assert seller.sells == []
+    assert seller.exits.positions['AUSDT']['peak'] == 130
+    seller.feed([117, 100, 90])
+    assert seller.sells == [('AUSDT', 'trailing_stop', 117)]
+
+
+def test_trailing_stop_waits_for_price_above_buy():
+    seller = Seller(trailing_stop=0.1)
+    seller.feed([99, 95, 80])  # Пик не выше покупки - стоп не взведен
+    assert seller.sells == []
+
+
+def test_min_profit_blocks_exit():
+    seller = Seller(trailing_stop=0.02)
+    seller.exits.min_profit = 5.0
+    seller.feed([103, 100.9])  # Откат от 103, но профит 0.9 меньше минимального
+    assert seller.sells == []
+    seller.feed([110, 107.5])
+    assert seller.sells == [('AUSDT', 'trailing_stop', 107.5)]
+
+
+def test_failed_sell_is_retried_after_pause(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('exit_engine.time.monotonic', lambda: now[0])
+    seller = Seller(succeed=False, take_profit=0.05)
+    seller.feed([105, 106])
+    assert len(seller.sells) == 1  # Повтор только после паузы
+    now[0] += seller.exits.retry_after
+    seller.feed([107])
+    assert [price for _, _, price in seller.sells] == [105, 107]
+
+
+def test_buy_price_change_resets_peak():
+    seller = Seller(trailing_stop=0.1)
+    seller.feed([150])
+    seller.exits.set_positions({'AUSDT': {'free': 1.0, 'price': 140.0}}, lambda symbol: 0.001)
+    assert seller.exits.positions['AUSDT']['peak'] == 140.0
+    seller.exits.set_positions({'AUSDT': {'free': 0.0001, 'price': 140.0}}, lambda symbol: 0.001)
+    assert seller.exits.positions == {}  # Остаток меньше minQty - не позиция
+
+
+def test_inline_executor_runs_in_calling_thread():
+    seller = Seller(take_profit=0.05)
+    seller.feed([105])
+    # Продажа завершилась до возврата on_price, в том же потоке
+    assert seller.threads == [threading.current_thread()]
+    assert 'AUSDT' not in seller.exits.positions
+
+
+def test_pool_executor_sells_once():
+    seller = Seller(inline=False, take_profit=0.05)
+    seller.feed([105, 106, 107])
+    seller.executor.drain(timeout=5)
+    assert len(seller.sells) == 1
+    assert seller.threads[0] is not threading.current_thread()
+
+
+def test_inline_executor_skips_locked_symbol():
+    executor = TradeExecutor(inline=True)
+    with executor.locks.get('AUSDT'):
+        future = executor.submit('AUSDT', lambda symbol: pytest.fail("сделка при занятой паре"))
+    assert future.done() and future.result() is None
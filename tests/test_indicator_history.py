@@ -0,0 +1,17 @@
+# tests/test_indicator_history.py
+
+from indicator_history import IndicatorHistory, load_history
+
+
+def test_drop_frees_buffer_but_keeps_pending_rows(tmp_path):
+    history = IndicatorHistory(str(tmp_path / 'history.bin'), capacity=4)
+    for step in range(6):
+        history.record('AUSDT', 30.0 + step, 0.1, 'growth', 1.0, 'none', ts=step)
+        history.record('BUSDT', 50.0, 0.0, 'flat', 2.0, 'none', ts=step)
+    assert list(history.last('AUSDT', 'rsi', 2)) == [34.0, 35.0]
+    history.drop('AUSDT')
+    history.drop('MISSING')  # Неизвестная пара - без ошибки
+    assert set(history.series) == {'BUSDT'}
+    assert len(history.history('AUSDT')) == 0
+    assert history.flush() == 12
+    assert len(load_history(history.path, 'AUSDT')) == 6
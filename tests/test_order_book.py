@@ -0,0 +1,203 @@
+# tests/test_order_book.py
+
+import pytest
+import order_book
+from order_book import OrderBook, OrderBookManager
+
+
+def _event(first, final, bids=(), asks=(), symbol='TESTUSDT'):
+    return {'e': 'depthUpdate', 's': symbol, 'U': first, 'u': final,
+            'b': [[str(price), str(qty)] for price, qty in bids],
+            'a': [[str(price), str(qty)] for price, qty in asks]}
+
+
+def _snapshot(last_update_id, bids=(), asks=()):
+    return {'lastUpdateId': last_update_id,
+            'bids': [[str(price), str(qty)] for price, qty in bids],
+            'asks': [[str(price), str(qty)] for price, qty in asks]}
+
+
+def _book(bids=(), asks=()):
+    book = OrderBook('TESTUSDT')
+    book.apply_snapshot(_snapshot(100, bids, asks))
+    assert book.apply_diff(_event(100, 101))
+    return book
+
+
+# Синхронизация снапшота и диффов
+
+def test_diff_before_snapshot_is_rejected():
+    assert not OrderBook('TESTUSDT').apply_diff(_event(1, 2))
+
+
+def test_events_already_in_snapshot_are_dropped():
+    book = OrderBook('TESTUSDT')
+    book.apply_snapshot(_snapshot(100, bids=[(10, 1)]))
+    assert book.apply_diff(_event(90, 100, bids=[(10, 5)]))
+    assert book.bids == {10.0: 1.0}
+    assert not book.synced
+
+
+def test_first_event_must_cover_last_update_id():
+    book = OrderBook('TESTUSDT')
+    book.apply_snapshot(_snapshot(100))
+    assert not book.apply_diff(_event(102, 105))  # Пропущено событие 101
+    assert book.apply_diff(_event(95, 103, bids=[(10, 2)]))
+    assert book.synced and book.last_update_id == 103
+    assert book.best_bid() == 10.0
+
+
+def test_gap_after_sync_is_reported():
+    book = _book(bids=[(10, 1)])
+    assert book.apply_diff(_event(102, 104))
+    assert not book.apply_diff(_event(106, 107))
+
+
+def test_levels_are_updated_and_removed():
+    book = _book(bids=[(10, 1), (9, 1)], asks=[(11, 1), (12, 1)])
+    assert book.apply_diff(_event(102, 102, bids=[(10, 0), (9.5, 3)], asks=[(10.5, 2), (12, 0)]))
+    assert book.bid_prices == [9.0, 9.5] and book.bids[9.5] == 3.0
+    assert book.ask_prices == [10.5, 11.0]
+    assert book.best_bid() == 9.5 and book.best_ask() == 10.5
+    # Удаление отсутствующего уровня ничего не ломает
+    assert book.apply_diff(_event(103, 103, bids=[(8, 0)]))
+    assert book.bid_prices == [9.0, 9.5]
+
+
+class FakeSocketManager:
+    def __init__(self):
+        self.streams = []
+
+    def start(self):
+        pass
+
+    def start_depth_socket(self, callback, symbol, interval):
+        self.streams.append(symbol)
+        return symbol
+
+    def stop_socket(self, name):
+        self.streams.remove(name)
+
+    def stop(self):
+        pass
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    snapshots = []
+    monkeypatch.setattr(order_book, 'get_order_book', lambda symbol, limit: snapshots.pop(0))
+    manager = OrderBookManager()
+    manager._twm = FakeSocketManager()
+    pending = []
+    manager.spawn = lambda target, *args: pending.append((target, args))  # Снапшот грузится по команде теста
+    manager.watch('test', ['TESTUSDT'])
+
+    def load(snapshot):
+        snapshots.append(snapshot)
+        target, args = pending.pop(0)
+        target(*args)
+    manager.load = load
+    manager.pending = pending
+    return manager
+
+
+def test_buffered_events_are_applied_after_snapshot(manager):
+    manager._on_message(_event(95, 99, bids=[(10, 9)]))  # Уже в снапшоте
+    manager._on_message(_event(100, 102, bids=[(10, 2)]))
+    manager._on_message(_event(103, 104, asks=[(11, 1)]))
+    assert len(manager.pending) == 1  # Снапшот запрашивается один раз
+    assert manager.get('TESTUSDT') is None
+    manager.load(_snapshot(101, bids=[(10, 1)], asks=[(12, 1)]))
+    book = manager.get('TESTUSDT')
+    assert book is not None and book.last_update_id == 104
+    assert book.bids == {10.0: 2.0} and book.ask_prices == [11.0, 12.0]
+
+
+def test_snapshot_newer_than_buffer_waits_for_live_events(manager):
+    manager._on_message(_event(95, 99))
+    manager.load(_snapshot(101, bids=[(10, 1)]))
+    assert manager.get('TESTUSDT') is None  # Ни одно событие не покрыло lastUpdateId
+    manager._on_message(_event(100, 103, bids=[(10, 4)]))
+    assert manager.get('TESTUSDT').bids == {10.0: 4.0}
+
+
+def test_snapshot_older_than_buffer_restarts(manager):
+    manager._on_message(_event(200, 201))
+    manager.load(_snapshot(100))
+    assert manager.get('TESTUSDT') is None
+    manager._on_message(_event(202, 203))
+    assert len(manager.pending) == 1  # Новый снапшот
+    manager.load(_snapshot(202, bids=[(10, 1)]))
+    assert manager.get('TESTUSDT').last_update_id == 203
+
+
+def test_gap_triggers_resync(manager):
+    listened = []
+    manager.listeners.append(lambda symbol, price: listened.append(price))
+    manager._on_message(_event(100, 101))
+    manager.load(_snapshot(100, bids=[(10, 1)]))
+    manager._on_message(_event(102, 102, bids=[(10.5, 1)]))
+    assert listened == [10.5]
+    manager._on_message(_event(110, 111, bids=[(11, 1)]))  # Разрыв
+    assert manager.get('TESTUSDT') is None
+    assert len(manager.pending) == 1
+    manager.load(_snapshot(110, bids=[(11, 2)]))
+    book = manager.get('TESTUSDT')
+    assert book.bids == {11.0: 1.0} and book.last_update_id == 111
+
+
+def test_failed_snapshot_is_retried_on_next_event(manager, monkeypatch):
+    manager._on_message(_event(100, 101))
+    monkeypatch.setattr(order_book, 'get_order_book', lambda symbol, limit: (_ for _ in ()).throw(OSError('timeout')))
+    target, args = manager.pending.pop(0)
+    target(*args)
+    assert manager.get('TESTUSDT') is None
+    manager._on_message(_event(102, 103))
+    assert len(manager.pending) == 1
+
+
+def test_unwatched_symbol_is_dropped(manager):
+    manager.watch('test', [])
+    assert manager._twm.streams == [] and 'TESTUSDT' not in manager.books
+
+
+# Оценка исполнения по стакану
+
+def test_estimate_sell_walks_bid_levels():
+    book = _book(bids=[(10, 1), (9, 2), (8, 5)])
+    estimate = book.estimate_sell(2.5)
+    assert estimate['filled'] and estimate['qty'] == 2.5
+    assert estimate['quote'] == pytest.approx(10 + 1.5 * 9)
+    assert estimate['avg_price'] == pytest.approx((10 + 13.5) / 2.5)
+    assert estimate['slippage'] == pytest.approx((10 - estimate['avg_price']) / 10)
+    partial = book.estimate_sell(100)
+    assert not partial['filled'] and partial['qty'] == 8 and partial['quote'] == pytest.approx(10 + 18 + 40)
+
+
+def test_estimate_buy_walks_ask_levels():
+    book = _book(asks=[(10, 1), (11, 2), (12, 5)])
+    estimate = book.estimate_buy(21)
+    assert estimate['filled'] and estimate['quote'] == 21
+    assert estimate['qty'] == pytest.approx(1 + 11 / 11)
+    assert estimate['slippage'] == pytest.approx((21 / 2 - 10) / 10)
+    exact = book.estimate_buy(10)
+    assert exact['qty'] == pytest.approx(1) and exact['slippage'] == pytest.approx(0)
+    partial = book.estimate_buy(1000)
+    assert not partial['filled'] and partial['qty'] == 8
+
+
+def test_max_buy_quote_keeps_average_within_slippage():
+    book = _book(asks=[(10, 1), (11, 2), (12, 5)])
+    quote = book.max_buy_quote(0.05)
+    estimate = book.estimate_buy(quote)
+    assert estimate['avg_price'] == pytest.approx(10.5)
+    assert book.max_buy_quote(0.5) == pytest.approx(10 + 22 + 60)
+
+
+def test_empty_book():
+    book = _book()
+    assert book.best_bid() is None and book.best_ask() is None
+    assert book.estimate_sell(1) is None
+    assert book.estimate_buy(10) is None
+    assert book.max_buy_quote(0.01) == 0.0
+    assert book.estimate_sell(0) is None
@@ -0,0 +1,137 @@
+# tests/test_poll_scheduler.py
+
+import time
+import numpy as np
+import pandas as pd
+import pytest
+import binance_client
+from poll_scheduler import KLINES_WEIGHT, PollScheduler
+
+SYMBOLS = [f'S{number}USDT' for number in range(8)]
+WALL = 1_699_999_260.0  # Минута после открытия часовой свечи: ее закрытие не укорачивает периоды
+
+
+class FakeMarket:
+    """Слой данных с заданным RSI пар; каждый запрос учитывается как запрос /klines."""
+
+    def __init__(self):
+        self.rsi = {}
+
+    def klines(self, symbol, interval, limit, indicators=(), max_age=None):
+        binance_client.count_call('klines')
+        return pd.DataFrame({'rsi': np.asarray(self.rsi.get(symbol, [50.0] * 15), dtype=float)})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(time, 'time', lambda: WALL)
+    monkeypatch.setattr(binance_client, 'used_weight_total', 0)
+    binance_client.used_weights.clear()
+    yield now
+    binance_client.used_weights.clear()
+
+
+def _scheduler(budget, symbols=SYMBOLS, min_period=1):
+    poller = PollScheduler(FakeMarket(), weight_budget=budget, min_period=min_period)
+    poller.watch('test', symbols, '1h', 100, 30, 70)
+    return poller
+
+
+def _run_due(poller):
+    """Один проход фонового цикла без потоков."""
+    batch = poller._take_due()
+    for key in batch:
+        poller._reschedule(key, *poller._poll(key))
+    return batch
+
+
+def test_new_symbols_are_due_immediately(clock):
+    poller = _scheduler(100)
+    assert len(_run_due(poller)) == len(SYMBOLS)
+    assert _run_due(poller) == []  # Следующий опрос - по периоду
+    poller.watch('test', SYMBOLS + ['NEWUSDT'], '1h', 100, 30, 70)
+    assert [key[0] for key in _run_due(poller)] == ['NEWUSDT']
+
+
+def test_budget_limits_requests_in_window(clock):
+    poller = _scheduler(10)
+    assert len(_run_due(poller)) == 10 // KLINES_WEIGHT
+    assert poller.throttled == 1
+    assert poller.usage()['used'] == 10
+    assert poller._next_wait() >= poller.min_period
+
+
+def test_sliding_window_expiry(clock):
+    poller = _scheduler(10)
+    _run_due(poller)
+    clock[0] += 59
+    assert _run_due(poller) == []
+    clock[0] += 1  # Запросы первой секунды вышли из окна
+    assert len(_run_due(poller)) == 3
+    assert poller.usage()['used'] == 6
+
+
+def test_other_requests_share_the_budget(clock):
+    poller = _scheduler(30)
+    binance_client.count_call('account')  # 20 веса цен, балансов и прочего
+    assert len(_run_due(poller)) == 5
+    usage = poller.usage()
+    assert usage['used'] == 30 and usage['polls'] == 10
+
+
+def test_periods_are_stretched_under_budget_shortfall(clock):
+    poller = _scheduler(1000, symbols=SYMBOLS[:5])
+    keys = [(symbol, '1h', 100) for symbol in SYMBOLS[:5]]
+    for key in keys:
+        binance_client.count_call('klines')
+        poller._reschedule(key, 6.0, 50.0, False, weight=KLINES_WEIGHT)
+    # 5 пар раз в 6 с по 2 веса - 100 веса в минуту
+    assert poller.usage()['demand'] == pytest.approx(100)
+    assert poller.stretch == 1.0
+    poller.weight_budget = 50
+    assert poller.stretch == pytest.approx(2.0)
+    binance_client.count_call('account')  # Остальные запросы съедают часть бюджета
+    poller._spend(time.monotonic())
+    assert poller.stretch == pytest.approx(100 / 30)
+    binance_client.count_call('klines')
+    poller._reschedule(keys[0], 6.0, 50.0, False, weight=KLINES_WEIGHT)
+    assert poller._state[keys[0]]['due'] == pytest.approx(clock[0] + 6.0 * poller.stretch)
+    assert poller.cadence(SYMBOLS[:5], '1h', 100)[SYMBOLS[0]] == pytest.approx(6.0 * poller.stretch)
+
+
+def test_demand_uses_actual_poll_weight(clock):
+    poller = _scheduler(1000, symbols=SYMBOLS[:1])
+    key = (SYMBOLS[0], '1h', 100)
+    poller._reschedule(key, 60.0, 50.0, False, weight=10)  # Подгрузка истории - несколько запросов
+    assert poller.usage()['demand'] == pytest.approx((KLINES_WEIGHT + 10) / 2)
+    poller._reschedule(key, 60.0, 50.0, False, weight=0)  # Пару уже загрузил другой поток
+    assert poller.usage()['demand'] == pytest.approx((KLINES_WEIGHT + 10) / 4)
+
+
+def test_period_shrinks_toward_band(clock):
+    poller = _scheduler(1000)
+    key = (SYMBOLS[0], '1h', 100)
+    calm = poller.period(key, pd.DataFrame({'rsi': [50.0, 51.0] * 8}))
+    near = poller.period(key, pd.DataFrame({'rsi': [34.0, 35.0] * 8}))
+    assert near[0] < calm[0]
+    assert near[1] == 35.0 and not near[2]
+    hot = poller.period(key, pd.DataFrame({'rsi': [40.0] * 14 + [29.0]}))
+    assert hot == (poller.min_period, 29.0, True)
+
+
+def test_wake_when_symbol_reaches_band(clock):
+    poller = _scheduler(1000, symbols=SYMBOLS[:2])
+    _run_due(poller)
+    assert not poller.wake.is_set()
+    poller.market.rsi[SYMBOLS[1]] = [40.0] * 14 + [25.0]
+    clock[0] += 4000
+    _run_due(poller)
+    assert poller.wake.is_set()
+    assert poller._state[(SYMBOLS[1], '1h', 100)]['period'] == poller.min_period
+    # Пара остается у границы - повторного пробуждения нет
+    poller.wake.clear()
+    clock[0] += poller.min_period
+    _run_due(poller)
+    assert not poller.wake.is_set()
@@ -0,0 +1,55 @@
+# tests/test_price_service.py
+
+import time
+import pytest
+import price_service
+from price_service import BTC_SYMBOL, INVALID_SYMBOL, PriceService
+
+
+class InvalidSymbol(Exception):
+    code = INVALID_SYMBOL
+
+
+@pytest.fixture
+def exchange(monkeypatch):
+    """Биржа с заданными ценами; запоминает наборы пар каждого запроса."""
+    now = [1000.0]
+    requests = []
+
+    def get_ticker_prices(symbols):
+        requests.append(set(symbols))
+        if 'BADUSDT' in symbols:
+            raise InvalidSymbol("Invalid symbol.")
+        return {symbol: 1.0 for symbol in symbols}
+
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(price_service, 'get_ticker_prices', get_ticker_prices)
+    return now, requests
+
+
+def test_extra_symbol_leaves_batch_after_ttl(exchange):
+    now, requests = exchange
+    prices = PriceService(max_age=5, extra_ttl=60)
+    prices.watch('main', ['AUSDT'])
+    assert prices.price('XUSDT') == 1.0
+    assert requests[-1] == {BTC_SYMBOL, 'AUSDT', 'XUSDT'}
+    now[0] += 30
+    prices.refresh()
+    assert 'XUSDT' in requests[-1]  # Недавно запрошенная пара остается в пакете
+    now[0] += 31
+    prices.refresh()
+    assert requests[-1] == {BTC_SYMBOL, 'AUSDT'}
+    assert 'XUSDT' not in prices.prices
+    assert prices.price('XUSDT') == 1.0  # Повторный запрос возвращает пару в пакет
+    assert 'XUSDT' in requests[-1]
+
+
+def test_invalid_symbol_is_excluded(exchange):
+    now, requests = exchange
+    prices = PriceService(max_age=5)
+    assert prices.price('BADUSDT') is None
+    assert prices.price('AUSDT') == 1.0
+    assert 'BADUSDT' not in requests[-1]
+    now[0] += 10
+    prices.refresh()
+    assert requests[-1] == {BTC_SYMBOL, 'AUSDT'}
@@ -0,0 +1,102 @@
+# tests/test_quantizer.py
+
+from decimal import Decimal
+import numpy as np
+import pytest
+from hypothesis import given, strategies as st
+from quantizer import SymbolQuantizer
+
+
+def _fmt(units, scale):
+    """Значение фильтра в формате биржи: строка с 8 знаками после запятой."""
+    return f"{Decimal(units).scaleb(-scale):.8f}"
+
+
+@st.composite
+def lot_filters(draw):
+    """LOT_SIZE как у Binance: stepSize - 1/2/5 единиц разряда, minQty кратен шагу."""
+    scale = draw(st.integers(0, 8))
+    step = draw(st.sampled_from([1, 2, 5, 10, 25]))
+    min_units = step * draw(st.integers(0, 1000))
+    max_units = min_units + step * draw(st.integers(1, 10 ** 9))
+    filters = [{'filterType': 'LOT_SIZE', 'minQty': _fmt(min_units, scale),
+                'maxQty': _fmt(max_units, scale), 'stepSize': _fmt(step, scale)}]
+    return SymbolQuantizer('TESTUSDT', filters)
+
+
+quantities = st.floats(min_value=0, max_value=1e7, allow_nan=False, allow_infinity=False)
+
+
+def _exact(value):
+    return Decimal(repr(float(value)))
+
+
+@given(lot_filters(), quantities)
+def test_floor_qty_never_rounds_up(quantizer, quantity):
+    assert _exact(quantizer.floor_qty(quantity)) <= _exact(quantity)
+
+
+@given(lot_filters(), quantities)
+def test_floor_qty_is_step_aligned_and_within_lot(quantizer, quantity):
+    result = quantizer.floor_qty(quantity)
+    if result == 0:
+        return
+    units = int(_exact(result).scaleb(quantizer.qty_scale))
+    assert units >= quantizer.min_qty_units
+    assert (units - quantizer.min_qty_units) % quantizer.step_units == 0
+    assert units <= quantizer.max_qty_units
+
+
+@given(lot_filters(), quantities)
+def test_floor_qty_below_min_qty_is_zero(quantizer, quantity):
+    result = quantizer.floor_qty(quantity)
+    assert result == 0 or result >= quantizer.min_qty
+
+
+@given(lot_filters(), st.lists(quantities, min_size=1, max_size=50))
+def test_vector_matches_scalar(quantizer, values):
+    expected = [quantizer.floor_qty(value) for value in values]
+    assert quantizer.floor_qty_array(values).tolist() == expected
+
+
+@given(lot_filters(), st.integers(0, 10 ** 9), st.integers(-3, 3))
+def test_vector_matches_scalar_at_step_boundaries(quantizer, units, ulps):
+    # Значения ровно на шаге и в паре ulp от него - там, где ошибается float
+    value = units * quantizer.step_units / 10 ** quantizer.qty_scale
+    for _ in range(abs(ulps)):
+        value = np.nextafter(value, np.inf if ulps > 0 else -np.inf)
+    value = max(float(value), 0.0)
+    assert quantizer.floor_qty_array([value]).tolist() == [quantizer.floor_qty(value)]
+
+
+@pytest.mark.parametrize('value', [float('nan'), float('inf'), float('-inf')])
+def test_non_finite_quantity_is_rejected(value):
+    quantizer = SymbolQuantizer('TESTUSDT', [{'filterType': 'LOT_SIZE', 'minQty': '0.00100000',
+                                              'maxQty': '1000.00000000', 'stepSize': '0.00100000'}])
+    with pytest.raises(ValueError):
+        quantizer.floor_qty(value)
+    with pytest.raises(ValueError):
+        quantizer.floor_qty_array([1.0, value])
+
+
+def test_float_representation_does_not_round_up():
+    quantizer = SymbolQuantizer('TESTUSDT', [{'filterType': 'LOT_SIZE', 'minQty': '0.00100000',
+                                              'maxQty': '1000.00000000', 'stepSize': '0.00100000'}])
+    assert quantizer.floor_qty_array([0.1239999996, 0.0009999999, 0.3]).tolist() == [0.123, 0.0, 0.3]
+
+
+def test_check_rejects_quantity_off_step():
+    quantizer = SymbolQuantizer('TESTUSDT', [{'filterType': 'LOT_SIZE', 'minQty': '0.01000000',
+                                              'maxQty': '1000.00000000', 'stepSize': '0.01000000'}])
+    ok, reason = quantizer.check(0.015, 100)
+    assert not ok and 'stepSize' in reason
+    assert quantizer.check(0.01, 100) == (True, None)
+    assert not quantizer.check(0.005, 100)[0]
+    assert not quantizer.check(float('nan'), 100)[0]
+
+
+@given(lot_filters(), quantities)
+def test_floored_quantity_passes_check(quantizer, quantity):
+    result = quantizer.floor_qty(quantity)
+    if result:
+        assert quantizer.check(result, 1.0) == (True, None)
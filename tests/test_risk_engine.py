@@ -0,0 +1,123 @@
+# tests/test_risk_engine.py
+
+import numpy as np
+import pytest
+from risk_engine import RiskEngine, btc_correlation, unrealized_pnl
+
+POSITIONS = {'AUSDT': {'price': 10.0}, 'BUSDT': {'price': None}}
+
+
+def _engine(**limits):
+    risk = RiskEngine(0.001, **limits)
+    risk.set_positions(POSITIONS, {'AUSDT': 10, 'BUSDT': 0}, 1000)
+    risk.update_prices({'AUSDT': 10.0, 'BUSDT': 1.0})
+    return risk
+
+
+def test_exposure_and_pnl_are_vectorized():
+    risk = RiskEngine(0.001)
+    risk.set_positions(POSITIONS, {'AUSDT': 10, 'BUSDT': 50}, 1000)
+    risk.update_prices({'AUSDT': 12.0, 'BUSDT': 2.0})
+    assert risk.total_exposure == pytest.approx(120 + 100)
+    # У BUSDT нет цены покупки - профит не считается
+    assert risk.total_pnl == pytest.approx((12 - 10) * 10 - 12 * 10 * 0.001)
+    assert risk.equity == pytest.approx(1220)
+    np.testing.assert_allclose(unrealized_pnl(np.array([12.0]), np.array([np.nan]), np.array([1.0]), 0.001), [0.0])
+
+
+def test_update_price_matches_full_update():
+    risk = _engine()
+    risk.update_price('AUSDT', 13.0)
+    incremental = risk.summary()
+    risk.update_prices({'AUSDT': 13.0, 'BUSDT': 1.0})
+    assert risk.summary() == pytest.approx(incremental)
+
+
+def test_claim_then_release_returns_room():
+    risk = _engine(max_total_exposure=200)
+    assert risk.check_buy('BUSDT', 60) == (True, "")
+    ok, reason = risk.check_buy('BUSDT', 60)
+    assert not ok and 'лимит' in reason  # 100 вложено + 60 уже разрешено
+    risk.release(60)
+    assert risk.check_buy('BUSDT', 60)[0]
+    risk.release(1000)
+    assert risk._claimed == 0.0  # Лишний возврат не уходит в минус
+
+
+def test_claim_is_committed_by_next_snapshot():
+    risk = _engine(max_total_exposure=200)
+    assert risk.check_buy('BUSDT', 60)[0]
+    # Покупка исполнилась: деньги стали монетами, разрешение больше не держится
+    risk.set_positions(POSITIONS, {'AUSDT': 10, 'BUSDT': 60}, 940)
+    risk.update_prices({'AUSDT': 10.0, 'BUSDT': 1.0})
+    assert risk._claimed == 0.0
+    assert risk.total_exposure == pytest.approx(160)
+    assert risk.check_buy('BUSDT', 40)[0]
+    assert not risk.check_buy('BUSDT', 1)[0]
+
+
+def test_symbol_exposure_limit():
+    risk = _engine(max_symbol_exposure=100)
+    ok, reason = risk.check_buy('AUSDT', 1)
+    assert not ok and 'пары' in reason
+    assert risk.check_buy('BUSDT', 50)[0]
+    assert not risk.check_buy('BUSDT', 150)[0]
+
+
+def test_correlation_cap():
+    risk = _engine(max_btc_correlation=0.8)
+    rng = np.random.default_rng(0)
+    btc = np.exp(np.cumsum(rng.normal(0, 0.01, 200)))
+    noise = np.exp(np.cumsum(rng.normal(0, 0.01, 200)))
+    risk.update_correlations({'AUSDT': btc * 3, 'BUSDT': noise}, btc)
+    risk.update_prices({'AUSDT': 10.0, 'BUSDT': 1.0})
+    ok, reason = risk.check_buy('AUSDT', 1)
+    assert not ok and 'BTC' in reason
+    assert risk.check_buy('BUSDT', 1)[0]
+    assert np.isnan(btc_correlation(btc[:2], btc[:2]))
+
+
+def test_price_drop_is_drawdown():
+    risk = _engine(max_drawdown=0.05)
+    risk.update_prices({'AUSDT': 0.0, 'BUSDT': 1.0})
+    assert risk.drawdown == pytest.approx(100 / 1100)
+    ok, reason = risk.check_buy('BUSDT', 1)
+    assert not ok and 'просадка' in reason
+
+
+def test_missing_price_does_not_count_as_drawdown():
+    risk = _engine(max_drawdown=0.05)
+    risk.set_positions(POSITIONS, {'AUSDT': 10, 'BUSDT': 0}, 1000)
+    risk.update_prices({})
+    assert risk.drawdown == 0.0 and risk.equity == pytest.approx(1100)
+    assert risk.check_buy('BUSDT', 1)[0]
+
+
+@pytest.mark.parametrize('cash', [500, 3000])
+def test_withdrawal_or_deposit_is_not_drawdown(cash):
+    risk = _engine(max_drawdown=0.05)
+    risk.set_positions(POSITIONS, {'AUSDT': 10, 'BUSDT': 0}, cash)
+    risk.update_prices({'AUSDT': 10.0, 'BUSDT': 1.0})
+    assert risk.rebases == 1
+    assert risk.peak_equity == pytest.approx(cash + 100)
+    assert risk.drawdown == 0.0
+    assert risk.check_buy('BUSDT', 1)[0]
+    # После сдвига пика настоящее падение цены снова считается просадкой
+    risk.update_prices({'AUSDT': 0.0, 'BUSDT': 1.0})
+    assert risk.drawdown == pytest.approx(100 / (cash + 100))
+
+
+def test_withdrawal_after_tick_without_prices():
+    risk = _engine(max_drawdown=0.05)
+    risk.set_positions(POSITIONS, {'AUSDT': 10, 'BUSDT': 0}, 1000)
+    risk.update_prices({})
+    risk.set_positions(POSITIONS, {'AUSDT': 10, 'BUSDT': 0}, 500)
+    risk.update_prices({'AUSDT': 10.0, 'BUSDT': 1.0})
+    assert risk.drawdown == 0.0 and risk.peak_equity == pytest.approx(600)
+
+
+def test_trade_is_not_a_flow():
+    risk = _engine()
+    risk.set_positions(POSITIONS, {'AUSDT': 10, 'BUSDT': 100}, 900)
+    risk.update_prices({'AUSDT': 10.0, 'BUSDT': 1.0})
+    assert risk.rebases == 0 and risk.peak_equity == pytest.approx(1100)
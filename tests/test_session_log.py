@@ -0,0 +1,135 @@
+# tests/test_session_log.py
+
+import gzip
+import time
+import pytest
+from session_log import (
+    SessionRecorder, SessionLog, RecordingClient, RecordingWebsocketManager,
+    ReplayClient, ReplayWebsocketManager, ReplayError, VirtualClock
+)
+
+START = 1_700_000_000.0
+
+
+class FakeClient:
+    """Клиент биржи: каждый ответ на get_klines - следующий номер."""
+
+    def __init__(self):
+        self.served = 0
+
+    def get_klines(self, symbol, limit):
+        self.served += 1
+        return [[self.served, symbol, limit]]
+
+    def get_account(self):
+        raise ConnectionError("timeout")
+
+
+class FakeSocketManager:
+    def __init__(self):
+        self.callbacks = {}
+
+    def start_depth_socket(self, callback, symbol, **kwargs):
+        self.callbacks[symbol] = callback
+        return symbol
+
+
+@pytest.fixture
+def clock():
+    clock = VirtualClock(START)
+    clock.install()
+    yield clock
+    clock.uninstall()
+
+
+@pytest.fixture
+def recorded(tmp_path, clock):
+    """Сессия, записанная по виртуальному времени несколькими gzip-блоками."""
+    path = str(tmp_path / 'session.rec.gz')
+    recorder = SessionRecorder(path, flush_size=2)
+    client = RecordingClient(FakeClient(), recorder, account='acc1')
+    sockets = FakeSocketManager()
+    RecordingWebsocketManager(sockets, recorder).start_depth_socket(lambda message: None, symbol='XUSDT')
+
+    recorder.record('mark', 'tick', ('main',))
+    client.get_klines(symbol='XUSDT', limit=2)
+    time.sleep(10)  # Виртуальные часы: без ожидания
+    sockets.callbacks['XUSDT']({'e': 'depthUpdate', 'u': 1})
+    recorder.record('mark', 'tick', ('main',))
+    client.get_klines(symbol='XUSDT', limit=2)
+    with pytest.raises(ConnectionError):
+        client.get_account()
+    time.sleep(5)
+    sockets.callbacks['XUSDT']({'e': 'depthUpdate', 'u': 2})
+    recorder.flush()
+    return path
+
+
+def test_virtual_clock_patches_time(clock):
+    assert time.time() == START
+    wall = time.perf_counter()
+    time.sleep(3600)
+    assert time.time() == START + 3600 and time.monotonic() == 3600
+    assert time.perf_counter() - wall < 60  # Настоящее время не ждали
+    clock.uninstall()
+    assert abs(time.time() - START) > 3600
+    clock.install()
+
+
+def test_recorder_writes_gzip_members(recorded):
+    with open(recorded, 'rb') as file:
+        data = file.read()
+    assert data.count(b'\x1f\x8b\x08') >= 3  # Несколько сброшенных блоков
+    assert gzip.decompress(data).count(b'\n') == 7
+
+
+def test_log_reads_all_members(recorded):
+    log = SessionLog.load(recorded)
+    assert len(log.entries) == 7
+    assert [entry['t'] for entry in log.marks[('tick', 'main')]] == [START, START + 10]
+    assert [entry['result']['u'] for entry in log.streams[('depth', 'XUSDT')]] == [1, 2]
+    assert len(SessionLog.load(recorded, kinds={'rest'}).entries) == 3
+
+
+def test_replay_answers_latest_response_before_horizon(recorded, clock):
+    log = SessionLog.load(recorded)
+    client = ReplayClient(log, clock, account='acc1')
+    clock.horizon = START + 5
+    assert client.get_klines(symbol='XUSDT', limit=2) == [[1, 'XUSDT', 2]]
+    clock.horizon = START + 20
+    assert client.get_klines(symbol='XUSDT', limit=2) == [[2, 'XUSDT', 2]]
+    assert client.calls == 2 and client.misses == 0
+
+
+def test_replay_miss_before_first_response(recorded, clock):
+    log = SessionLog.load(recorded)
+    client = ReplayClient(log, clock, account='acc1')
+    clock.horizon = START - 1
+    with pytest.raises(ReplayError):
+        client.get_klines(symbol='XUSDT', limit=2)
+    clock.horizon = START + 20
+    with pytest.raises(ReplayError):
+        client.get_klines(symbol='XUSDT', limit=3)  # Таких аргументов не было
+    with pytest.raises(ReplayError):
+        ReplayClient(log, clock, account='acc2').get_klines(symbol='XUSDT', limit=2)
+    assert client.misses == 2
+
+
+def test_replay_repeats_recorded_error(recorded, clock):
+    client = ReplayClient(SessionLog.load(recorded), clock, account='acc1')
+    clock.horizon = START + 20
+    with pytest.raises(ReplayError, match='timeout'):
+        client.get_account()
+
+
+def test_replay_streams_follow_virtual_clock(recorded):
+    log = SessionLog.load(recorded)
+    clock = VirtualClock(log.start)  # Часы воспроизведения идут с начала записи
+    manager = ReplayWebsocketManager(log, clock)
+    received = []
+    name = manager.start_depth_socket(lambda message: received.append((clock.now, message['u'])), symbol='XUSDT')
+    clock.advance(10)
+    assert received == [(START + 10, 1)]
+    manager.stop_socket(name)
+    clock.advance(10)
+    assert received == [(START + 10, 1)]  # Остановленный поток больше не доставляется
@@ -0,0 +1,161 @@
+# trade_executor.py
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+
+class BridgeBudget:
+    """Локальный бюджет bridge-монеты с резервированием средств под покупки.
+
+    Баланс запрашивается у биржи не чаще одного раза за тик, а параллельные
+    покупки резервируют сумму локально и не могут потратить больше остатка.
+    """
+
+    def __init__(self, asset, fetch_balance, max_age=5, stale_after=120):
+        self.asset = asset
+        self.fetch_balance = fetch_balance
+        self.max_age = max_age  # Сколько секунд считаем баланс актуальным
+        self.stale_after = stale_after  # Резерв без движения дольше этого считается потерянным, сек
+        self.balance = 0.0
+        self.reserved = 0.0
+        self.updated = None
+        self._touched = None  # Время последнего резерва, снятия или списания
+        self._lock = threading.Lock()
+
+    def _drop_stale(self):
+        # Потерянный резерв не должен навсегда замораживать баланс из снимка тика
+        if self.reserved > 0 and time.monotonic() - self._touched > self.stale_after:
+            logging.error("Резерв %.8f %s без движения %s с, сбрасываем", self.reserved, self.asset,
+                          self.stale_after, extra={'stage': 'budget'})
+            self.reserved = 0.0
+
+    def refresh(self, force=False, balance=None):
+        """Обновляет баланс (с биржи или уже полученный), если нет незавершенных резервов."""
+        with self._lock:
+            self._drop_stale()
+            if self.reserved > 0:
+                return self.balance  # Пока ордера в полете, верим локальному учету
+            if balance is None and not force and self.updated is not None \
+                    and time.monotonic() - self.updated < self.max_age:
+                return self.balance
+        if balance is None:
+            balance = self.fetch_balance(self.asset)
+        with self._lock:
+            if self.reserved == 0:
+                self.balance = balance
+                self.updated = time.monotonic()
+            return self.balance
+
+    @property
+    def available(self):
+        with self._lock:
+            return self.balance - self.reserved
+
+    def reserve(self, amount):
+        """Резервирует сумму под покупку. Возвращает False, если средств не хватает."""
+        with self._lock:
+            if self.balance - self.reserved < amount:
+                return False
+            self.reserved += amount
+            self._touched = time.monotonic()
+            return True
+
+    def release(self, amount):
+        """Снимает резерв, если покупка не состоялась."""
+        with self._lock:
+            self.reserved = max(0.0, self.reserved - amount)
+            self._touched = time.monotonic()
+
+    def commit(self, amount, spent=None):
+        """Списывает зарезервированную сумму после исполненной покупки."""
+        with self._lock:
+            self.reserved = max(0.0, self.reserved - amount)
+            self.balance -= amount if spent is None else spent
+            self._touched = time.monotonic()
+
+
+class SymbolLocks:
+    """Набор блокировок по торговым парам."""
+
+    def __init__(self):
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def get(self, symbol):
+        with self._guard:
+            lock = self._locks.get(symbol)
+            if lock is None:
+                lock = self._locks[symbol] = threading.Lock()
+            return lock
+
+    def discard(self, symbol):
+        """Удаляет свободную блокировку пары, которая больше не нужна."""
+        with self._guard:
+            lock = self._locks.get(symbol)
+            if lock is not None and not lock.locked():
+                del self._locks[symbol]
+
+
+class TradeExecutor:
+    """Параллельная оценка сделок с блокировкой на каждую пару.
+
+    inline - сделки выполняются сразу в вызывающем потоке (воспроизведение по
+    виртуальным часам: продажа по выходу не должна уходить за пределы шага времени).
+    """
+
+    def __init__(self, max_workers=None, inline=False):
+        cpu_count = os.cpu_count() or 4
+        self.inline = inline
+        self.locks = SymbolLocks()
+        self._executor = ThreadPoolExecutor(max_workers or cpu_count, thread_name_prefix='trade')
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+
+    def _run(self, symbol, func, args, kwargs):
+        lock = self.locks.get(symbol)
+        if not lock.acquire(blocking=False):
+            logging.warning("Сделка по %s уже обрабатывается. Пропускаем.", symbol, extra={'symbol': symbol, 'stage': 'trade'})
+            return None
+        try:
+            return func(symbol, *args, **kwargs)
+        except Exception as e:
+            logging.error("Ошибка оценки сделки для %s: %s", symbol, e, extra={'symbol': symbol, 'stage': 'trade'})
+            return None
+        finally:
+            lock.release()
+
+    def submit(self, symbol, func, *args, **kwargs):
+        """Ставит оценку сделки по паре в очередь пула потоков."""
+        if self.inline:
+            future = Future()
+            future.set_result(self._run(symbol, func, args, kwargs))
+            return future
+        future = self._executor.submit(self._run, symbol, func, args, kwargs)
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self._pending_lock:
+            self._pending.discard(future)
+
+    def run_all(self, jobs, timeout=None):
+        """Запускает задачи (symbol, func, args) параллельно и ждет их завершения."""
+        futures = [self.submit(symbol, func, *args) for symbol, func, args in jobs]
+        if futures:
+            wait(futures, timeout=timeout)
+        return futures
+
+    def drain(self, timeout=None):
+        """Дожидается завершения всех сделок в работе."""
+        with self._pending_lock:
+            pending = list(self._pending)
+        if pending:
+            wait(pending, timeout=timeout)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
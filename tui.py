@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# tui.py
+
+import argparse
+import urwid
+from config import load_config
+from status_api import StatusClient
+from indicator_display import render_status, PALETTE
+
+RECONNECT = 2  # Пауза между попытками подключения к демону, сек
+
+
+class StatusView:
+    """Интерфейс-наблюдатель: рисует статус демона, торговля от него не зависит."""
+
+    def __init__(self, path, strategy=None):
+        self.client = StatusClient(path)
+        self.strategy = strategy
+        self.loop = None
+        self._watch = None
+
+    def message(self, text):
+        self.loop.widget = urwid.Filler(urwid.Text(text), valign='top')
+
+    def connect(self, loop=None, user_data=None):
+        try:
+            sock = self.client.connect()
+        except OSError as e:
+            self.message(f"Нет связи с демоном ({self.client.path}): {e}. Повтор через {RECONNECT} с.")
+            self.loop.set_alarm_in(RECONNECT, self.connect)
+            return
+        self.message("Ожидание данных от демона...")
+        self._watch = self.loop.watch_file(sock.fileno(), self.on_readable)
+
+    def on_readable(self):
+        try:
+            changed = self.client.read()
+        except (OSError, ValueError) as e:
+            self.loop.remove_watch_file(self._watch)
+            self.client.close()
+            self.message(f"Соединение с демоном потеряно: {e}. Повтор через {RECONNECT} с.")
+            self.loop.set_alarm_in(RECONNECT, self.connect)
+            return
+        if changed:
+            self.render()
+
+    def render(self):
+        status = self.client.status()
+        if not status:
+            return
+        name = self.strategy if self.strategy is not None else sorted(status)[0]
+        strategy = status.get(name)
+        if strategy is None:
+            self.message(f"Стратегия '{name}' не найдена. Доступны: {', '.join(sorted(status)) or 'main'}")
+            return
+        self.loop.widget = render_status(strategy['header'], strategy['rows'], strategy['candidates'])
+
+    def run(self):
+        self.loop = urwid.MainLoop(urwid.Filler(urwid.Text("Подключение...")), palette=PALETTE,
+                                   unhandled_input=exit_on_q)
+        self.loop.set_alarm_in(0, self.connect)
+        self.loop.run()
+
+
+def exit_on_q(key):
+    """Выход из интерфейса при нажатии 'q'."""
+    if key in ('q', 'Q'):
+        raise urwid.ExitMainLoop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Интерфейс к демону orchestrator.py через API статуса")
+    parser.add_argument('--socket', help="Unix-сокет статуса (по умолчанию status_socket из user.cfg)")
+    parser.add_argument('--strategy', help="имя стратегии ([strategy:NAME]); по умолчанию первая")
+    args = parser.parse_args()
+    StatusView(args.socket or load_config()['status_socket'] or 'bbot.sock', args.strategy).run()